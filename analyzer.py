@@ -1,6 +1,6 @@
 import re
-import os
-from datetime import date, timedelta
+
+import report_history
 
 # Ключевые слова, на которые GPT должен реагировать дополнительно
 KEY_TERMS = {
@@ -26,31 +26,19 @@ def keyword_alert(text):
     else:
         return "🟢 Ключевых тревожных сигналов не найдено."
 
-# Примитивный кеш в файл
-def store_and_compare(report_text, cache_dir="cache"):
+# История отчётов – report_history (SQLite, индексные выборки вместо файлов cache/<дата>.txt)
+def compare_with_previous(run_id):
     """
-    Сохраняет сегодняшний отчет и сравнивает его с вчерашним, если он есть.
-    Возвращает строку с результатом сравнения.
+    Сравнивает блок GPT запуска run_id с последним запуском за предыдущие дни
+    (несколько запусков за день не затирают друг друга – берётся последний).
     """
-    os.makedirs(cache_dir, exist_ok=True)
-    today = date.today().isoformat()
-    today_file = os.path.join(cache_dir, f"{today}.txt")
-
-    # Сохраняем сегодняшний отчёт
-    with open(today_file, "w", encoding="utf-8") as f:
-        f.write(report_text)
-
-    # Пытаемся сравнить с вчерашним
-    yesterday = (date.today() - timedelta(days=1)).isoformat()
-    yesterday_file = os.path.join(cache_dir, f"{yesterday}.txt")
-
-    if os.path.exists(yesterday_file):
-        with open(yesterday_file, "r", encoding="utf-8") as f:
-            previous_report_text = f.read()
-        # Используем обновленную функцию compare_reports
-        return compare_reports(previous_report_text, report_text)
-    else:
+    base_id = report_history.baseline_run(run_id, 1)
+    previous_report_text = report_history.get_section(base_id, "gpt_analysis") if base_id else None
+    report_text = report_history.get_section(run_id, "gpt_analysis")
+    if previous_report_text is None or report_text is None:
         return "📊 Данных за вчера нет для сравнения."
+    # Используем обновленную функцию compare_reports
+    return compare_reports(previous_report_text, report_text)
 
 def compare_reports(old, new):
     """
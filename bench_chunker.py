@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""bench_chunker.py
+Микро-бенчмарк нарезки отчёта на сообщения Telegram.
+
+Сравнивает `tg_chunker.chunk_text` с прежней схемой (`smart_chunk` +
+`force_split_long_string`, подбор границы через `decode()`; копия ниже)
+на синтетических отчётах разного размера: обычные абзацы, HTML-теги,
+кириллица/эмодзи и длинные абзацы без переводов строк. Заодно проверяет,
+что каждая часть укладывается в лимит и не рвёт теги.
+
+    python bench_chunker.py                # размеры по умолчанию
+    python bench_chunker.py --sizes 10000 1000000 --limit 3400 --repeat 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import re
+import time
+
+from tg_chunker import chunk_text
+
+WORDS = ["рынок", "BTC", "растёт", "ETF", "📈", "падение.", "спрос!", "—", "ставка", "инфляция",
+         "<b>важно</b>", '<a href="https://t.me/MomentumPulse">канал</a>', "S&amp;P"]
+
+
+# ── ПРЕЖНЯЯ РЕАЛИЗАЦИЯ (для сравнения) ──────────────────────────────────────────
+
+def legacy_force_split(long_str, limit_b):
+    sub_chunks = []
+    encoded_str = long_str.encode("utf-8")
+    pos = 0
+    while pos < len(encoded_str):
+        candidate = encoded_str[pos:min(pos + limit_b, len(encoded_str))]
+        while True:
+            try:
+                sub_chunks.append(candidate.decode("utf-8"))
+                pos += len(candidate)
+                break
+            except UnicodeDecodeError:
+                if len(candidate) > 1:
+                    candidate = candidate[:-1]
+                else:
+                    pos += 1
+                    break
+    return sub_chunks
+
+
+def legacy_smart_chunk(text, limit):
+    result, parts, size = [], [], 0
+    for paragraph in text.split("\n\n"):
+        if not paragraph.strip():
+            continue
+        p_bytes = len(paragraph.encode("utf-8"))
+        sep = 2 if parts else 0
+        if size + sep + p_bytes <= limit:
+            if parts:
+                parts.append("\n\n")
+            parts.append(paragraph)
+            size += sep + p_bytes
+            continue
+        if parts:
+            result.append("".join(parts))
+        parts, size = [], 0
+        if p_bytes > limit:
+            pieces = legacy_force_split(paragraph, limit)
+            result.extend(pieces[:-1])
+            parts, size = [pieces[-1]], len(pieces[-1].encode("utf-8"))
+        else:
+            parts, size = [paragraph], p_bytes
+    if parts:
+        result.append("".join(parts))
+    return [c for c in result if c.strip()]
+
+
+def legacy_send_chunking(text, limit):
+    """Как старый send(): нарезка с запасом под нумерацию и повторная, если вышла одна часть."""
+    parts = legacy_smart_chunk(text, limit - 40)
+    if len(parts) == 1:
+        parts = legacy_smart_chunk(text, limit)
+    return parts
+
+
+# ── ДАННЫЕ ──────────────────────────────────────────────────────────────────────
+
+def synthetic_report(size_bytes: int, seed: int = 42) -> str:
+    """Отчёт ~size_bytes байт: абзацы разной длины, часть – очень длинные и без переводов строк."""
+    rnd = random.Random(seed)
+    paragraphs, total = [], 0
+    while total < size_bytes:
+        kind = rnd.random()
+        if kind < 0.1:      # длинный абзац одной строкой
+            n_words = rnd.randint(2000, 6000)
+        elif kind < 0.4:    # список строк
+            n_words = 0
+            paragraph = "\n".join(f"— <b>{rnd.choice(WORDS)}</b>: " + " ".join(rnd.choice(WORDS) for _ in range(12))
+                                  for _ in range(rnd.randint(3, 15)))
+        else:
+            n_words = rnd.randint(10, 200)
+        if n_words:
+            paragraph = " ".join(rnd.choice(WORDS) for _ in range(n_words))
+        paragraphs.append(paragraph)
+        total += len(paragraph.encode("utf-8")) + 2
+    return "\n\n".join(paragraphs)
+
+
+# ── ПРОВЕРКА И ЗАМЕР ────────────────────────────────────────────────────────────
+
+def check_chunks(chunks: list[str], limit: int) -> list[str]:
+    problems = []
+    for i, chunk in enumerate(chunks):
+        size = len(chunk.encode("utf-8"))
+        if size > limit:
+            problems.append(f"часть {i}: {size}Б > {limit}Б")
+        if chunk.count("<b>") != chunk.count("</b>") or chunk.count("<a ") != chunk.count("</a>"):
+            problems.append(f"часть {i}: незакрытый тег")
+        if re.search(r"<[^>]*$", chunk):
+            problems.append(f"часть {i}: разрезан тег")
+    return problems
+
+
+def best_of(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Бенчмарк нарезки сообщений Telegram")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--limit", type=int, default=3400)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'размер':>10} {'частей (старый/новый)':>22} {'старый, мс':>11} {'новый, мс':>10} "
+          f"{'без HTML, мс':>13} {'старый/новый':>13}")
+    for size in args.sizes:
+        text = synthetic_report(size)
+        old_parts = legacy_send_chunking(text, args.limit)
+        new_parts = chunk_text(text, args.limit, split_reserve=40)
+        problems = check_chunks(new_parts, args.limit)
+        t_old = best_of(lambda: legacy_send_chunking(text, args.limit), args.repeat)
+        t_new = best_of(lambda: chunk_text(text, args.limit, split_reserve=40), args.repeat)
+        t_plain = best_of(lambda: chunk_text(text, args.limit, html=False, split_reserve=40), args.repeat)
+        print(f"{len(text.encode('utf-8')):>10} {len(old_parts):>10}/{len(new_parts):<11} "
+              f"{t_old * 1000:>11.2f} {t_new * 1000:>10.2f} {t_plain * 1000:>13.2f} {t_old / t_new:>12.2f}x")
+        old_broken = {p.split(":")[0] for p in check_chunks(old_parts, args.limit)}
+        if old_broken:
+            print(f"    старый: частей с разрезанным или незакрытым тегом – {len(old_broken)}")
+        for problem in problems[:5]:
+            print(f"    ⚠️ новый: {problem}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""bench_pipeline.py
+Сквозной бенчмарк отчёта: где тратится время одного запуска.
+
+Три группы замеров:
+    * pipeline – `main.run_report()` целиком (обычный режим, без стрима)
+      поверх кассеты `http_replay`: по каждому этапу StageTimer (collect,
+      gpt, publish) – стенное и процессорное время, пиковый RSS, число
+      HTTP-запросов (через `http_client`) и вызовов GPT, время блоков этапа;
+    * readers – каждый ридер отдельно (fetch_crypto, fetch_market, …) поверх
+      той же кассеты: импорт модуля и сам сбор;
+    * micro – prepare_text, smart_chunk, ta_signals.compute_signals,
+      indicators (инкрементальный и полный расчёт) и delta_engine на
+      синтетических данных.
+
+Каждый сквозной замер – отдельный процесс (холодные импорты, свой пиковый
+RSS) с пустым временным каталогом состояния: кеши GPT, макро и свечей,
+история отчётов, outbox. Поэтому запись и воспроизведение делают одни и те
+же запросы. Ответы сети при воспроизведении мгновенные; задержки можно
+задать через HTTP_REPLAY_FAULTS (например '{"*": {"latency": 0.3}}').
+
+Результаты сохраняются в cache/bench/<коммит>.json – для сравнения между
+коммитами (`--compare`).
+
+    python bench_pipeline.py                                        # только микро-бенчмарки
+    python bench_pipeline.py --cassette cache/cassettes/bench --record   # живой прогон с записью
+    python bench_pipeline.py --cassette cache/cassettes/bench --repeat 3 --history cache/report_history.sqlite
+    python bench_pipeline.py --compare 3f512e6                      # прогнать и сравнить с сохранённым
+    python bench_pipeline.py --compare 3f512e6 62629fc              # сравнить два сохранённых
+
+Запись (`--record`) – настоящий запуск отчёта: он уходит в CHANNEL_ID/TG_CHATS,
+для записи лучше указать тестовый канал.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(ROOT, "cache", "bench")
+
+# Файлы состояния запуска → имя во временном каталоге
+STATE_FILES = {
+    "GPT_CACHE_PATH": "gpt_cache.sqlite",
+    "MACRO_CACHE_PATH": "macro_series.json",
+    "INDICATORS_STATE_PATH": "indicators.json",
+    "NEWS_SEEN_PATH": "news_seen.json",
+    "PRICE_STORE_PATH": "prices.sqlite",
+    "REPORT_HISTORY_PATH": "report_history.sqlite",
+    "TG_OUTBOX_PATH": "tg_outbox.sqlite",
+}
+# Ключи API: при записи в кассету сохраняются только имена заданных, при воспроизведении
+# для них ставится заглушка – ридеры идут по тем же веткам, что и при записи
+API_KEYS = ("OPENAI_KEY", "TG_TOKEN", "CHANNEL_ID", "MARKETAUX_KEY", "COINMARKETCAP_KEY",
+            "ALPHA_KEY", "FRED_KEY", "NEWSAPI_KEY", "YOUTUBE_KEY", "MASTODON_TOKEN")
+ENV_META = "bench_env.json"
+
+# Ридеры: имя → (модуль, функция, аргументы)
+READERS = {
+    "crypto": ("market_reader", "fetch_crypto", {"extended": True}),
+    "fng": ("fng_reader", "fetch_fear_and_greed", {}),
+    "derivatives": ("metrics_reader", "fetch_derivatives", {}),
+    "macro": ("macro_reader", "fetch_macro", {}),
+    "market": ("market_reader", "fetch_market", {}),
+    "whales": ("whale_alert_reader", "get_whale_activity_summary", {}),
+    "quotes": ("influencer_quotes_reader", "collect_raw_quotes", {}),
+    "news_pool": ("news_reader", "get_news_pool_for_gpt_analysis", {}),
+}
+
+
+def peak_rss_mb() -> float:
+    """Пиковый RSS процесса, МБ.
+
+    В Linux – VmHWM: ru_maxrss наследуется через fork+exec и показал бы пик
+    родительского процесса. В остальных системах – ru_maxrss (байты в macOS).
+    """
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+# ── ЗАМЕР В ПРОЦЕССЕ-ИСПОЛНИТЕЛЕ ────────────────────────────────────────────────
+
+def _counters() -> tuple[int, int, list]:
+    import gpt_client
+    import http_client
+    stats = http_client.get_stats().values()
+    return sum(int(st["calls"]) for st in stats), sum(int(st["errors"]) for st in stats), gpt_client.get_call_records()
+
+
+def _make_timer():
+    from stage_timer import StageTimer
+
+    class BenchTimer(StageTimer):
+        """StageTimer, который по каждому этапу ещё считает HTTP, GPT и пиковый RSS."""
+
+        def __init__(self):
+            super().__init__()
+            self.extra: dict[str, dict] = {}
+
+        @contextmanager
+        def stage(self, name):
+            http_before, errors_before, gpt_before = _counters()
+            rss_before = peak_rss_mb()
+            try:
+                with super().stage(name) as stat:
+                    yield stat
+            finally:
+                http_after, errors_after, gpt_after = _counters()
+                calls = gpt_after[len(gpt_before):]
+                self.extra[name] = {
+                    "peak_rss_mb": round(peak_rss_mb(), 1),
+                    "rss_growth_mb": round(peak_rss_mb() - rss_before, 1),
+                    "http_calls": http_after - http_before,
+                    "http_errors": errors_after - errors_before,
+                    "gpt_calls": len(calls),
+                    "gpt_cached": sum(rec.cached for rec in calls),
+                    "gpt_tokens": sum(rec.total_tokens for rec in calls if not rec.cached),
+                }
+
+        def result(self) -> dict:
+            return {name: {**stat, **self.extra.get(name, {})} for name, stat in self.as_dict().items()}
+
+    return BenchTimer()
+
+
+def run_worker(target: str) -> dict:
+    """Один сквозной замер в текущем процессе: 'pipeline' или 'reader:<имя>'."""
+    wall_started, cpu_started = time.perf_counter(), time.process_time()
+    timer = _make_timer()
+    error = None
+    if target == "pipeline":
+        with timer.stage("import"):
+            import main
+        main.run_report(stream_mode=False, timer=timer)
+    else:
+        module_name, func_name, kwargs = READERS[target.split(":", 1)[1]]
+        with timer.stage("import"):
+            module = __import__(module_name)
+        with timer.stage("fetch"):
+            value = getattr(module, func_name)(**kwargs)
+        error = getattr(value, "error", None)
+    import http_client
+    return {
+        "wall": round(time.perf_counter() - wall_started, 3),
+        "cpu": round(time.process_time() - cpu_started, 3),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "http_calls": sum(extra["http_calls"] for extra in timer.extra.values()),
+        "gpt_calls": sum(extra["gpt_calls"] for extra in timer.extra.values()),
+        "http_hosts": {host: int(st["calls"]) for host, st in http_client.get_stats().items()},
+        "error": error,
+        "stages": timer.result(),
+    }
+
+
+# ── ЗАПУСК ИСПОЛНИТЕЛЕЙ ─────────────────────────────────────────────────────────
+
+def _worker_env(state_dir: str, cassette: str, mode: str, history: str | None) -> dict:
+    env = {**os.environ, "HTTP_REPLAY_MODE": mode, "HTTP_CASSETTE_DIR": os.path.abspath(cassette),
+           "PYTHONDONTWRITEBYTECODE": "1"}
+    env.update({var: os.path.join(state_dir, name) for var, name in STATE_FILES.items()})
+    if history:
+        shutil.copyfile(history, env["REPORT_HISTORY_PATH"])
+    if mode == "replay":
+        recorded = API_KEYS
+        meta_path = os.path.join(cassette, ENV_META)
+        if os.path.exists(meta_path):
+            with open(meta_path, encoding="utf-8") as f:
+                recorded = json.load(f)["keys"]
+        for key in API_KEYS:
+            if key in recorded:
+                env.setdefault(key, "-100" if key == "CHANNEL_ID" else "replay")
+            else:
+                env.pop(key, None)
+    return env
+
+
+def spawn(target: str, cassette: str, mode: str = "replay", history: str | None = None) -> dict:
+    """Замер target в отдельном процессе с чистым каталогом состояния."""
+    with tempfile.TemporaryDirectory(prefix="bench_") as state_dir:
+        out = os.path.join(state_dir, "result.json")
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--worker", target, "--out", out],
+            cwd=ROOT, env=_worker_env(state_dir, cassette, mode, history),
+            capture_output=True, text=True,
+        )
+        if proc.returncode != 0 or not os.path.exists(out):
+            tail = (proc.stdout + proc.stderr)[-2000:]
+            raise RuntimeError(f"{target} завершился с кодом {proc.returncode}:\n{tail}")
+        with open(out, encoding="utf-8") as f:
+            return json.load(f)
+
+
+def median_run(runs: list[dict]) -> dict:
+    """Прогон с медианным стенным временем (этапы и счётчики – из одного прогона)."""
+    ordered = sorted(runs, key=lambda run: run["wall"])
+    return {**ordered[len(ordered) // 2], "runs": len(runs), "wall_all": [run["wall"] for run in runs]}
+
+
+def record_cassette(cassette: str) -> None:
+    os.makedirs(cassette, exist_ok=True)
+    with open(os.path.join(cassette, ENV_META), "w", encoding="utf-8") as f:
+        json.dump({"keys": [key for key in API_KEYS if os.getenv(key)],
+                   "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                   "commit": git_revision()}, f, indent=1)
+    print(f"⏺ Запись кассеты {cassette}: живой прогон отчёта (отправка в Telegram!)...")
+    result = spawn("pipeline", cassette, mode="record")
+    print(f"   записано за {result['wall']:.1f}с, HTTP-запросов {result['http_calls']}, GPT {result['gpt_calls']}")
+
+
+# ── МИКРО-БЕНЧМАРКИ ─────────────────────────────────────────────────────────────
+
+def timings(func, repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return {"best_ms": round(min(samples) * 1000, 3), "median_ms": round(statistics.median(samples) * 1000, 3)}
+
+
+def synthetic_candles(n_tickers: int, n_days: int, seed: int = 7):
+    """Случайное блуждание цен и объёмов: матрицы Close и Volume (даты × тикеры)."""
+    import numpy as np
+    import pandas as pd
+    rnd = np.random.default_rng(seed)
+    index = pd.date_range(end="2026-09-30", periods=n_days, freq="D")
+    columns = [f"T{i}" for i in range(n_tickers)]
+    close = 100 * np.exp(np.cumsum(rnd.normal(0, 0.02, (n_days, n_tickers)), axis=0))
+    volume = rnd.lognormal(14, 0.4, (n_days, n_tickers))
+    return pd.DataFrame(close, index, columns), pd.DataFrame(volume, index, columns)
+
+
+def run_micro(sizes: list[int], repeat: int) -> dict[str, dict]:
+    from bench_chunker import synthetic_report
+    from main import TG_LIMIT_BYTES, prepare_text, smart_chunk
+    import delta_engine
+    import indicators
+    import ta_signals
+
+    results = {}
+    for size in sizes:
+        text = synthetic_report(size)
+        results[f"prepare_text[{size}]"] = timings(lambda: prepare_text(text), repeat)
+        prepared = prepare_text(text)
+        results[f"smart_chunk[{size}]"] = timings(lambda: smart_chunk(prepared, TG_LIMIT_BYTES, split_reserve=40), repeat)
+
+    for n_tickers in (13, 100):      # топ-10 монет + индексы; запас по числу тикеров
+        close, volume = synthetic_candles(n_tickers, 210)
+        signals = ta_signals.compute_signals(close, volume)
+        labels = {ticker: ticker for ticker in close.columns}
+        results[f"ta.compute_signals[{n_tickers}x210]"] = timings(lambda: ta_signals.compute_signals(close, volume), repeat)
+        results[f"ta.signal_records[{n_tickers}]"] = timings(lambda: ta_signals.signal_records(signals, labels), repeat)
+
+    close, volume = synthetic_candles(1, 400)
+    history = close.rename(columns={"T0": "Close"}).assign(Volume=volume["T0"])
+    state = indicators.IndicatorState.from_history(history.iloc[:-1])
+    last = history.iloc[-1]
+    results["indicators.full_snapshot[400]"] = timings(lambda: indicators.full_snapshot(history), repeat)
+    results["indicators.from_history[400]"] = timings(lambda: indicators.IndicatorState.from_history(history.iloc[:-1]), repeat)
+    results["indicators.snapshot"] = timings(lambda: state.snapshot(float(last["Close"]), float(last["Volume"])), repeat)
+
+    days = [f"2026-09-{day:02d}" for day in range(1, 30)]
+    metric_close, _ = synthetic_candles(60, len(days) + 1)
+    keys = [f"crypto.{ticker}.price" for ticker in metric_close.columns]
+    history_rows = {day: dict(zip(keys, metric_close.iloc[i])) for i, day in enumerate(days)}
+    current = dict(zip(keys, metric_close.iloc[-1]))
+    results["delta_engine.compute_moves[60x29]"] = timings(
+        lambda: delta_engine.compute_moves(current, days, history_rows), repeat)
+    return results
+
+
+# ── СОХРАНЕНИЕ И СРАВНЕНИЕ ──────────────────────────────────────────────────────
+
+def git_revision() -> str:
+    def git(*args):
+        return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    sha = git("rev-parse", "--short", "HEAD") or "nogit"
+    return sha + ("-dirty" if git("status", "--porcelain", "--untracked-files=no") else "")
+
+
+def load_results(ref: str) -> dict:
+    """Сохранённый прогон: путь к файлу или (префикс) коммита в cache/bench."""
+    if os.path.isfile(ref):
+        path = ref
+    else:
+        names = sorted(name for name in os.listdir(RESULTS_DIR) if name.startswith(ref)) if os.path.isdir(RESULTS_DIR) else []
+        if not names:
+            raise SystemExit(f"Нет сохранённого прогона для {ref} в {RESULTS_DIR}")
+        path = os.path.join(RESULTS_DIR, names[0])
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _flatten(results: dict) -> dict[str, float]:
+    """Сравнимые величины прогона: имя → мс."""
+    flat = {f"micro {name}": value["best_ms"] for name, value in results.get("micro", {}).items()}
+    pipeline = results.get("pipeline")
+    if pipeline:
+        flat["pipeline total"] = pipeline["wall"] * 1000
+        flat.update({f"pipeline {name}": stage["wall"] * 1000 for name, stage in pipeline["stages"].items()})
+    for name, reader in results.get("readers", {}).items():
+        flat[f"reader {name}"] = reader["wall"] * 1000
+    return flat
+
+
+def compare(base: dict, current: dict) -> None:
+    old, new = _flatten(base), _flatten(current)
+    print(f"\nСравнение {base['commit']} → {current['commit']} (мс; ⚠️ – медленнее на 10%+):")
+    print(f"  {'замер':<44} {'было':>10} {'стало':>10} {'изм.':>8}")
+    for name in [name for name in new if name in old]:
+        before, after = old[name], new[name]
+        change = (after - before) / before * 100 if before else 0.0
+        mark = " ⚠️" if change >= 10 else ""
+        print(f"  {name:<44} {before:>10.2f} {after:>10.2f} {change:>+7.1f}%{mark}")
+
+
+# ── ВЫВОД ───────────────────────────────────────────────────────────────────────
+
+def print_run(title: str, run: dict) -> None:
+    error = f", ошибка: {run['error']}" if run.get("error") else ""
+    print(f"\n{title}: {run['wall']:.2f}с (CPU {run['cpu']:.2f}с), пиковый RSS {run['peak_rss_mb']:.0f} МБ, "
+          f"HTTP {run['http_calls']}, GPT {run['gpt_calls']}{error}")
+    print(f"  {'этап':<20} {'стена, с':>9} {'CPU, с':>8} {'RSS, МБ':>8} {'+RSS':>6} {'HTTP':>5} {'ошиб.':>6} {'GPT':>4} {'кеш':>4}")
+    for name, stage in run["stages"].items():
+        print(f"  {name:<20} {stage['wall']:>9.3f} {stage['cpu']:>8.3f} {stage['peak_rss_mb']:>8.0f} "
+              f"{stage['rss_growth_mb']:>6.0f} {stage['http_calls']:>5} {stage['http_errors']:>6} "
+              f"{stage['gpt_calls']:>4} {stage['gpt_cached']:>4}")
+        for block, elapsed in sorted(stage["blocks"].items(), key=lambda kv: kv[1], reverse=True):
+            print(f"      {block:<16} {elapsed:>9.3f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Сквозной бенчмарк отчёта по этапам")
+    parser.add_argument("--cassette", help="кассета http_replay для pipeline и ридеров")
+    parser.add_argument("--record", action="store_true", help="сначала записать кассету живым прогоном")
+    parser.add_argument("--history", help="report_history.sqlite, с которой стартует прогон (для delta_engine)")
+    parser.add_argument("--repeat", type=int, default=1, help="прогонов pipeline и каждого ридера")
+    parser.add_argument("--micro-repeat", type=int, default=20)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20_000, 200_000])
+    parser.add_argument("--skip-readers", action="store_true")
+    parser.add_argument("--compare", nargs="+", metavar="REF", help="коммит или файл; два – сравнить сохранённые")
+    parser.add_argument("--out", help="куда сохранить результат (по умолчанию cache/bench/<коммит>.json)")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(run_worker(args.worker), f, ensure_ascii=False)
+        return
+    if args.compare and len(args.compare) == 2:
+        compare(load_results(args.compare[0]), load_results(args.compare[1]))
+        return
+
+    results = {
+        "commit": git_revision(),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "cassette": args.cassette,
+    }
+    print("Микро-бенчмарки (синтетические данные):")
+    results["micro"] = run_micro(args.sizes, args.micro_repeat)
+    for name, value in results["micro"].items():
+        print(f"  {name:<40} лучший {value['best_ms']:>9.3f} мс, медиана {value['median_ms']:>9.3f} мс")
+
+    if args.cassette:
+        if args.record:
+            record_cassette(args.cassette)
+        results["pipeline"] = median_run([spawn("pipeline", args.cassette, history=args.history)
+                                          for _ in range(args.repeat)])
+        print_run("main.run_report()", results["pipeline"])
+        if not args.skip_readers:
+            results["readers"] = {}
+            for name in READERS:
+                run = median_run([spawn(f"reader:{name}", args.cassette) for _ in range(args.repeat)])
+                results["readers"][name] = run
+                print_run(f"Ридер {name}", run)
+
+    out = args.out or os.path.join(RESULTS_DIR, f"{results['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=1)
+    print(f"\n💾 Результат: {out}")
+    if args.compare:
+        compare(load_results(args.compare[0]), results)
+
+
+if __name__ == "__main__":
+    main()
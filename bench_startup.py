@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""bench_startup.py
+Бенчмарк холодного старта: сколько стоит `import main` и что именно грузится.
+
+Запускает отдельный интерпретатор с `-X importtime` (каждый прогон – чистый
+процесс, без кеша модулей), разбирает отчёт CPython и печатает:
+    * общее время импорта модуля и время всего процесса (лучший из N);
+    * самые дорогие модули по собственному и накопленному времени;
+    * какие тяжёлые пакеты (yfinance, pandas, ta, openai, textblob, nltk)
+      всё-таки попали в импорт при старте – их там быть не должно.
+
+    python bench_startup.py                 # import main, 5 прогонов
+    python bench_startup.py --module market_reader --top 25 --repeat 3
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+
+HEAVY_PACKAGES = ("yfinance", "pandas", "numpy", "ta", "openai", "aiohttp", "textblob", "nltk")
+_LINE_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def run_importtime(module: str) -> tuple[list[tuple[str, int, int, int]], float]:
+    """Один холодный импорт: [(модуль, self мкс, cumulative мкс, глубина)], время процесса."""
+    env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+        capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - started
+    if proc.returncode != 0:
+        tail = "\n".join(line for line in proc.stderr.splitlines() if not line.startswith("import time:"))
+        raise RuntimeError(f"import {module} завершился с кодом {proc.returncode}:\n{tail[-2000:]}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        match = _LINE_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return rows, wall
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Бенчмарк времени старта (-X importtime)")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    runs = [run_importtime(args.module) for _ in range(args.repeat)]
+    rows, _ = min(runs, key=lambda run: run[1])
+    walls = sorted(wall for _, wall in runs)
+    top_level = next((cum for name, _, cum, _ in rows if name == args.module), 0)
+
+    print(f"import {args.module}: {top_level / 1000:.1f} мс (лучший прогон), "
+          f"процесс целиком: лучший {walls[0] * 1000:.0f} мс, медиана {walls[len(walls) // 2] * 1000:.0f} мс, "
+          f"модулей загружено: {len(rows)}")
+
+    print(f"\nСамые дорогие модули (собственное время), топ-{args.top}:")
+    for name, self_us, cum_us, _ in sorted(rows, key=lambda r: r[1], reverse=True)[:args.top]:
+        print(f"  {self_us / 1000:>8.1f} мс  (накопл. {cum_us / 1000:>8.1f} мс)  {name}")
+
+    print(f"\nСамые дорогие ветки (накопленное время, пакеты верхнего уровня), топ-{args.top}:")
+    roots: dict[str, int] = {}
+    for name, _, cum_us, _ in rows:
+        root = name.split(".")[0]
+        roots[root] = max(roots.get(root, 0), cum_us)
+    for root, cum_us in sorted(roots.items(), key=lambda kv: kv[1], reverse=True)[:args.top]:
+        print(f"  {cum_us / 1000:>8.1f} мс  {root}")
+
+    loaded_heavy = [pkg for pkg in HEAVY_PACKAGES if pkg in roots]
+    if loaded_heavy:
+        print(f"\n⚠️ Тяжёлые пакеты загружаются при старте: {', '.join(loaded_heavy)}")
+    else:
+        print("\n✅ Тяжёлые пакеты при старте не загружаются (" + ", ".join(HEAVY_PACKAGES) + ").")
+
+
+if __name__ == "__main__":
+    main()
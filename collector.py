@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""collector.py
+Параллельный сбор блоков отчёта.
+
+Все ридеры (`get_crypto_data`, `get_macro_block`, …) независимы друг от друга и
+упираются в сеть, поэтому `collect_blocks()` запускает их одновременно в пуле
+потоков. У каждого блока свой дедлайн: если API не ответил вовремя, блок
+получает запасное значение, а отчёт собирается без него.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from custom_logger import log
+
+# Дедлайн по умолчанию для одного блока, секунд.
+DEFAULT_DEADLINE: float = 60.0
+
+
+@dataclass
+class BlockTask:
+    """Описание одного блока: функция без аргументов, дедлайн и запасное значение."""
+    name: str
+    func: Callable[[], Any]
+    deadline: float = DEFAULT_DEADLINE
+    fallback: Any = ""
+
+
+@dataclass
+class BlockResult:
+    """Результат блока: значение (обычно текст), затраченное время и ошибка, если была."""
+    name: str
+    value: Any
+    elapsed: float
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def _timed(func: Callable[[], Any], started_at: list, started_event: threading.Event):
+    started = time.perf_counter()
+    started_at.append(started)     # дедлайн задачи считается от этого момента
+    started_event.set()
+    try:
+        return func(), time.perf_counter() - started, None
+    except Exception as exc:  # Ошибку отдаём наружу вместе со временем.
+        return None, time.perf_counter() - started, exc
+
+
+def collect_blocks(tasks: list[BlockTask], max_workers: Optional[int] = None) -> dict[str, BlockResult]:
+    """Запускает все задачи одновременно и ждёт каждую не дольше её дедлайна.
+
+    Дедлайн отсчитывается от момента, когда задача получила поток: если
+    max_workers меньше числа задач, ожидание в очереди не съедает её время.
+    Ожидание свободного потока тоже ограничено дедлайном (от старта этапа),
+    поэтому этап длится не дольше двух максимальных дедлайнов. Зависшие
+    потоки не блокируют возврат: их результат просто отбрасывается.
+    """
+    if not tasks:
+        return {}
+
+    results: dict[str, BlockResult] = {}
+    executor = ThreadPoolExecutor(max_workers=max_workers or len(tasks), thread_name_prefix="collect")
+    started = time.perf_counter()
+    futures = []
+    for task in tasks:
+        started_at: list[float] = []
+        started_event = threading.Event()
+        futures.append((task, started_at, started_event,
+                        executor.submit(_timed, task.func, started_at, started_event)))
+    try:
+        for task, started_at, started_event, future in futures:
+            # Ждём свободный поток (не дольше дедлайна от старта этапа), затем – сам вызов
+            if started_event.wait(timeout=max(0.0, task.deadline - (time.perf_counter() - started))):
+                remaining = max(0.0, task.deadline - (time.perf_counter() - started_at[0]))
+            else:
+                remaining = 0.0
+            try:
+                value, elapsed, exc = future.result(timeout=remaining)
+            except FuturesTimeout:
+                future.cancel()
+                if started_at:
+                    elapsed = time.perf_counter() - started_at[0]
+                    error = f"таймаут {task.deadline:g}с"
+                else:
+                    elapsed = 0.0
+                    error = f"нет свободного потока {task.deadline:g}с"
+                log(f"⏱ Блок '{task.name}' не уложился в дедлайн ({error}).")
+                results[task.name] = BlockResult(task.name, task.fallback, elapsed, error)
+                continue
+
+            if exc is not None:
+                error = f"{type(exc).__name__}: {exc}"
+                log(f"❌ Блок '{task.name}' завершился ошибкой за {elapsed:.1f}с: {error}")
+                results[task.name] = BlockResult(task.name, task.fallback, elapsed, error)
+            else:
+                log(f"✅ Блок '{task.name}' получен за {elapsed:.1f}с.")
+                results[task.name] = BlockResult(task.name, value, elapsed)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    log(f"ℹ️ Сбор {len(tasks)} блоков занял {time.perf_counter() - started:.1f}с.")
+    return results
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""daemon.py
+Долгоживущий режим: расписание отчётов внутри процесса.
+
+Вместо одного холодного процесса на каждый отчёт (интерпретатор, импорты,
+новые TLS-сессии) процесс живёт постоянно, а отчёты запускаются по
+cron-выражениям. Между запусками сохраняются пул соединений `http_client`,
+кеш новостей и макро-данных в памяти, загруженные модули.
+
+Запуск: `python main.py --daemon` или RUN_MODE=daemon.
+
+Настройки через переменные окружения:
+    DAEMON_SCHEDULES – JSON {тип отчёта: cron}, например
+                       {"report": "0 8,20 * * *", "stream": "30 14 * * 1-5"};
+                       типы: report (обычный), stream (потоковый STREAM_MODE);
+    TZ               – часовой пояс расписания (та же обработка, что в main);
+    PORT             – порт health-эндпоинта (GET /health – JSON, GET /metrics – текст);
+    DAEMON_LOCK_PATH – файл блокировки от второго экземпляра (`cache/daemon.lock`).
+
+Запуски не перекрываются: если отчёт ещё идёт, следующий срабатывающий
+по расписанию пропускается (с записью в лог и счётчиком в /health).
+"""
+
+from __future__ import annotations
+
+import fcntl
+import json
+import os
+import signal
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from custom_logger import log
+from stage_timer import StageTimer
+
+DEFAULT_SCHEDULES = {"report": "0 8 * * *"}
+REPORT_TYPES = ("report", "stream")
+LOCK_PATH: str = os.getenv("DAEMON_LOCK_PATH", os.path.join("cache", "daemon.lock"))
+MAX_IDLE_SLEEP = 30.0        # сек.; сон короткими отрезками – чтобы замечать SIGTERM и перевод часов
+
+try:
+    HEALTH_PORT: int = int(os.getenv("PORT", "8080"))
+except ValueError:
+    log("WARNING: Invalid PORT in .env, fallback to 8080")
+    HEALTH_PORT = 8080
+
+
+# ── CRON ────────────────────────────────────────────────────────────────────────
+
+class CronExpr:
+    """Cron-выражение из 5 полей: минута час день месяц день_недели.
+
+    Поддерживаются `*`, числа, диапазоны `a-b`, шаг `*/n` и `a-b/n`, списки
+    через запятую; день недели 0–7 (0 и 7 – воскресенье). Если ограничены
+    и день месяца, и день недели, достаточно совпадения любого (как в cron).
+    """
+
+    FIELDS = (("minute", 0, 59), ("hour", 0, 23), ("day", 1, 31), ("month", 1, 12), ("weekday", 0, 7))
+
+    def __init__(self, expr: str):
+        parts = expr.split()
+        if len(parts) != 5:
+            raise ValueError(f"ожидается 5 полей, получено {len(parts)}: {expr!r}")
+        self.expr = expr
+        values = [self._parse_field(part, lo, hi) for part, (_, lo, hi) in zip(parts, self.FIELDS)]
+        self.minutes, self.hours, self.days, self.months, weekdays = values
+        self.weekdays = {d % 7 for d in weekdays}
+        self.day_any, self.weekday_any = parts[2] == "*", parts[4] == "*"
+
+    @staticmethod
+    def _parse_field(field: str, lo: int, hi: int) -> set[int]:
+        result: set[int] = set()
+        for item in field.split(","):
+            rng, _, step_str = item.partition("/")
+            step = int(step_str) if step_str else 1
+            if rng == "*":
+                start, end = lo, hi
+            elif "-" in rng:
+                start, end = (int(x) for x in rng.split("-", 1))
+            else:
+                start = end = int(rng)
+                if step_str:
+                    end = hi
+            if step < 1 or not (lo <= start <= end <= hi):
+                raise ValueError(f"значение вне диапазона {lo}-{hi}: {item!r}")
+            result.update(range(start, end + 1, step))
+        return result
+
+    def _day_matches(self, dt: datetime) -> bool:
+        dom = dt.day in self.days
+        dow = (dt.weekday() + 1) % 7 in self.weekdays   # cron: 0 – воскресенье
+        if self.day_any or self.weekday_any:
+            return dom and dow
+        return dom or dow
+
+    def next_after(self, dt: datetime) -> datetime:
+        """Ближайший момент строго после dt (наивное локальное время, точность – минута)."""
+        dt = dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = dt + timedelta(days=366 * 5)
+        while dt < limit:
+            if dt.month not in self.months:
+                dt = (dt.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(dt):
+                dt = dt.replace(hour=0, minute=0) + timedelta(days=1)
+            elif dt.hour not in self.hours:
+                dt = dt.replace(minute=0) + timedelta(hours=1)
+            elif dt.minute not in self.minutes:
+                dt += timedelta(minutes=1)
+            else:
+                return dt
+        raise ValueError(f"выражение {self.expr!r} никогда не срабатывает")
+
+
+def load_schedules() -> dict[str, CronExpr]:
+    """Читает DAEMON_SCHEDULES; при ошибке – расписание по умолчанию."""
+    raw = os.getenv("DAEMON_SCHEDULES", "").strip()
+    try:
+        spec = json.loads(raw) if raw else DEFAULT_SCHEDULES
+        schedules = {}
+        for report_type, expr in spec.items():
+            if report_type not in REPORT_TYPES:
+                raise ValueError(f"неизвестный тип отчёта {report_type!r}")
+            schedules[report_type] = CronExpr(expr)
+    except (ValueError, TypeError, AttributeError) as e:
+        log(f"WARNING: Invalid DAEMON_SCHEDULES in .env ({e}), fallback to {DEFAULT_SCHEDULES}")
+        schedules = {name: CronExpr(expr) for name, expr in DEFAULT_SCHEDULES.items()}
+    return schedules
+
+
+# ── СОСТОЯНИЕ ДЛЯ HEALTH ────────────────────────────────────────────────────────
+
+class DaemonState:
+    """Состояние демона для /health и /metrics (доступ из потока HTTP-сервера)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.running: str | None = None
+        self.last_run: dict | None = None
+        self.next_runs: dict[str, str] = {}
+        self.runs_total = 0
+        self.failures_total = 0
+        self.skipped_total = 0
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                "status": "running" if self.running else "idle",
+                "running": self.running,
+                "uptime_sec": round(time.time() - self.started_at, 1),
+                "last_run": self.last_run,
+                "next_runs": dict(self.next_runs),
+                "runs_total": self.runs_total,
+                "failures_total": self.failures_total,
+                "skipped_total": self.skipped_total,
+            }
+
+
+def _metrics_text(snapshot: dict) -> str:
+    lines = [
+        f"dawn_daemon_uptime_seconds {snapshot['uptime_sec']}",
+        f"dawn_daemon_running {1 if snapshot['running'] else 0}",
+        f"dawn_daemon_runs_total {snapshot['runs_total']}",
+        f"dawn_daemon_failures_total {snapshot['failures_total']}",
+        f"dawn_daemon_skipped_total {snapshot['skipped_total']}",
+    ]
+    last = snapshot["last_run"]
+    if last:
+        lines.append(f"dawn_daemon_last_run_timestamp {last['finished_at']}")
+        lines.append(f"dawn_daemon_last_run_duration_seconds {last['duration']}")
+        lines.append(f"dawn_daemon_last_run_ok {1 if last['ok'] else 0}")
+        for stage, stat in (last.get("stages") or {}).items():
+            lines.append(f'dawn_daemon_stage_seconds{{stage="{stage}"}} {stat["wall"]}')
+            lines.append(f'dawn_daemon_stage_cpu_seconds{{stage="{stage}"}} {stat["cpu"]}')
+    return "\n".join(lines) + "\n"
+
+
+def start_health_server(state: DaemonState, port: int = HEALTH_PORT) -> ThreadingHTTPServer | None:
+    """Поднимает /health и /metrics в фоновом потоке."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = self.path.split("?", 1)[0]
+            if path in ("/", "/health"):
+                body, ctype = json.dumps(state.snapshot(), ensure_ascii=False).encode("utf-8"), "application/json"
+            elif path == "/metrics":
+                body, ctype = _metrics_text(state.snapshot()).encode("utf-8"), "text/plain; version=0.0.4"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):   # запросы health не засоряют лог
+            pass
+
+    try:
+        server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    except OSError as e:
+        log(f"⚠️ daemon: health-эндпоинт на порту {port} не поднят: {e}")
+        return None
+    threading.Thread(target=server.serve_forever, name="health", daemon=True).start()
+    log(f"🩺 daemon: health-эндпоинт http://0.0.0.0:{port}/health (метрики – /metrics).")
+    return server
+
+
+# ── ЗАПУСКИ ─────────────────────────────────────────────────────────────────────
+
+def _acquire_instance_lock():
+    """Файловая блокировка: второй демон на той же машине/томе не стартует."""
+    os.makedirs(os.path.dirname(LOCK_PATH) or ".", exist_ok=True)
+    handle = open(LOCK_PATH, "w")
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return None
+    handle.write(str(os.getpid()))
+    handle.flush()
+    return handle
+
+
+def _run_job(report_type: str, jobs: dict, state: DaemonState, run_lock: threading.Lock) -> None:
+    started = time.time()
+    timer = StageTimer()
+    ok, error = True, None
+    log(f"⏰ daemon: запуск отчёта '{report_type}'.")
+    try:
+        if jobs.get("before_run"):
+            jobs["before_run"]()
+        jobs["run_report"](stream_mode=report_type == "stream", timer=timer)
+    except Exception as e:
+        ok, error = False, f"{type(e).__name__}: {e}"
+        if jobs.get("on_error"):
+            jobs["on_error"](e)
+    finally:
+        finished = time.time()
+        with state.lock:
+            state.running = None
+            state.runs_total += 1
+            state.failures_total += 0 if ok else 1
+            state.last_run = {
+                "type": report_type,
+                "started_at": round(started, 3),
+                "finished_at": round(finished, 3),
+                "duration": round(finished - started, 3),
+                "ok": ok,
+                "error": error,
+                "stages": timer.as_dict(),
+            }
+        run_lock.release()
+        log(f"{'✅' if ok else '❌'} daemon: отчёт '{report_type}' завершён за {finished - started:.1f}с.")
+
+
+def _dispatch(report_type: str, jobs: dict, state: DaemonState,
+              run_lock: threading.Lock) -> threading.Thread | None:
+    """Запускает отчёт в отдельном потоке, если предыдущий уже завершился."""
+    if not run_lock.acquire(blocking=False):
+        with state.lock:
+            state.skipped_total += 1
+            busy = state.running
+        log(f"⚠️ daemon: отчёт '{report_type}' пропущен – ещё выполняется '{busy}'.")
+        return None
+    with state.lock:
+        state.running = report_type
+    thread = threading.Thread(target=_run_job, args=(report_type, jobs, state, run_lock), name=f"report-{report_type}")
+    thread.start()
+    return thread
+
+
+def run_daemon(run_report, *, tz, before_run=None, on_error=None) -> None:
+    """Главный цикл демона: ждёт ближайшее срабатывание расписания и запускает отчёт.
+
+    run_report(stream_mode=..., timer=...) – один отчёт (main.run_report);
+    before_run() – действие перед каждым отчётом (досылка очереди Telegram);
+    on_error(exc) – реакция на исключение отчёта (уведомление в канал);
+    tz – часовой пояс расписания.
+    """
+    jobs = {"run_report": run_report, "before_run": before_run, "on_error": on_error}
+    instance_lock = _acquire_instance_lock()
+    if instance_lock is None:
+        log(f"📛 daemon: уже запущен другой экземпляр (блокировка {LOCK_PATH}). Выход.")
+        return
+
+    schedules = load_schedules()
+    state = DaemonState()
+    run_lock = threading.Lock()
+    stop = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stop.set())
+    server = start_health_server(state)
+
+    def local_now() -> datetime:
+        return datetime.now(tz).replace(tzinfo=None)
+
+    now = local_now()
+    next_fire = {name: cron.next_after(now) for name, cron in schedules.items()}
+    log("🗓 daemon: расписание (" + str(tz) + "): "
+        + "; ".join(f"{name} '{cron.expr}' → {next_fire[name]:%d.%m %H:%M}" for name, cron in schedules.items()))
+
+    worker: threading.Thread | None = None
+    while not stop.is_set():
+        with state.lock:
+            state.next_runs = {name: f"{at:%Y-%m-%d %H:%M}" for name, at in next_fire.items()}
+        name, fire_at = min(next_fire.items(), key=lambda item: item[1])
+        wait = (fire_at - local_now()).total_seconds()
+        if wait > 0:
+            stop.wait(min(wait, MAX_IDLE_SLEEP))
+            continue
+        worker = _dispatch(name, jobs, state, run_lock) or worker
+        next_fire[name] = schedules[name].next_after(max(fire_at, local_now()))
+
+    log("🛑 daemon: получен сигнал остановки.")
+    if worker is not None and worker.is_alive():
+        log("⏳ daemon: ждём завершения текущего отчёта...")
+        worker.join()
+    if server is not None:
+        server.shutdown()
+    instance_lock.close()
+    log("🏁 daemon: остановлен.")
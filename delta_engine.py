@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""delta_engine.py
+Числовые изменения показателей «к прошлому отчёту» и их необычность.
+
+Текущие метрики запуска (`metrics()` записей ридеров) сравниваются с
+историей из `report_history` (последний запуск на каждый из прошлых
+DELTA_WINDOW_DAYS дней). Вся история укладывается в матрицу
+(дни × метрики), и за один векторный проход считаются:
+    * изменение к предыдущему дню (для цен – в %, для уровней – разница;
+      метрики, которые сами являются изменением – например, % за 24ч, –
+      берутся как есть);
+    * z-оценка текущего изменения относительно изменений в окне.
+
+Крупные движения (|z| ≥ DELTA_Z_THRESHOLD, а при короткой истории –
+выход за абсолютные пороги ABS_THRESHOLDS) попадают в компактный блок
+«🔎 Что изменилось», который идёт в отчёт и в запрос основного анализа
+GPT, чтобы модель не вычисляла их заново из текста.
+
+Настройки: DELTA_WINDOW_DAYS (30), DELTA_Z_THRESHOLD (2), DELTA_MIN_SAMPLES (5),
+DELTA_MAX_LINES (8).
+"""
+
+from __future__ import annotations
+
+import html
+import os
+from dataclasses import dataclass
+
+import numpy as np
+
+import report_history
+from custom_logger import log
+
+try:
+    WINDOW_DAYS: int = int(os.getenv("DELTA_WINDOW_DAYS", "30"))
+    Z_THRESHOLD: float = float(os.getenv("DELTA_Z_THRESHOLD", "2"))
+    MIN_SAMPLES: int = int(os.getenv("DELTA_MIN_SAMPLES", "5"))
+    MAX_LINES: int = int(os.getenv("DELTA_MAX_LINES", "8"))
+except ValueError:
+    log("WARNING: Invalid DELTA_WINDOW_DAYS/DELTA_Z_THRESHOLD/DELTA_MIN_SAMPLES/DELTA_MAX_LINES in .env, "
+        "fallback to defaults")
+    WINDOW_DAYS, Z_THRESHOLD, MIN_SAMPLES, MAX_LINES = 30, 2.0, 5, 8
+
+# Последнее поле ключа метрики → (вид изменения, абсолютный порог при короткой истории).
+#   pct   – изменение в % к прошлому значению (цены);
+#   diff  – разница к прошлому значению (уровни: F&G, доля лонгов, ставки);
+#   value – метрика уже является изменением, оценивается само значение.
+# Порог None – метрика в блок не выводится (дублирует соседнюю).
+ABS_THRESHOLDS: dict[str, tuple[str, float | None]] = {
+    "price": ("pct", 5.0),
+    "change_24h": ("value", 8.0),
+    "change_pct": ("value", 2.0),
+    "market_cap_change_24h": ("value", 3.0),
+    "value": ("diff", 10.0),            # fng.value
+    "long_pct": ("diff", 5.0),
+    "short_pct": ("diff", None),
+    "ls_ratio": ("diff", None),
+    "cpi": ("diff", 0.01),
+    "ppi": ("diff", 0.01),
+    "rate": ("diff", 0.01),
+    "unemp": ("diff", 0.01),
+}
+
+_FIELD_TITLES = {
+    "price": "",
+    "change_24h": "% за 24ч",
+    "change_pct": "% за день",
+    "long_pct": "лонги, %",
+    "cpi": "CPI, %",
+    "ppi": "PPI, %",
+    "rate": "ставка, %",
+    "unemp": "безработица, %",
+}
+_KEY_TITLES = {
+    "crypto.market_cap_change_24h": "Капитализация крипторынка, % за 24ч",
+    "fng.value": "Индекс страха и жадности",
+}
+
+
+@dataclass
+class Move:
+    """Изменение одной метрики к прошлому отчёту."""
+    key: str
+    value: float
+    previous: float | None      # значение в последнем прошлом дне окна
+    change: float               # изменение в единицах вида (%, разница или само значение)
+    kind: str
+    z: float | None             # None – истории меньше MIN_SAMPLES
+    samples: int
+
+    @property
+    def title(self) -> str:
+        if self.key in _KEY_TITLES:
+            return _KEY_TITLES[self.key]
+        _, _, rest = self.key.partition(".")
+        name, _, field = rest.rpartition(".")
+        suffix = _FIELD_TITLES.get(field, field)
+        return f"{name}, {suffix}" if suffix else name
+
+
+def _field(key: str) -> str:
+    return key.rsplit(".", 1)[-1]
+
+
+# ── РАСЧЁТ ──────────────────────────────────────────────────────────────────────
+
+def compute_moves(current: dict[str, float], days: list[str],
+                  history: dict[str, dict[str, float]]) -> list[Move]:
+    """Изменения и z-оценки всех метрик current одним проходом по матрице (дни × метрики)."""
+    keys = [key for key in current if _field(key) in ABS_THRESHOLDS]
+    if not keys:
+        return []
+    matrix = np.full((len(days) + 1, len(keys)), np.nan)
+    for row, day in enumerate(days):
+        values = history[day]
+        matrix[row] = [values.get(key, np.nan) for key in keys]
+    matrix[-1] = [current[key] for key in keys]
+
+    kinds = np.array([ABS_THRESHOLDS[_field(key)][0] for key in keys])
+    # Прошлое значение – последнее известное (пропуски дней не рвут ряд): previous[i] – значение до строки i
+    rows = np.arange(len(matrix))[:, None]
+    last_known = np.maximum.accumulate(np.where(np.isnan(matrix), 0, rows), axis=0)
+    filled = matrix[last_known, np.arange(len(keys))]
+    previous = np.vstack([np.full(len(keys), np.nan), filled[:-1]])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pct = (matrix - previous) / np.abs(previous) * 100
+        changes = np.where(kinds == "pct", pct, np.where(kinds == "diff", matrix - previous, matrix))
+        changes[np.isinf(changes)] = np.nan
+        past = changes[:-1]
+        samples = np.sum(~np.isnan(past), axis=0)
+        mean = np.nanmean(np.where(samples > 0, past, 0.0), axis=0)
+        std = np.nanstd(np.where(samples > 0, past, 0.0), axis=0)
+        z = (changes[-1] - mean) / std
+
+    moves = []
+    for col, key in enumerate(keys):
+        change = changes[-1, col]
+        if np.isnan(change):
+            continue
+        has_z = samples[col] >= MIN_SAMPLES and np.isfinite(z[col])
+        prev = previous[-1, col]
+        moves.append(Move(
+            key=key, value=current[key], previous=None if np.isnan(prev) else float(prev),
+            change=float(change), kind=str(kinds[col]),
+            z=float(z[col]) if has_z else None, samples=int(samples[col]),
+        ))
+    return moves
+
+
+def significant(moves: list[Move]) -> list[Move]:
+    """Крупные движения, от самых необычных к менее заметным."""
+    picked = []
+    for move in moves:
+        threshold = ABS_THRESHOLDS[_field(move.key)][1]
+        if threshold is None:
+            continue
+        score = abs(move.z) / Z_THRESHOLD if move.z is not None else abs(move.change) / threshold
+        if score >= 1 and abs(move.change) >= threshold * 0.1:   # z без ощутимого движения не показываем
+            picked.append((score, move))
+    picked.sort(key=lambda item: item[0], reverse=True)
+    return [move for _, move in picked]
+
+
+# ── ВЫВОД ───────────────────────────────────────────────────────────────────────
+
+def _fmt(value: float) -> str:
+    return f"{value:,.2f}".replace(",", " ") if abs(value) >= 100 else f"{value:.2f}"
+
+
+def format_changes(moves: list[Move], *, escape: bool = True) -> str:
+    """Блок «🔎 Что изменилось» (пустая строка, если крупных движений нет)."""
+    lines = []
+    for move in moves[:MAX_LINES]:
+        if move.kind == "pct":
+            change = f"{move.change:+.1f}% к прошлому отчёту"
+        elif move.kind == "diff":
+            change = f"{move.change:+.2f} к прошлому отчёту, было {_fmt(move.previous)}"
+        else:
+            change = "необычно для последних дней" if move.z is not None else "крупное движение"
+        unusual = f", z={move.z:+.1f}" if move.z is not None else ""
+        title = html.escape(move.title, quote=False) if escape else move.title
+        lines.append(f"— {title}: {_fmt(move.value)} ({change}{unusual})")
+    return "🔎 Что изменилось:\n" + "\n".join(lines) if lines else ""
+
+
+def detect_changes(current: dict[str, float], before_day: str) -> list[Move]:
+    """Крупные движения текущих метрик относительно истории до before_day (не включая)."""
+    days, history = report_history.metric_window(list(current), WINDOW_DAYS, before_day)
+    if not days:
+        log("🔎 delta_engine: истории прошлых дней нет – блок изменений пропущен.")
+        return []
+    moves = compute_moves(current, days, history)
+    picked = significant(moves)
+    log(f"🔎 delta_engine: {len(moves)} метрик к {len(days)} прошлым дням, крупных движений: {len(picked)}.")
+    return picked
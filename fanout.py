@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""fanout.py
+Рассылка одного собранного отчёта в несколько чатов Telegram.
+
+Отчёт собирается один раз в нейтральную форму `Report` (текст в разметке
+Telegram-HTML + подвал), а для каждого чата отдельно рендерится по его
+правилам: свой лимит байт на сообщение, HTML или простой текст, нумерация
+частей. Чаты обслуживаются параллельно (`collector.collect_blocks`), части
+каждого чата идут через `tg_outbox`, поэтому порядок, 429 и досылка после
+сбоя работают для каждого чата независимо.
+
+Список чатов – переменная окружения TG_CHATS (JSON):
+    [{"chat_id": "@channel", "limit": 3400, "format": "html"},
+     {"chat_id": "-1001234567890", "format": "plain", "numbered": false}]
+Без TG_CHATS используется один CHANNEL_ID с настройками по умолчанию.
+"""
+
+from __future__ import annotations
+
+import html
+import json
+import os
+import re
+from dataclasses import dataclass
+
+from collector import BlockTask, collect_blocks
+from custom_logger import log
+from tg_chunker import chunk_text
+from tg_outbox import deliver_pending, enqueue, statuses
+
+DEFAULT_LIMIT_BYTES = 3400
+NUMERATION_RESERVE = 40            # байт под «Часть i/N:»
+TELEGRAM_HARD_LIMIT = 4096
+
+try:
+    DELIVERY_DEADLINE: float = float(os.getenv("TG_FANOUT_DEADLINE", "600"))
+except ValueError:
+    log("WARNING: Invalid TG_FANOUT_DEADLINE in .env, fallback to 600")
+    DELIVERY_DEADLINE = 600.0
+
+_LINK_RE = re.compile(r'<a\s[^>]*href="([^"]*)"[^>]*>(.*?)</a>', re.IGNORECASE | re.DOTALL)
+_TAG_RE = re.compile(r"<[^>]+>")
+
+
+@dataclass
+class Report:
+    """Нейтральная форма отчёта: тело в Telegram-HTML и подвал для последней части."""
+    body: str
+    footer: str = ""
+
+
+@dataclass
+class ChatTarget:
+    """Чат-получатель и правила рендеринга для него."""
+    chat_id: str
+    limit_bytes: int = DEFAULT_LIMIT_BYTES
+    html: bool = True
+    numbered: bool = True
+
+
+@dataclass
+class ChatDelivery:
+    """Итог доставки в один чат."""
+    chat_id: str
+    parts: int = 0
+    sent: int = 0
+    failed: int = 0
+    pending: int = 0
+    error: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.parts > 0 and self.sent == self.parts
+
+
+# ── НАСТРОЙКА ───────────────────────────────────────────────────────────────────
+
+def load_targets(default_chat_id: str | None, default_limit: int = DEFAULT_LIMIT_BYTES) -> list[ChatTarget]:
+    """Читает TG_CHATS; при ошибке или отсутствии – один default_chat_id."""
+    fallback = [ChatTarget(str(default_chat_id), default_limit)] if default_chat_id else []
+    raw = os.getenv("TG_CHATS", "").strip()
+    if not raw:
+        return fallback
+    try:
+        targets = []
+        for item in json.loads(raw):
+            if isinstance(item, (str, int)):
+                item = {"chat_id": item}
+            fmt = str(item.get("format", "html")).lower()
+            if fmt not in ("html", "plain"):
+                raise ValueError(f"format={fmt!r}")
+            limit = int(item.get("limit", default_limit))
+            targets.append(ChatTarget(
+                chat_id=str(item["chat_id"]),
+                limit_bytes=min(limit, TELEGRAM_HARD_LIMIT),
+                html=fmt == "html",
+                numbered=bool(item.get("numbered", True)),
+            ))
+    except (ValueError, TypeError, KeyError, AttributeError) as e:
+        log(f"WARNING: Invalid TG_CHATS in .env ({e}), fallback to CHANNEL_ID")
+        return fallback
+    return targets or fallback
+
+
+# ── РЕНДЕРИНГ ───────────────────────────────────────────────────────────────────
+
+def to_plain(text: str) -> str:
+    """Telegram-HTML → простой текст: ссылки как «текст (url)», теги убираются, сущности раскрываются."""
+    text = _LINK_RE.sub(lambda m: f"{m.group(2)} ({m.group(1)})", text)
+    return html.unescape(_TAG_RE.sub("", text))
+
+
+def render(report: Report, target: ChatTarget) -> list[str]:
+    """Готовые сообщения для одного чата (нарезка, нумерация, подвал)."""
+    body = report.body if target.html else to_plain(report.body)
+    footer = report.footer if target.html else to_plain(report.footer)
+    reserve = NUMERATION_RESERVE if target.numbered else 0
+    parts = chunk_text(body, target.limit_bytes, html=target.html, split_reserve=reserve)
+    total = len(parts)
+    if total <= 1 or not target.numbered:
+        return parts
+    messages = []
+    for idx, part in enumerate(parts, 1):
+        message = f"Часть {idx}/{total}:\n\n{part}"
+        if idx == total and footer:
+            message += "\n\n" + footer
+        size = len(message.encode("utf-8"))
+        if size > TELEGRAM_HARD_LIMIT:
+            log(f"📛 ВНИМАНИЕ! {target.chat_id}: часть {idx}/{total} С ПРЕФИКСОМ СЛИШКОМ ДЛИННАЯ "
+                f"({size}Б > {TELEGRAM_HARD_LIMIT}Б). Telegram ОБРЕЖЕТ ЭТУ ЧАСТЬ!")
+        messages.append(message)
+    return messages
+
+
+# ── ДОСТАВКА ────────────────────────────────────────────────────────────────────
+
+def _deliver_to(token: str, target: ChatTarget, messages: list[str], report_id: str) -> ChatDelivery:
+    keys = enqueue(report_id, target.chat_id, messages, parse_mode="HTML" if target.html else None)
+    result = deliver_pending(token, target.chat_id, keys)
+    state = statuses(keys)
+    sent = sum(1 for key in keys if state.get(key) == "sent")
+    return ChatDelivery(target.chat_id, parts=len(keys), sent=sent, failed=result.failed, pending=result.pending)
+
+
+def publish(report: Report, targets: list[ChatTarget], token: str, report_id: str) -> dict[str, ChatDelivery]:
+    """Рендерит отчёт под каждый чат и доставляет во все чаты параллельно.
+
+    report_id – уникальный id этой публикации: ключи tg_outbox защищают от
+    повторной отправки только в её пределах.
+    """
+    tasks = []
+    for target in targets:
+        messages = render(report, target)
+        if not messages:
+            continue
+        tasks.append(BlockTask(
+            name=target.chat_id,
+            func=lambda target=target, messages=messages: _deliver_to(token, target, messages, report_id),
+            deadline=DELIVERY_DEADLINE,
+            fallback=None,
+        ))
+    deliveries: dict[str, ChatDelivery] = {}
+    for chat_id, block in collect_blocks(tasks).items():
+        delivery = block.value or ChatDelivery(chat_id)
+        if block.error:
+            delivery.error = block.error
+        deliveries[chat_id] = delivery
+        status = "✅" if delivery.ok else "⚠️"
+        log(f"{status} Чат {chat_id}: отправлено {delivery.sent}/{delivery.parts}, "
+            f"отклонено {delivery.failed}, в очереди {delivery.pending}"
+            + (f", ошибка: {delivery.error}" if delivery.error else "") + f" ({block.elapsed:.1f}с).")
+    return deliveries
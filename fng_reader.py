@@ -1,41 +1,28 @@
 # fng_reader.py
-import requests
+from http_client import http_get
+from records import FngReading
+from renderers import render_fng
 
-def get_fear_and_greed_index_text():
+def fetch_fear_and_greed():
     """
-    Получает значение Индекса страха и жадности с alternative.me API и добавляет пояснение.
-    Если данные не получены — возвращает пустую строку.
+    Получает значение Индекса страха и жадности с alternative.me API.
+    При ошибке или отсутствии данных – запись с error.
     """
     try:
         url = "https://api.alternative.me/fng/?limit=1"
-        headers = {
-            'User-Agent': 'MomentumPulseBot/1.0 (+https://t.me/MomentumPulse)'
-        }
-        r = requests.get(url, headers=headers, timeout=10)
+        r = http_get(url, timeout=10)
         r.raise_for_status()
         data = r.json().get("data", [])
-        if data:
-            value = int(data[0].get("value", "0"))
-            label = data[0].get("value_classification", "Unknown")
-
-            explanation = {
-                "Extreme Fear": "инвесторы паникуют, возможны хорошие точки входа",
-                "Fear": "рынок насторожен, возможна коррекция",
-                "Neutral": "настроения сбалансированы",
-                "Greed": "инвесторы активны, но возможна перекупленность",
-                "Extreme Greed": "рынок перегрет — велика вероятность коррекции"
-            }.get(label, "настроения неопределённые")
-
-            if value <= 25:
-                emoji = "🔴"
-            elif value <= 50:
-                emoji = "🟡"
-            else:
-                emoji = "🟢"
+        if not data:
+            return FngReading(error="нет данных")
+        return FngReading(value=int(data[0].get("value", "0")),
+                          label=data[0].get("value_classification", "Unknown"))
+    except Exception as e:
+        return FngReading(error=f"{type(e).__name__}: {e}")
 
-            # Добавляем \n в конце для создания дополнительного отступа при сборке
-            return f"{emoji} Индекс страха и жадности: {value} ({label}) — {explanation}.\n"
-        else:
-            return ""  # ничего не выводим при отсутствии данных
-    except Exception:
-        return ""  # ничего не выводим при ошибке
+def get_fear_and_greed_index_text():
+    """
+    Строка индекса с пояснением (renderers.render_fng).
+    Если данные не получены — возвращает пустую строку.
+    """
+    return render_fng(fetch_fear_and_greed())
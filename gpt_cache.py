@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""gpt_cache.py
+Постоянный кеш ответов OpenAI, адресуемый по содержимому запроса.
+
+Ключ – SHA-256 от модели, сообщений, temperature, max_tokens (и
+response_format), поэтому повторный запуск на тех же данных (ручной
+перезапуск, повтор после падения) получает готовый ответ мгновенно и без
+затрат токенов. Ответы лежат в SQLite (`cache/gpt_cache.sqlite`).
+Запросы к API делает `gpt_client`, здесь только `lookup()` / `store()`.
+
+Настройки через переменные окружения:
+    GPT_CACHE_TTL_SEC      – срок жизни ответа, сек. (по умолчанию 6 ч);
+    GPT_CACHE_MAX_ENTRIES  – максимум записей, лишние вытесняются по давности обращения (500);
+    GPT_CACHE_BYPASS=1     – не читать кеш (ответы всё равно сохраняются);
+    GPT_CACHE_PATH         – путь к файлу базы.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+from custom_logger import log
+
+CACHE_PATH: str = os.getenv("GPT_CACHE_PATH", os.path.join("cache", "gpt_cache.sqlite"))
+BYPASS: bool = os.getenv("GPT_CACHE_BYPASS", "").lower() in ("1", "true", "yes")
+
+try:
+    TTL_SEC: float = float(os.getenv("GPT_CACHE_TTL_SEC", str(6 * 3600)))
+    MAX_ENTRIES: int = int(os.getenv("GPT_CACHE_MAX_ENTRIES", "500"))
+except ValueError:
+    log("WARNING: Invalid GPT_CACHE_TTL_SEC/GPT_CACHE_MAX_ENTRIES in .env, fallback to defaults")
+    TTL_SEC, MAX_ENTRIES = 6 * 3600.0, 500
+
+# Параметры, которые влияют на ответ и потому входят в ключ
+KEY_FIELDS = ("model", "messages", "temperature", "max_tokens", "response_format")
+
+_lock = threading.Lock()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key         TEXT PRIMARY KEY,
+    model       TEXT,
+    created_at  REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    response    TEXT NOT NULL
+)
+"""
+
+
+# ── ВНУТРЕННИЕ ФУНКЦИИ ─────────────────────────────────────────────────────────
+
+def _connect() -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(CACHE_PATH) or ".", exist_ok=True)
+    conn = sqlite3.connect(CACHE_PATH, timeout=30)
+    conn.execute(_SCHEMA)
+    return conn
+
+
+def cache_key(request: dict) -> str:
+    payload = {name: request.get(name) for name in KEY_FIELDS}
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _get(key: str) -> dict | None:
+    now = time.time()
+    with _lock, closing(_connect()) as conn:
+        row = conn.execute("SELECT created_at, response FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if now - row[0] > TTL_SEC:
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            conn.commit()
+            return None
+        conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        conn.commit()
+        return json.loads(row[1])
+
+
+def _put(key: str, model: str, response: dict) -> None:
+    now = time.time()
+    with _lock, closing(_connect()) as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO responses (key, model, created_at, accessed_at, response) VALUES (?, ?, ?, ?, ?)",
+            (key, model, now, now, json.dumps(response, ensure_ascii=False)),
+        )
+        # Просроченные – удаляем, сверх лимита – вытесняем самые давно использованные
+        conn.execute("DELETE FROM responses WHERE created_at < ?", (now - TTL_SEC,))
+        conn.execute(
+            "DELETE FROM responses WHERE key IN ("
+            "SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (MAX_ENTRIES,),
+        )
+        conn.commit()
+
+
+# ── ЭКСПОРТ ─────────────────────────────────────────────────────────────────────
+
+def lookup(request: dict, bypass: bool = False) -> dict | None:
+    """Сохранённый ответ на такой же запрос (dict в формате API) или None."""
+    if bypass or BYPASS:
+        return None
+    key = cache_key(request)
+    try:
+        cached = _get(key)
+    except sqlite3.Error as e:
+        log(f"⚠️ gpt_cache: ошибка чтения кеша: {e}")
+        return None
+    if cached is not None:
+        log(f"♻️ gpt_cache: ответ {request.get('model')} взят из кеша ({key[:10]}).")
+    return cached
+
+
+def store(request: dict, response: dict) -> None:
+    """Сохраняет ответ API (dict) на запрос; пустые ответы не кешируются."""
+    if not response.get("choices"):
+        return
+    try:
+        _put(cache_key(request), request.get("model", ""), response)
+    except sqlite3.Error as e:
+        log(f"⚠️ gpt_cache: ошибка записи кеша: {e}")
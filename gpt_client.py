@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""gpt_client.py
+Единый клиент OpenAI для всех запросов к GPT.
+
+Через `chat_completion()` / `chat_completion_stream()` идут основной анализ,
+анализ инфлюенсеров, макро-анализ (`report_utils.call_gpt`) и обработка
+цитат. Клиент:
+    * считает токены промпта до отправки (tiktoken, если установлен, иначе
+      оценка по длине в байтах) и урезает вход до бюджета вызова – из
+      середины самого длинного сообщения, чтобы заголовок и задание
+      сохранились;
+    * берёт готовый ответ из `gpt_cache`, если такой запрос уже был, и
+      сохраняет в кеш только законченные ответы (finish_reason "stop"),
+      которые прошли проверку вызывающего (`validate`);
+    * повторяет запрос при 429/5xx/сетевых ошибках с экспоненциальной
+      паузой и джиттером, а если сервер прислал Retry-After или
+      x-ratelimit-reset-* – ждёт не меньше указанного;
+    * записывает по каждому вызову метку блока, токены prompt/completion,
+      задержку и число попыток (`get_call_records()`, `log_usage()`).
+
+Настройки: GPT_RETRIES (3), GPT_BACKOFF_BASE (1 с), GPT_BACKOFF_MAX (60 с),
+GPT_PROMPT_TOKEN_BUDGET (12000, если вызов не задал свой бюджет).
+
+Сам пакет `openai` (вместе с aiohttp) загружается при первом запросе,
+а не при импорте модуля; ключ берётся из OPENAI_KEY.
+"""
+
+from __future__ import annotations
+
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Iterator, Optional
+
+import gpt_cache
+import http_replay
+from custom_logger import log
+
+try:
+    import tiktoken
+except ImportError:  # точный подсчёт – опционально
+    tiktoken = None
+
+
+def _env_number(name, default, cast=float):
+    try:
+        return cast(os.getenv(name, default))
+    except ValueError:
+        log(f"WARNING: Invalid {name} in .env, fallback to {default}")
+        return cast(default)
+
+
+RETRIES: int = _env_number("GPT_RETRIES", 3, int)
+BACKOFF_BASE: float = _env_number("GPT_BACKOFF_BASE", 1.0)
+BACKOFF_MAX: float = _env_number("GPT_BACKOFF_MAX", 60.0)
+DEFAULT_PROMPT_BUDGET: int = _env_number("GPT_PROMPT_TOKEN_BUDGET", 12000, int)
+
+# Служебные токены на каждое сообщение и на ответ (формат chat)
+TOKENS_PER_MESSAGE = 4
+TOKENS_PER_REPLY = 3
+TRIM_MARKER = "\n[…]\n"
+
+
+def _openai():
+    """Модуль openai; при первом обращении импортируется и получает ключ из OPENAI_KEY."""
+    import openai
+    if not openai.api_key:
+        openai.api_key = os.getenv("OPENAI_KEY")
+    if http_replay.MODE and openai.requestssession is None:
+        openai.requestssession = http_replay.new_session   # запись/воспроизведение (по сессии на поток)
+    return openai
+
+
+def _retryable_errors() -> tuple:
+    openai = _openai()
+    return (
+        openai.error.RateLimitError,
+        openai.error.APIError,
+        openai.error.Timeout,
+        openai.error.TryAgain,
+        openai.error.ServiceUnavailableError,
+        openai.error.APIConnectionError,
+    )
+
+
+# ── ПОДСЧЁТ И БЮДЖЕТ ТОКЕНОВ ────────────────────────────────────────────────────
+
+_encoders: dict = {}
+
+
+def _encoder(model: str):
+    if tiktoken is None:
+        return None
+    if model not in _encoders:
+        try:
+            _encoders[model] = tiktoken.encoding_for_model(model)
+        except KeyError:
+            _encoders[model] = tiktoken.get_encoding("o200k_base")
+    return _encoders[model]
+
+
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    """Число токенов в тексте; без tiktoken – оценка ~4 байта UTF-8 на токен."""
+    if not text:
+        return 0
+    enc = _encoder(model)
+    if enc is not None:
+        return len(enc.encode(text))
+    return (len(text.encode("utf-8")) + 3) // 4
+
+
+def count_message_tokens(messages: list[dict], model: str = "gpt-4o-mini") -> int:
+    return TOKENS_PER_REPLY + sum(
+        TOKENS_PER_MESSAGE + count_tokens(m.get("content") or "", model) for m in messages
+    )
+
+
+def _trim_middle(text: str, target_tokens: int, model: str) -> str:
+    """Вырезает середину текста по границам строк, пока он не уложится в target_tokens."""
+    ratio = target_tokens / max(count_tokens(text, model), 1)
+    for _ in range(8):
+        keep = max(int(len(text) * ratio / 2), 0)
+        head = text[:keep].rsplit("\n", 1)[0] if "\n" in text[:keep] else text[:keep]
+        tail = text[len(text) - keep:].split("\n", 1)[-1] if keep else ""
+        trimmed = head + TRIM_MARKER + tail
+        if count_tokens(trimmed, model) <= target_tokens:
+            return trimmed
+        ratio *= 0.85
+    return text[: max(target_tokens, 0)]
+
+
+def trim_messages(messages: list[dict], budget: int, model: str = "gpt-4o-mini") -> tuple[list[dict], int]:
+    """Урезает самое длинное сообщение, чтобы промпт уложился в budget токенов.
+
+    Возвращает (новый список сообщений, сколько токенов срезано).
+    """
+    total = count_message_tokens(messages, model)
+    if total <= budget or not messages:
+        return messages, 0
+    longest = max(range(len(messages)), key=lambda i: len(messages[i].get("content") or ""))
+    content = messages[longest].get("content") or ""
+    target = count_tokens(content, model) - (total - budget)
+    trimmed = list(messages)
+    trimmed[longest] = {**messages[longest], "content": _trim_middle(content, max(target, 0), model)}
+    return trimmed, total - count_message_tokens(trimmed, model)
+
+
+# ── ПОВТОРЫ С УЧЁТОМ RATE LIMIT ─────────────────────────────────────────────────
+
+def _parse_duration(value) -> Optional[float]:
+    """'1.5' → 1.5; '6m0s' / '20ms' / '2s' (формат x-ratelimit-reset-*) → секунды."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = re.findall(r"([\d.]+)(ms|h|m|s)", value)
+    if not parts:
+        return None
+    scale = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+    return sum(float(num) * scale[unit] for num, unit in parts)
+
+
+def retry_delay(exc: Exception, attempt: int) -> float:
+    """Пауза перед повтором: подсказка сервера (если есть) или экспонента с джиттером."""
+    headers = {str(k).lower(): v for k, v in (getattr(exc, "headers", None) or {}).items()}
+    hints = [
+        _parse_duration(headers.get("retry-after")),
+        (_parse_duration(headers.get("retry-after-ms")) or 0) / 1000 or None,
+        _parse_duration(headers.get("x-ratelimit-reset-requests"))
+        if headers.get("x-ratelimit-remaining-requests") in ("0", 0) else None,
+        _parse_duration(headers.get("x-ratelimit-reset-tokens"))
+        if headers.get("x-ratelimit-remaining-tokens") in ("0", 0) else None,
+    ]
+    hinted = max((h for h in hints if h), default=None)
+    if hinted is not None:
+        return min(hinted, BACKOFF_MAX) + random.uniform(0, min(hinted, BACKOFF_MAX) * 0.1 + 0.1)
+    backoff = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)
+    return backoff / 2 + random.uniform(0, backoff / 2)
+
+
+def _with_retries(call, retries: int, what: str):
+    """Выполняет call() с повторами; возвращает (результат, число попыток)."""
+    retryable = _retryable_errors()
+    for attempt in range(retries):
+        try:
+            return call(), attempt + 1
+        except retryable as exc:
+            if attempt + 1 >= retries:
+                raise
+            delay = retry_delay(exc, attempt)
+            log(f"[gpt_client] {what}: попытка {attempt + 1}/{retries} не удалась "
+                f"({type(exc).__name__}: {exc}), повтор через {delay:.1f}с")
+            time.sleep(delay)
+    raise RuntimeError("retries must be >= 1")
+
+
+# ── МЕТРИКИ ─────────────────────────────────────────────────────────────────────
+
+_local = threading.local()
+_records_lock = threading.Lock()
+
+
+@dataclass
+class CallRecord:
+    """Один вызов GPT: метка блока, модель, токены, задержка, попытки и попадание в кеш."""
+    label: str
+    model: str
+    prompt_tokens: int
+    completion_tokens: int
+    latency: float
+    cached: bool = False
+    attempts: int = 1
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+
+_records: list[CallRecord] = []
+
+
+def current_label() -> str:
+    return getattr(_local, "label", None) or "other"
+
+
+@contextmanager
+def call_label(label: str):
+    """Вызовы GPT внутри блока `with` учитываются под меткой `label`."""
+    previous = getattr(_local, "label", None)
+    _local.label = label
+    try:
+        yield
+    finally:
+        _local.label = previous
+
+
+def record_call(model: str, prompt_tokens: int, completion_tokens: int, latency: float,
+                cached: bool = False, attempts: int = 1) -> CallRecord:
+    """Регистрирует вызов под меткой текущего блока."""
+    rec = CallRecord(current_label(), model or "", int(prompt_tokens or 0), int(completion_tokens or 0),
+                     latency, cached, attempts)
+    with _records_lock:
+        _records.append(rec)
+    return rec
+
+
+def get_call_records() -> list[CallRecord]:
+    with _records_lock:
+        return list(_records)
+
+
+def reset_call_records() -> None:
+    with _records_lock:
+        _records.clear()
+
+
+def usage_by_label() -> dict[str, dict]:
+    """Сумма по блокам: {label: {calls, cached, prompt_tokens, completion_tokens, latency}}."""
+    out: dict[str, dict] = {}
+    for rec in get_call_records():
+        agg = out.setdefault(rec.label, {"calls": 0, "cached": 0, "prompt_tokens": 0,
+                                         "completion_tokens": 0, "latency": 0.0})
+        agg["calls"] += 1
+        agg["cached"] += int(rec.cached)
+        if not rec.cached:
+            agg["prompt_tokens"] += rec.prompt_tokens
+            agg["completion_tokens"] += rec.completion_tokens
+        agg["latency"] += rec.latency
+    return out
+
+
+def log_usage() -> None:
+    """Сводка по всем вызовам GPT за запуск: токены и время по каждому блоку."""
+    records = get_call_records()
+    if not records:
+        return
+    for rec in records:
+        source = "кеш" if rec.cached else f"{rec.latency:.1f}с, попыток {rec.attempts}"
+        log(f"🧮 GPT [{rec.label}] {rec.model}: prompt {rec.prompt_tokens} + completion "
+            f"{rec.completion_tokens} токенов ({source}).")
+    total = sum(r.total_tokens for r in records if not r.cached)
+    log(f"🧮 GPT: вызовов {len(records)} (из кеша {sum(r.cached for r in records)}), "
+        f"оплачено токенов {total}.")
+
+
+# ── ЗАПРОСЫ ─────────────────────────────────────────────────────────────────────
+
+def _prepare(request: dict, prompt_budget: Optional[int]) -> tuple[dict, int]:
+    model = request.get("model", "")
+    budget = prompt_budget or DEFAULT_PROMPT_BUDGET
+    messages, cut = trim_messages(request.get("messages", []), budget, model)
+    if cut:
+        log(f"✂️ gpt_client [{current_label()}]: промпт урезан на ~{cut} токенов до бюджета {budget}.")
+        request = {**request, "messages": messages}
+    return request, count_message_tokens(messages, model)
+
+
+def _store_if_usable(request: dict, response: dict, text: str, finish_reason: Optional[str],
+                     validate: Optional[Callable[[str], bool]]) -> None:
+    """Кеширует ответ, только если он закончен и вызывающий может его использовать.
+
+    Обрезанный по max_tokens ответ или JSON, который не разобрать, иначе
+    повторялся бы из кеша весь TTL.
+    """
+    if finish_reason != "stop":
+        log(f"ℹ️ gpt_client [{current_label()}]: ответ не закончен ({finish_reason}), в кеш не сохранён.")
+        return
+    if validate is not None and not validate(text):
+        log(f"ℹ️ gpt_client [{current_label()}]: ответ не прошёл проверку, в кеш не сохранён.")
+        return
+    gpt_cache.store(request, response)
+
+
+def chat_completion(*, prompt_budget: Optional[int] = None, retries: Optional[int] = None,
+                    bypass: bool = False, validate: Optional[Callable[[str], bool]] = None, **request):
+    """Замена `openai.ChatCompletion.create(**request)`: бюджет, кеш, повторы и метрики.
+
+    Возвращает объект ответа API (`resp.choices[0].message.content`);
+    если все попытки не удались – пробрасывает последнюю ошибку OpenAI.
+    validate(text) – проверка ответа перед сохранением в кеш (например, что JSON разбирается).
+    """
+    request, prompt_estimate = _prepare(request, prompt_budget)
+    model = request.get("model", "")
+    cached = gpt_cache.lookup(request, bypass=bypass)
+    if cached is not None:
+        usage = cached.get("usage") or {}
+        record_call(model, usage.get("prompt_tokens", prompt_estimate), usage.get("completion_tokens", 0),
+                    0.0, cached=True)
+        from openai.openai_object import OpenAIObject
+        return OpenAIObject.construct_from(cached)
+
+    started = time.perf_counter()
+    response, attempts = _with_retries(lambda: _openai().ChatCompletion.create(**request),
+                                       retries or RETRIES, model)
+    usage = response.get("usage") or {}
+    record_call(model, usage.get("prompt_tokens", prompt_estimate), usage.get("completion_tokens", 0),
+                time.perf_counter() - started, attempts=attempts)
+    choice = (response.get("choices") or [{}])[0]
+    _store_if_usable(request, response.to_dict_recursive(), (choice.get("message") or {}).get("content") or "",
+                     choice.get("finish_reason"), validate)
+    return response
+
+
+def chat_completion_stream(*, prompt_budget: Optional[int] = None, retries: Optional[int] = None,
+                           bypass: bool = False, validate: Optional[Callable[[str], bool]] = None,
+                           **request) -> Iterator[str]:
+    """То же с stream=True: отдаёт текст ответа по мере генерации.
+
+    Повторяется только открытие потока; ответ из кеша отдаётся одним
+    фрагментом, собранный законченный ответ сохраняется в кеш. Потоковый API не
+    возвращает usage, поэтому токены оцениваются по тексту.
+    """
+    request, prompt_estimate = _prepare(request, prompt_budget)
+    model = request.get("model", "")
+    cached = gpt_cache.lookup(request, bypass=bypass)
+    if cached is not None:
+        usage = cached.get("usage") or {}
+        text = cached["choices"][0]["message"]["content"]
+        record_call(model, usage.get("prompt_tokens", prompt_estimate),
+                    usage.get("completion_tokens", count_tokens(text, model)), 0.0, cached=True)
+        yield text
+        return
+
+    started = time.perf_counter()
+    chunks, attempts = _with_retries(lambda: _openai().ChatCompletion.create(stream=True, **request),
+                                     retries or RETRIES, model)
+    parts: list[str] = []
+    finish_reason = None
+    for chunk in chunks:
+        choices = chunk.get("choices") or [{}]
+        finish_reason = choices[0].get("finish_reason") or finish_reason
+        delta = choices[0].get("delta", {}).get("content")
+        if delta:
+            parts.append(delta)
+            yield delta
+    text = "".join(parts)
+    record_call(model, prompt_estimate, count_tokens(text, model), time.perf_counter() - started,
+                attempts=attempts)
+    if parts:
+        _store_if_usable(request, {
+            "object": "chat.completion",
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                         "finish_reason": finish_reason}],
+        }, text, finish_reason, validate)
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""gpt_stage.py
+Параллельный этап запросов к GPT.
+
+Макро-анализ, обработка цитат, анализ упоминаний инфлюенсеров и основной
+отчёт не зависят друг от друга, поэтому `run_gpt_stage()` отправляет их
+одновременно (не больше GPT_MAX_CONCURRENCY запросов сразу) через тот же
+`collect_blocks`, что и сбор данных: у каждого вызова свой дедлайн, и при
+ошибке или таймауте деградирует только его блок.
+
+`stream_in_background()` запускает потоковый запрос (stream=True) в фоне,
+чтобы его текст можно было публиковать по мере генерации.
+
+Вызовы OpenAI внутри задачи учитываются в `gpt_client` под её именем
+(`call_label`).
+"""
+
+from __future__ import annotations
+
+import os
+import queue
+import threading
+import time
+from typing import Callable, Iterable, Iterator, Optional
+
+from collector import BlockResult, BlockTask, collect_blocks
+from custom_logger import log
+from gpt_client import call_label
+
+try:
+    MAX_CONCURRENCY: int = int(os.getenv("GPT_MAX_CONCURRENCY", "4"))
+except ValueError:
+    log("WARNING: Invalid GPT_MAX_CONCURRENCY in .env, fallback to 4")
+    MAX_CONCURRENCY = 4
+
+
+# ── ЭТАП GPT ────────────────────────────────────────────────────────────────────
+
+def _labelled(task: BlockTask):
+    def run():
+        with call_label(task.name):
+            return task.func()
+    return run
+
+
+def run_gpt_stage(tasks: list[BlockTask], max_concurrency: Optional[int] = None) -> dict[str, BlockResult]:
+    """Выполняет GPT-задачи параллельно; вызовы OpenAI внутри задачи учитываются под её именем."""
+    labelled = [BlockTask(t.name, _labelled(t), t.deadline, t.fallback) for t in tasks]
+    log(f"🔄 Этап GPT: {len(tasks)} запросов, одновременно до {max_concurrency or MAX_CONCURRENCY}...")
+    return collect_blocks(labelled, max_workers=max(1, max_concurrency or MAX_CONCURRENCY))
+
+
+def stream_in_background(label: str, make_stream: Callable[[], Iterable[str]], deadline: float) -> Iterator[str]:
+    """Запускает потоковый GPT-запрос в отдельном потоке и отдаёт его фрагменты.
+
+    Запрос начинает генерироваться сразу, даже пока вызывающий код занят
+    другим (например, публикует готовые блоки). Итератор бросает
+    TimeoutError, если поток не завершился за `deadline` секунд от запуска,
+    и пробрасывает ошибку самого запроса.
+    """
+    items: queue.Queue = queue.Queue()
+    done = object()
+
+    def produce():
+        with call_label(label):
+            try:
+                for piece in make_stream():
+                    items.put(piece)
+                items.put(done)
+            except Exception as exc:
+                items.put(exc)
+
+    threading.Thread(target=produce, name=f"gpt-stream-{label}", daemon=True).start()
+    deadline_at = time.monotonic() + deadline
+
+    def consume():
+        while True:
+            try:
+                item = items.get(timeout=max(0.0, deadline_at - time.monotonic()))
+            except queue.Empty:
+                raise TimeoutError(f"таймаут {deadline:g}с") from None
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    return consume()
@@ -9,7 +9,7 @@
 
 from __future__ import annotations
 
-import requests
+from http_client import http_get
 from datetime import datetime, timezone
 
 # ── ПАРАМЕТРЫ ХАЛВИНГА ─────────────────────────────────────────────────────────
@@ -27,7 +27,7 @@ BLOCKSTREAM_HEIGHT_URL: str = "https://blockstream.info/api/blocks/tip/height"
 def _get_current_height(timeout: int = 8) -> int:
     """Запрашивает у Blockstream API текущий номер блока.
     Возвращает целое число. При ошибке поднимает исключение requests.*"""
-    resp = requests.get(BLOCKSTREAM_HEIGHT_URL, timeout=timeout)
+    resp = http_get(BLOCKSTREAM_HEIGHT_URL, timeout=timeout)
     resp.raise_for_status()
     return int(resp.text.strip())
 
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""http_client.py
+Общий HTTP-клиент для всех *_reader модулей.
+
+Одна `requests.Session` на процесс: пулы соединений по хостам и keep-alive
+(без нового TCP+TLS рукопожатия на каждый запрос к api.stlouisfed.org и т.п.),
+единый User-Agent, повторы с экспоненциальной паузой и счётчики времени
+запросов по хостам.
+
+Использование такое же, как у `requests`:
+
+    from http_client import http_get
+    r = http_get(url, params=..., timeout=10)
+
+Настройки через переменные окружения:
+    HTTP_RETRIES    – сколько раз повторять запрос при ошибке соединения/5xx (по умолчанию 2);
+    HTTP_BACKOFF    – базовая пауза между повторами, сек. (0.5 → 0.5, 1, 2 …);
+    HTTP_POOL_SIZE  – размер пула соединений на один хост (по умолчанию 16).
+
+С HTTP_REPLAY_MODE=record/replay сессия получает `http_replay.ReplayAdapter`:
+обмены пишутся в кассету или воспроизводятся из неё без сети.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import http_replay
+from custom_logger import log
+
+# ── ПАРАМЕТРЫ ───────────────────────────────────────────────────────────────────
+USER_AGENT: str = "MomentumPulseBot/1.0 (+https://t.me/MomentumPulse)"
+
+
+def _env_number(name: str, default, cast):
+    try:
+        return cast(os.getenv(name, default))
+    except ValueError:
+        log(f"WARNING: Invalid {name} in .env, fallback to {default}")
+        return cast(default)
+
+
+HTTP_RETRIES: int = _env_number("HTTP_RETRIES", 2, int)
+HTTP_BACKOFF: float = _env_number("HTTP_BACKOFF", 0.5, float)
+HTTP_POOL_SIZE: int = _env_number("HTTP_POOL_SIZE", 16, int)
+RETRY_STATUSES = (500, 502, 503, 504)
+
+_session: requests.Session | None = None
+_session_lock = threading.Lock()
+
+# Счётчики по хостам: {host: {"calls", "errors", "total_sec", "max_sec"}}
+_stats: dict[str, dict[str, float]] = {}
+_stats_lock = threading.Lock()
+
+
+# ── СЕССИЯ ──────────────────────────────────────────────────────────────────────
+
+def _build_session() -> requests.Session:
+    retry = Retry(
+        total=HTTP_RETRIES,
+        connect=HTTP_RETRIES,
+        read=False,                 # таймаут чтения не повторяем: он и так дорогой
+        status=HTTP_RETRIES,
+        status_forcelist=RETRY_STATUSES,
+        backoff_factor=HTTP_BACKOFF,
+        raise_on_status=False,      # отдаём последний ответ, raise_for_status() решает вызывающий
+    )
+    adapter_cls = http_replay.ReplayAdapter if http_replay.MODE else HTTPAdapter
+    adapter = adapter_cls(pool_connections=32, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"User-Agent": USER_AGENT})
+    return session
+
+
+def get_session() -> requests.Session:
+    """Возвращает общую сессию (создаётся при первом обращении)."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+# ── ЗАПРОСЫ ─────────────────────────────────────────────────────────────────────
+
+def _record(host: str, elapsed: float, failed: bool) -> None:
+    with _stats_lock:
+        st = _stats.setdefault(host, {"calls": 0, "errors": 0, "total_sec": 0.0, "max_sec": 0.0})
+        st["calls"] += 1
+        st["errors"] += int(failed)
+        st["total_sec"] += elapsed
+        st["max_sec"] = max(st["max_sec"], elapsed)
+
+
+def http_request(method: str, url: str, **kwargs) -> requests.Response:
+    """То же, что `requests.request`, но через общую сессию и со сбором статистики."""
+    host = urlsplit(url).netloc
+    started = time.perf_counter()
+    failed = True
+    try:
+        response = get_session().request(method, url, **kwargs)
+        failed = response.status_code >= 400
+        return response
+    finally:
+        _record(host, time.perf_counter() - started, failed)
+
+
+def http_get(url: str, **kwargs) -> requests.Response:
+    return http_request("GET", url, **kwargs)
+
+
+def http_post(url: str, **kwargs) -> requests.Response:
+    return http_request("POST", url, **kwargs)
+
+
+# ── СТАТИСТИКА ──────────────────────────────────────────────────────────────────
+
+def get_stats() -> dict[str, dict[str, float]]:
+    """Копия счётчиков по хостам: число запросов, ошибок, суммарное и максимальное время."""
+    with _stats_lock:
+        return {host: dict(st) for host, st in _stats.items()}
+
+
+def reset_stats() -> None:
+    with _stats_lock:
+        _stats.clear()
+
+
+def log_stats() -> None:
+    """Пишет в лог сводку по хостам, самые «дорогие» сверху."""
+    stats = get_stats()
+    if not stats:
+        return
+    for host, st in sorted(stats.items(), key=lambda kv: kv[1]["total_sec"], reverse=True):
+        log(f"🌐 {host}: {st['calls']:.0f} запр., ошибок {st['errors']:.0f}, "
+            f"всего {st['total_sec']:.1f}с, макс {st['max_sec']:.1f}с")
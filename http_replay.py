@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""http_replay.py
+Запись и воспроизведение внешних API для офлайн-прогонов.
+
+HTTP_REPLAY_MODE=record – каждый HTTP-обмен (все ридеры через `http_client`,
+Telegram, OpenAI через `openai.requestssession`) сохраняется в кассету:
+каталог HTTP_CASSETTE_DIR, по файлу JSON на ответ. Данные yfinance (у него
+свой транспорт) сохраняются на уровне результата – DataFrame'ы через
+`frames()`.
+
+HTTP_REPLAY_MODE=replay – сеть не используется: `ReplayAdapter` отдаёт
+ответы из кассеты, `frames()` – сохранённые таблицы. Запрос ищется
+по точному ключу (метод, URL без секретов, тело), а если такого нет
+(в промпте другая дата, другой since у свечей) – по маршруту «метод + хост +
+путь» в порядке записи. Нет и маршрута – ConnectionError, как при
+недоступном сервисе. Повторы urllib3 при воспроизведении не выполняются.
+
+Для воспроизведения можно задать задержки и ошибки по хостам
+(HTTP_REPLAY_FAULTS, JSON; ключ – шаблон хоста fnmatch, «yfinance» – для
+таблиц):
+    {"*": {"latency": 0.2},
+     "api.coingecko.com": {"latency": 12},                      # дольше таймаута → ReadTimeout
+     "api.telegram.org": {"error": 429, "retry_after": 1, "rate": 0.3},
+     "api.openai.com": {"stream_delay": 0.05},                  # пауза на каждый кусок потока
+     "yfinance": {"error": "connection"}}
+error – код ответа, "timeout" или "connection"; rate – вероятность ошибки
+(по умолчанию 1); случайность воспроизводима (HTTP_REPLAY_SEED).
+
+Секреты в кассету не попадают: ключи в параметрах URL (api_key, apikey,
+api_token, token…) и токен бота в пути заменяются заглушкой, заголовки
+запроса не сохраняются.
+
+    python http_replay.py [каталог]     # что записано в кассете
+"""
+
+from __future__ import annotations
+
+import base64
+import fnmatch
+import hashlib
+import io
+import json
+import os
+import pickle
+import random
+import re
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from custom_logger import log
+
+MODE: str = os.getenv("HTTP_REPLAY_MODE", "").strip().lower()
+if MODE not in ("", "record", "replay"):
+    log(f"WARNING: Invalid HTTP_REPLAY_MODE in .env ({MODE}), fallback to live network")
+    MODE = ""
+CASSETTE_DIR: str = os.getenv("HTTP_CASSETTE_DIR", os.path.join("cache", "cassettes", "default"))
+
+try:
+    SEED: int = int(os.getenv("HTTP_REPLAY_SEED", "0"))
+    FAULTS: dict[str, dict] = json.loads(os.getenv("HTTP_REPLAY_FAULTS", "") or "{}")
+    if not isinstance(FAULTS, dict) or not all(isinstance(rule, dict) for rule in FAULTS.values()):
+        raise ValueError("ожидается объект {хост: {параметры}}")
+except ValueError as e:
+    log(f"WARNING: Invalid HTTP_REPLAY_SEED/HTTP_REPLAY_FAULTS in .env ({e}), fallback to no faults")
+    SEED, FAULTS = 0, {}
+
+SECRET_PARAMS = {"api_key", "apikey", "api_token", "token", "key", "access_token", "appid"}
+_BOT_TOKEN_RE = re.compile(r"/bot[^/]+/")
+_SKIP_RESPONSE_HEADERS = {"set-cookie", "content-encoding", "transfer-encoding", "content-length"}
+
+_lock = threading.Lock()
+_rng = random.Random(SEED)
+
+
+# ── КЛЮЧИ И ФАЙЛЫ ──────────────────────────────────────────────────────────────
+
+def redact_url(url: str) -> str:
+    """URL без секретов: токен бота в пути и ключи в параметрах → «***», параметры отсортированы."""
+    parts = urlsplit(_BOT_TOKEN_RE.sub("/bot***/", url))
+    query = sorted((k, "***" if k.lower() in SECRET_PARAMS else v) for k, v in parse_qsl(parts.query, keep_blank_values=True))
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), ""))
+
+
+def _digest(*parts) -> str:
+    h = hashlib.sha1()
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()[:16]
+
+
+def _body_bytes(body) -> bytes:
+    if body is None:
+        return b""
+    return body.encode("utf-8") if isinstance(body, str) else bytes(body)
+
+
+def request_keys(method: str, url: str, body) -> tuple[str, str, str]:
+    """(хост без порта, точный ключ, ключ маршрута) запроса."""
+    safe_url = redact_url(url)
+    parts = urlsplit(safe_url)
+    return parts.hostname or "", _digest(method, safe_url, _body_bytes(body)), _digest(method, parts.netloc, parts.path)
+
+
+def _encode_body(content: bytes) -> dict:
+    try:
+        return {"text": content.decode("utf-8")}
+    except UnicodeDecodeError:
+        return {"base64": base64.b64encode(content).decode("ascii")}
+
+
+def _decode_body(entry: dict) -> bytes:
+    if "base64" in entry:
+        return base64.b64decode(entry["base64"])
+    return entry.get("text", "").encode("utf-8")
+
+
+class Cassette:
+    """Каталог с записанными ответами: http/<хост>/<ключ>-<n>.json и frames/<имя>/<ключ>.pkl."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._by_key: dict[str, list[str]] = {}
+        self._by_route: dict[str, list[str]] = {}
+        self._served: dict[str, int] = {}
+        self._recorded: dict[str, int] = {}
+        self._loaded = False
+
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        entries = []
+        http_dir = os.path.join(self.path, "http")
+        for host in sorted(os.listdir(http_dir)) if os.path.isdir(http_dir) else []:
+            for name in sorted(os.listdir(os.path.join(http_dir, host))):
+                file = os.path.join(http_dir, host, name)
+                try:
+                    with open(file, "r", encoding="utf-8") as f:
+                        meta = json.load(f)
+                except (OSError, ValueError) as e:
+                    log(f"⚠️ http_replay: пропущен повреждённый файл кассеты {file}: {e}")
+                    continue
+                entries.append((meta.get("seq", 0), file, meta["key"], meta["route"]))
+        for _, file, key, route in sorted(entries):     # порядок записи
+            self._by_key.setdefault(key, []).append(file)
+            self._by_route.setdefault(route, []).append(file)
+        self._loaded = True
+        log(f"📼 http_replay: кассета {self.path} – {sum(map(len, self._by_key.values()))} ответов.")
+
+    def _next(self, index: dict[str, list[str]], key: str) -> str | None:
+        files = index.get(key)
+        if not files:
+            return None
+        served = self._served.get(key, 0)
+        self._served[key] = served + 1
+        return files[min(served, len(files) - 1)]    # повторы сверх записанного – последний ответ
+
+    def find(self, key: str, route: str) -> dict | None:
+        with _lock:
+            self._load()
+            file = self._next(self._by_key, key) or self._next(self._by_route, route)
+        if file is None:
+            return None
+        with open(file, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def save(self, host: str, key: str, entry: dict) -> None:
+        with _lock:
+            n = self._recorded.get(key, 0)
+            self._recorded[key] = n + 1
+            entry["seq"] = sum(self._recorded.values())
+        directory = os.path.join(self.path, "http", host or "_")
+        os.makedirs(directory, exist_ok=True)
+        file = os.path.join(directory, f"{key}-{n}.json")
+        tmp = file + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, file)
+
+    def frame_path(self, name: str, key: str) -> str:
+        return os.path.join(self.path, "frames", name, f"{_digest(key)}.pkl")
+
+
+_cassette: Cassette | None = None
+
+
+def cassette() -> Cassette:
+    global _cassette
+    if _cassette is None:
+        with _lock:
+            if _cassette is None:
+                _cassette = Cassette(CASSETTE_DIR)
+    return _cassette
+
+
+# ── ЗАДЕРЖКИ И ОШИБКИ ──────────────────────────────────────────────────────────
+
+def fault_for(host: str) -> dict:
+    """Параметры задержек/ошибок для хоста: правила по шаблонам, точный хост – последним."""
+    rule: dict = {}
+    for pattern, params in sorted(FAULTS.items(), key=lambda item: (item[0] != "*", item[0] == host)):
+        if fnmatch.fnmatch(host, pattern):
+            rule.update(params)
+    return rule
+
+
+def _read_timeout(timeout) -> float | None:
+    if isinstance(timeout, tuple):
+        timeout = timeout[1]
+    return float(timeout) if timeout is not None else None
+
+
+def _injected_error(rule: dict) -> str | int | None:
+    error = rule.get("error")
+    if error is None:
+        return None
+    with _lock:
+        hit = _rng.random() < float(rule.get("rate", 1.0))
+    return error if hit else None
+
+
+def apply_fault(host: str, timeout=None) -> int | None:
+    """Задержка и ошибка для одного обращения к host. Возвращает код ответа для подмены или None.
+
+    Сетевые ошибки и таймауты поднимаются как исключения requests.
+    """
+    rule = fault_for(host)
+    latency = float(rule.get("latency", 0)) + float(rule.get("jitter", 0)) * _rng.random()
+    error = _injected_error(rule)
+    read_timeout = _read_timeout(timeout)
+    if error == "timeout" or (read_timeout is not None and latency > read_timeout):
+        time.sleep(read_timeout if read_timeout is not None else latency)
+        raise requests.exceptions.ReadTimeout(f"http_replay: таймаут {host} (задержка {latency:g}с)")
+    if latency:
+        time.sleep(latency)
+    if error == "connection":
+        raise requests.exceptions.ConnectionError(f"http_replay: соединение с {host} сброшено")
+    return int(error) if error is not None else None
+
+
+class _SlowBody(io.BytesIO):
+    """Тело ответа, которое отдаётся кусками с паузой (поток OpenAI, stream_delay)."""
+
+    def __init__(self, content: bytes, delay: float):
+        super().__init__(content)
+        self._delay = delay
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        if chunk and self._delay:
+            time.sleep(self._delay)
+        return chunk
+
+    def stream(self, amt=2 ** 16, decode_content=None):
+        while True:
+            chunk = self.read(amt)
+            if not chunk:
+                return
+            yield chunk
+
+
+# ── АДАПТЕР REQUESTS ───────────────────────────────────────────────────────────
+
+def _build_response(request, status: int, headers: dict, content: bytes, reason: str = "",
+                    stream_delay: float = 0.0) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status
+    response.reason = reason
+    response.headers = CaseInsensitiveDict(headers)
+    response.raw = _SlowBody(content, stream_delay)
+    response.url = request.url
+    response.request = request
+    response.encoding = get_encoding_from_headers(response.headers)
+    return response
+
+
+def _injected_response(request, status: int, rule: dict) -> requests.Response:
+    # Поля Telegram (ok/error_code/parameters) и OpenAI (error) – чтобы оба клиента разобрали ошибку как настоящую
+    body: dict = {"ok": False, "error_code": status, "description": "http_replay: injected error",
+                  "error": {"message": "http_replay: injected error", "type": "http_replay", "code": status}}
+    headers = {"Content-Type": "application/json"}
+    if status == 429:
+        retry_after = rule.get("retry_after", 1)
+        body["parameters"] = {"retry_after": retry_after}
+        headers["Retry-After"] = str(retry_after)
+    return _build_response(request, status, headers, json.dumps(body).encode("utf-8"), "Injected")
+
+
+class ReplayAdapter(HTTPAdapter):
+    """HTTPAdapter, который в режиме record сохраняет обмены, а в режиме replay отвечает из кассеты."""
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        host, key, route = request_keys(request.method, request.url, request.body)
+        if MODE == "record":
+            started = time.perf_counter()
+            response = super().send(request, stream=stream, timeout=timeout, verify=verify, cert=cert, proxies=proxies)
+            content = response.content           # поток при записи читается целиком
+            headers = {k: v for k, v in response.headers.items() if k.lower() not in _SKIP_RESPONSE_HEADERS}
+            cassette().save(host, key, {
+                "key": key,
+                "route": route,
+                "method": request.method,
+                "url": redact_url(request.url),
+                "request_body": _encode_body(_body_bytes(request.body)),
+                "status": response.status_code,
+                "reason": response.reason,
+                "headers": headers,
+                "body": _encode_body(content),
+                "elapsed": round(time.perf_counter() - started, 3),
+            })
+            return _build_response(request, response.status_code, headers, content, response.reason or "")
+
+        status = apply_fault(host, timeout)
+        rule = fault_for(host)
+        if status is not None:
+            return _injected_response(request, status, rule)
+        entry = cassette().find(key, route)
+        if entry is None:
+            raise requests.exceptions.ConnectionError(
+                f"http_replay: в кассете нет ответа для {request.method} {redact_url(request.url)}")
+        return _build_response(request, entry["status"], entry.get("headers", {}), _decode_body(entry["body"]),
+                               entry.get("reason", ""), float(rule.get("stream_delay", 0)))
+
+
+def new_session() -> requests.Session:
+    """Сессия с ReplayAdapter – для `openai.requestssession` (вызывается по разу на поток)."""
+    session = requests.Session()
+    adapter = ReplayAdapter()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+# ── ТАБЛИЦЫ (yfinance) ──────────────────────────────────────────────────────────
+
+def frames(name: str, key: str, fetch):
+    """Результат fetch() через кассету: запись – pickle, воспроизведение – из файла без сети.
+
+    Вне режимов записи/воспроизведения просто вызывает fetch().
+    """
+    if not MODE:
+        return fetch()
+    path = cassette().frame_path(name, key)
+    if MODE == "record":
+        result = fetch()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            pickle.dump(result, f)
+        os.replace(path + ".tmp", path)
+        return result
+    apply_fault(name)
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except OSError:
+        raise requests.exceptions.ConnectionError(f"http_replay: в кассете нет данных {name} для {key}") from None
+
+
+# ── CLI ─────────────────────────────────────────────────────────────────────────
+
+def summarize(path: str) -> dict[str, int]:
+    """Число записанных ответов по хостам (и таблиц – под «frames/<имя>»)."""
+    summary: dict[str, int] = {}
+    for kind in ("http", "frames"):
+        root = os.path.join(path, kind)
+        for name in sorted(os.listdir(root)) if os.path.isdir(root) else []:
+            label = name if kind == "http" else f"frames/{name}"
+            summary[label] = len(os.listdir(os.path.join(root, name)))
+    return summary
+
+
+if __name__ == "__main__":
+    import sys
+    target = sys.argv[1] if len(sys.argv) > 1 else CASSETTE_DIR
+    summary = summarize(target)
+    if not summary:
+        print(f"Кассета {target} пуста или не найдена.")
+    for label, count in summary.items():
+        print(f"{count:6d}  {label}")
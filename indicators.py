@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""indicators.py
+Инкрементальный расчёт технических индикаторов (SMA, RSI Уайлдера, средний объём).
+
+Раньше каждый запуск пересчитывал средние по 200 свечам и прогонял
+`ta.momentum.RSIIndicator` по всей истории. Теперь для каждого символа
+хранится состояние (`cache/indicators.json`): последние закрытые цены и
+объёмы, скользящие суммы окон и сглаженные up/down для RSI. Каждая новая
+закрытая свеча обновляет состояние за O(1), а значения на текущую
+(ещё не закрытую) свечу считаются поверх состояния без его изменения.
+
+Режим полного пересчёта (`full_snapshot()`, либо TA_FULL_RECOMPUTE=1)
+считает те же величины «по-старому» через pandas/ta – им удобно проверять
+инкрементальный результат (`verify()`).
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+from collections import deque
+
+import pandas as pd
+import ta
+
+from custom_logger import log
+
+STATE_PATH: str = os.getenv("INDICATORS_STATE_PATH", os.path.join("cache", "indicators.json"))
+FULL_RECOMPUTE: bool = os.getenv("TA_FULL_RECOMPUTE", "").lower() in ("1", "true", "yes")
+
+RSI_WINDOW: int = 14
+# Окна по закрытым свечам: 7 → SMA7, 49/199 (+текущая) → SMA50/SMA200 сегодня,
+# 50/200 → SMA50/SMA200 вчера. Объём – среднее за 30 закрытых свечей.
+CLOSE_WINDOWS = (7, 49, 50, 199, 200)
+VOLUME_WINDOW: int = 30
+
+_lock = threading.Lock()
+
+
+# ── СОСТОЯНИЕ ───────────────────────────────────────────────────────────────────
+
+class RollingSums:
+    """Скользящие суммы нескольких окон по одному потоку значений, O(1) на значение."""
+
+    def __init__(self, windows, values=(), sums=None):
+        self.windows = tuple(windows)
+        self.values = deque(values, maxlen=max(self.windows))
+        self.sums = {w: 0.0 for w in self.windows}
+        if sums is not None:
+            self.sums.update({int(w): s for w, s in sums.items()})
+        else:
+            for w in self.windows:
+                self.sums[w] = float(sum(list(self.values)[-w:]))
+
+    def push(self, value: float) -> None:
+        for w in self.windows:
+            if len(self.values) >= w:
+                self.sums[w] -= self.values[-w]
+            self.sums[w] += value
+        self.values.append(value)
+
+    def full(self, window: int) -> bool:
+        return len(self.values) >= window
+
+
+class IndicatorState:
+    """Состояние индикаторов одного символа по закрытым свечам."""
+
+    def __init__(self, last_day=None, closes=None, volumes=None, rsi=None):
+        self.last_day = last_day
+        self.closes = closes or RollingSums(CLOSE_WINDOWS)
+        self.volumes = volumes or RollingSums((VOLUME_WINDOW,))
+        # RSI Уайлдера в той же форме, что и у `ta`: ewm(alpha=1/14, adjust=False),
+        # первое значение up/down равно 0 (diff первой свечи не определён).
+        self.rsi = rsi or {"avg_up": 0.0, "avg_dn": 0.0, "prev_close": None, "count": 0}
+
+    # ---- обновление ---------------------------------------------------------
+
+    @staticmethod
+    def _rsi_step(rsi: dict, close: float) -> tuple[float, float]:
+        prev = rsi["prev_close"]
+        diff = 0.0 if prev is None else close - prev
+        up, dn = max(diff, 0.0), max(-diff, 0.0)
+        if rsi["count"] == 0:
+            return up, dn
+        alpha = 1.0 / RSI_WINDOW
+        return (1 - alpha) * rsi["avg_up"] + alpha * up, (1 - alpha) * rsi["avg_dn"] + alpha * dn
+
+    def push(self, day: str, close: float, volume: float) -> None:
+        """Добавляет одну закрытую свечу."""
+        avg_up, avg_dn = self._rsi_step(self.rsi, close)
+        self.rsi = {"avg_up": avg_up, "avg_dn": avg_dn, "prev_close": close, "count": self.rsi["count"] + 1}
+        self.closes.push(close)
+        self.volumes.push(volume)
+        self.last_day = day
+
+    # ---- значения на текущую свечу -----------------------------------------
+
+    def snapshot(self, close: float, volume: float) -> dict | None:
+        """Индикаторы с учётом текущей (незакрытой) свечи; None, если истории мало."""
+        if not self.closes.full(200) or not self.volumes.full(VOLUME_WINDOW):
+            return None
+        s = self.closes.sums
+        avg_up, avg_dn = self._rsi_step(self.rsi, close)
+        count = self.rsi["count"] + 1
+        rsi = None
+        if count >= RSI_WINDOW:
+            rsi = 100.0 if avg_dn == 0 else 100.0 - 100.0 / (1.0 + avg_up / avg_dn)
+        return {
+            "price": close,
+            "sma7": s[7] / 7,
+            "sma50": (s[49] + close) / 50,
+            "sma200": (s[199] + close) / 200,
+            "sma50_prev": s[50] / 50,
+            "sma200_prev": s[200] / 200,
+            "rsi14": rsi,
+            "volume": volume,
+            "avg_volume_30d": self.volumes.sums[VOLUME_WINDOW] / VOLUME_WINDOW,
+        }
+
+    # ---- сериализация -------------------------------------------------------
+
+    def to_dict(self) -> dict:
+        return {
+            "last_day": self.last_day,
+            "closes": list(self.closes.values), "close_sums": self.closes.sums,
+            "volumes": list(self.volumes.values), "volume_sums": self.volumes.sums,
+            "rsi": self.rsi,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "IndicatorState":
+        return cls(
+            last_day=data["last_day"],
+            closes=RollingSums(CLOSE_WINDOWS, data["closes"], data["close_sums"]),
+            volumes=RollingSums((VOLUME_WINDOW,), data["volumes"], data["volume_sums"]),
+            rsi=data["rsi"],
+        )
+
+    @classmethod
+    def from_history(cls, closed: pd.DataFrame) -> "IndicatorState":
+        state = cls()
+        for idx, row in closed.iterrows():
+            state.push(_day(idx), float(row["Close"]), float(row["Volume"]))
+        return state
+
+
+def _day(idx) -> str:
+    return pd.Timestamp(idx).strftime("%Y-%m-%d")
+
+
+def _load_all() -> dict:
+    try:
+        with open(STATE_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        log(f"⚠️ indicators: не удалось прочитать {STATE_PATH}: {e}")
+        return {}
+
+
+def _save_all(states: dict) -> None:
+    os.makedirs(os.path.dirname(STATE_PATH) or ".", exist_ok=True)
+    tmp = STATE_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(states, f)
+    os.replace(tmp, STATE_PATH)
+
+
+# ── ЭКСПОРТ ─────────────────────────────────────────────────────────────────────
+
+def full_snapshot(history: pd.DataFrame) -> dict | None:
+    """Полный пересчёт по всей истории (pandas/ta) – эталон для инкрементального режима."""
+    if len(history) <= 200:
+        return None
+    close, volume = history["Close"], history["Volume"]
+    return {
+        "price": float(close.iloc[-1]),
+        "sma7": float(close.iloc[-8:-1].mean()),
+        "sma50": float(close.iloc[-50:].mean()),
+        "sma200": float(close.iloc[-200:].mean()),
+        "sma50_prev": float(close.iloc[-51:-1].mean()),
+        "sma200_prev": float(close.iloc[-201:-1].mean()),
+        "rsi14": float(ta.momentum.RSIIndicator(close, window=RSI_WINDOW).rsi().iloc[-1]),
+        "volume": float(volume.iloc[-1]),
+        "avg_volume_30d": float(volume.iloc[-31:-1].mean()),
+    }
+
+
+def update_and_snapshot(symbol: str, history: pd.DataFrame) -> dict | None:
+    """Обновляет состояние `symbol` закрытыми свечами из `history` и возвращает индикаторы.
+
+    Последняя строка `history` считается текущей (незакрытой) свечой и в
+    состояние не попадает. Если состояние потеряно или не стыкуется с
+    историей (пропуск свечей), оно строится заново по `history`.
+    """
+    if history.empty:
+        return None
+    if FULL_RECOMPUTE:
+        return full_snapshot(history)
+
+    closed, current = history.iloc[:-1], history.iloc[-1]
+    with _lock:
+        states = _load_all()
+        state = IndicatorState.from_dict(states[symbol]) if symbol in states else None
+        days = [_day(i) for i in closed.index]
+        if state is None or state.last_day not in days:
+            if state is not None:
+                log(f"ℹ️ indicators: состояние {symbol} не стыкуется с историей, полный пересчёт.")
+            state = IndicatorState.from_history(closed)
+        else:
+            for pos in range(days.index(state.last_day) + 1, len(days)):
+                row = closed.iloc[pos]
+                state.push(days[pos], float(row["Close"]), float(row["Volume"]))
+        states[symbol] = state.to_dict()
+        try:
+            _save_all(states)
+        except OSError as e:
+            log(f"⚠️ indicators: не удалось сохранить {STATE_PATH}: {e}")
+    return state.snapshot(float(current["Close"]), float(current["Volume"]))
+
+
+def verify(history: pd.DataFrame, tolerance: float = 1e-6) -> dict[str, float]:
+    """Сравнивает инкрементальный расчёт с полным по той же истории.
+
+    Возвращает относительные расхождения по каждому индикатору, превысившие
+    `tolerance` (пустой словарь – результаты совпадают).
+    """
+    expected = full_snapshot(history)
+    state = IndicatorState.from_history(history.iloc[:-1])
+    actual = state.snapshot(float(history["Close"].iloc[-1]), float(history["Volume"].iloc[-1]))
+    if expected is None or actual is None:
+        return {} if expected is actual else {"availability": 1.0}
+    diffs = {}
+    for key, exp in expected.items():
+        act = actual[key]
+        err = abs(act - exp) / max(abs(exp), 1e-12)
+        if err > tolerance:
+            diffs[key] = err
+    return diffs
@@ -11,13 +11,24 @@ import time
 import html
 import re
 import requests
-import openai
 import json
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime, timedelta
 from custom_logger import log
+from http_client import http_get
+from gpt_client import chat_completion
 
 # --- Конфигурация GPT ---
 GPT_MODEL_FOR_PROCESSING = "gpt-4o-mini"
+GPT_PROMPT_BUDGET = 4000  # токенов на промпт с цитатами
+
+def _quotes_list(response_text: str):
+    """Массив цитат из JSON-ответа GPT ({"quotes": [...]}) или None, если ответ не подходит."""
+    try:
+        processed = next(iter(json.loads(response_text).values()))
+    except (ValueError, AttributeError, StopIteration):
+        return None
+    return processed if isinstance(processed, list) else None
 
 def _process_quotes_with_gpt(raw_quotes: list[str]) -> list:
     """
@@ -65,17 +76,19 @@ def _process_quotes_with_gpt(raw_quotes: list[str]) -> list:
 Твой JSON-ответ:
 """
     try:
-        if not openai.api_key:
+        if not os.getenv("OPENAI_KEY"):
             log("CRITICAL: OpenAI API key not set. Cannot process quotes.")
             return []
 
         log(f"INFO: Отправка {len(raw_quotes)} фрагментов в GPT для фильтрации и анализа...")
-        response = openai.ChatCompletion.create(
+        response = chat_completion(
             model=GPT_MODEL_FOR_PROCESSING,
             messages=[{"role": "user", "content": prompt}],
             temperature=0.5,
             max_tokens=3000,
-            response_format={"type": "json_object"}
+            response_format={"type": "json_object"},
+            prompt_budget=GPT_PROMPT_BUDGET,
+            validate=lambda text: _quotes_list(text) is not None,   # неразборчивый JSON не кешируем
         )
         response_text = response.choices[0].message.content.strip()
         
@@ -104,7 +117,6 @@ NEWSAPI_KEY     = os.getenv("NEWSAPI_KEY")
 YOUTUBE_KEY     = os.getenv("YOUTUBE_KEY")
 MASTODON_TOKEN  = os.getenv("MASTODON_TOKEN")
 MASTODON_HOST   = os.getenv("MASTODON_HOST", "mastodon.social")
-USER_AGENT = "MomentumPulse/1.0 (+https://t.me/MomentumPulse)"
 INFLUENCERS = [
     # Категория теперь используется только для первичного сбора, GPT примет финальное решение
     {"name": "Elon Musk",           "aliases": ["Elon Musk", "Musk"],           "category": "stock"},
@@ -124,6 +136,13 @@ INFLUENCERS = [
 LOOKBACK_HOURS = 24
 MAX_QUOTES_PER_PERSON = 1
 TIMEOUT = 12
+# Сколько запросов к источникам выполняется одновременно (люди × псевдонимы × источники яруса)
+# и сколько секунд ждать один ярус запросов (см. QUERY_TIERS)
+try:
+    MAX_PARALLEL_QUERIES = int(os.getenv("QUOTES_MAX_PARALLEL", "16"))
+    TIER_DEADLINE = float(os.getenv("QUOTES_TIER_DEADLINE", str(2 * TIMEOUT)))
+except ValueError:
+    MAX_PARALLEL_QUERIES, TIER_DEADLINE = 16, 2 * TIMEOUT
 
 def _clean_snippet(text: str, max_chars: int = 220) -> str:
     text = html.unescape(text).strip().replace("\n", " ")
@@ -144,7 +163,7 @@ def _clean_snippet(text: str, max_chars: int = 220) -> str:
 def _fetch_reddit(alias: str) -> list[str]:
     url = (f"https://www.reddit.com/search.json?q=\"{requests.utils.quote(alias)}\"&sort=new&limit=10&restrict_sr=0&syntax=plain")
     try:
-        r = requests.get(url, headers={"User-Agent": USER_AGENT}, timeout=TIMEOUT)
+        r = http_get(url, timeout=TIMEOUT)
         r.raise_for_status()
         posts = r.json().get("data", {}).get("children", [])
         out = []
@@ -165,7 +184,7 @@ def _fetch_newsapi(alias: str) -> list[str]:
     url = "https://newsapi.org/v2/everything"
     params = {"qInTitle": alias, "sortBy": "publishedAt", "language": "en", "pageSize": 5, "apiKey": NEWSAPI_KEY}
     try:
-        r = requests.get(url, params=params, timeout=TIMEOUT)
+        r = http_get(url, params=params, timeout=TIMEOUT)
         r.raise_for_status()
         news = r.json().get("articles", [])
         out = []
@@ -187,7 +206,7 @@ def _fetch_youtube(alias: str) -> list[str]:
     url = "https://www.googleapis.com/youtube/v3/search"
     params = {"part": "snippet", "q": alias, "maxResults": 5, "order": "date", "type": "video", "key": YOUTUBE_KEY}
     try:
-        r = requests.get(url, params=params, timeout=TIMEOUT)
+        r = http_get(url, params=params, timeout=TIMEOUT)
         r.raise_for_status()
         items = r.json().get("items", [])
         out = []
@@ -210,9 +229,9 @@ def _fetch_mastodon(alias: str) -> list[str]:
     if not MASTODON_TOKEN: return []
     url = f"https://{MASTODON_HOST}/api/v2/search"
     params = {"q": alias, "limit": 5, "resolve": "true"}
-    headers = {"Authorization": f"Bearer {MASTODON_TOKEN}", "User-Agent": USER_AGENT}
+    headers = {"Authorization": f"Bearer {MASTODON_TOKEN}"}
     try:
-        r = requests.get(url, params=params, headers=headers, timeout=TIMEOUT)
+        r = http_get(url, params=params, headers=headers, timeout=TIMEOUT)
         r.raise_for_status()
         statuses = r.json().get("statuses", [])
         out = []
@@ -229,39 +248,98 @@ def _fetch_mastodon(alias: str) -> list[str]:
         return []
 
 
+# Приоритет результата – как при последовательном обходе: псевдонимы по порядку,
+# внутри псевдонима – источники в порядке SRC_FUNCS.
 SRC_FUNCS = [_fetch_reddit, _fetch_newsapi, _fetch_youtube, _fetch_mastodon]
-def _collect_for_aliases(aliases: list[str]) -> list[str]:
-    quotes = []
-    for alias in aliases:
-        for fn in SRC_FUNCS:
-            quotes.extend(fn(alias))
-            if len(quotes) >= MAX_QUOTES_PER_PERSON: break
-        if len(quotes) >= MAX_QUOTES_PER_PERSON: break
-    return [_clean_snippet(q) for q in quotes[:MAX_QUOTES_PER_PERSON]]
-
-# --- Новая основная экспортируемая функция ---
-def get_all_influencer_quotes() -> dict:
+# Ярусы запросов: бесплатные Reddit и Mastodon – сразу; NewsAPI (дневной лимит) и
+# поиск YouTube (100 единиц квоты) – только если выше по приоритету ничего не нашлось.
+# Поэтому находка Mastodon принимается, лишь когда квотные ярусы пусты.
+QUERY_TIERS = [[_fetch_reddit, _fetch_mastodon], [_fetch_newsapi], [_fetch_youtube]]
+
+def _best_known(aliases: list[str], found: dict) -> tuple[list[str], list]:
+    """Первый непустой результат в порядке приоритета и ещё не запрошенные пары (псевдоним, источник) выше него."""
+    unknown = []
+    for pair in ((alias, fn) for alias in aliases for fn in SRC_FUNCS):
+        if pair not in found:
+            unknown.append(pair)
+        elif found[pair]:
+            return found[pair], unknown
+    return [], unknown
+
+def _result(fut) -> list[str]:
+    try:
+        return fut.result()
+    except Exception as e:  # _fetch_* сами ловят ошибки, это страховка
+        log(f"Quote source error: {e}")
+        return []
+
+def _collect_all(influencers: list[dict]) -> list[list[str]]:
+    """Первый пригодный фрагмент по каждому человеку в порядке SRC_FUNCS.
+
+    Запросы идут ярусами QUERY_TIERS: внутри яруса все запросы по всем людям
+    стартуют сразу (не больше MAX_PARALLEL_QUERIES одновременно) и ждут не
+    дольше TIER_DEADLINE; не успевшие считаются пустыми. Квотные источники
+    запрашиваются только там, где их результат может что-то изменить, поэтому
+    общее время – до трёх ярусов, а не один самый медленный запрос.
     """
-    Собирает все цитаты, отправляет на обработку в GPT и возвращает
-    два готовых текстовых блока: для крипто и фонды.
+    found: list[dict] = [{} for _ in influencers]   # (псевдоним, источник) → фрагменты
+    ex = ThreadPoolExecutor(max_workers=MAX_PARALLEL_QUERIES, thread_name_prefix="quotes")
+    try:
+        for sources in QUERY_TIERS:
+            pending = {}
+            for i, inf in enumerate(influencers):
+                _, unknown = _best_known(inf["aliases"], found[i])
+                for alias, fn in unknown:
+                    if fn in sources:
+                        pending[ex.submit(fn, alias)] = (i, alias, fn)
+            if not pending:
+                continue
+            done, not_done = wait(pending, timeout=TIER_DEADLINE)
+            if not_done:
+                log(f"⚠️ Цитаты: {len(not_done)} запросов не уложились в {TIER_DEADLINE:g}с – считаются пустыми.")
+            for fut, (i, alias, fn) in pending.items():
+                if fut in done:
+                    found[i][(alias, fn)] = _result(fut)
+                else:
+                    fut.cancel()
+                    found[i][(alias, fn)] = []
+        return [
+            [_clean_snippet(q) for q in _best_known(inf["aliases"], found[i])[0][:MAX_QUOTES_PER_PERSON]]
+            for i, inf in enumerate(influencers)
+        ]
+    finally:
+        ex.shutdown(wait=False, cancel_futures=True)
+
+# --- Экспортируемые функции ---
+def collect_raw_quotes() -> dict:
+    """
+    Шаг сбора (без GPT): первый пригодный фрагмент по каждому человеку.
+    Возвращает {"influencers": [...], "quotes": [...]} – списки одной длины.
     """
     influencers_with_quotes = []
     raw_quotes = []
-
-    # Шаг 1: Собираем все "сырые" цитаты в один список
-    for inf in INFLUENCERS:
-        q = _collect_for_aliases(inf["aliases"])
+    # Собираем все "сырые" цитаты в один список (запросы идут параллельно)
+    for inf, q in zip(INFLUENCERS, _collect_all(INFLUENCERS)):
         if q:
             influencers_with_quotes.append(inf)
             raw_quotes.append(q[0])
+    return {"influencers": influencers_with_quotes, "quotes": raw_quotes}
+
+def build_quote_blocks(raw: dict) -> dict:
+    """
+    Шаг GPT: обрабатывает собранные цитаты и возвращает два готовых
+    текстовых блока: для крипто и фонды.
+    """
+    influencers_with_quotes = raw.get("influencers", [])
+    raw_quotes = raw.get("quotes", [])
 
     if not raw_quotes:
         return {"crypto": "", "stock": ""}
 
-    # Шаг 2: Обрабатываем всё через GPT
+    # Обрабатываем всё через GPT
     processed_quotes = _process_quotes_with_gpt(raw_quotes)
 
-    # Шаг 3: Распределяем обработанные цитаты по категориям
+    # Распределяем обработанные цитаты по категориям
     crypto_bullets = []
     stock_bullets = []
 
@@ -280,7 +358,7 @@ def get_all_influencer_quotes() -> dict:
             elif theme == 'stock':
                 stock_bullets.append(bullet)
 
-    # Шаг 4: Формируем финальные текстовые блоки
+    # Формируем финальные текстовые блоки
     crypto_block = ""
     if crypto_bullets:
         title = "🗣️ Мнения крипто-лидеров"
@@ -291,4 +369,11 @@ def get_all_influencer_quotes() -> dict:
         title = "🗣️ Выдержки от людей, влияющих на фондовый рынок"
         stock_block = "\n".join([title] + stock_bullets)
         
-    return {"crypto": crypto_block, "stock": stock_block}
\ No newline at end of file
+    return {"crypto": crypto_block, "stock": stock_block}
+
+def get_all_influencer_quotes() -> dict:
+    """
+    Собирает все цитаты, отправляет на обработку в GPT и возвращает
+    два готовых текстовых блока: для крипто и фонды.
+    """
+    return build_quote_blocks(collect_raw_quotes())
@@ -0,0 +1,107 @@
+# macro_cache.py – локальный кеш медленных макро-рядов (FRED / World Bank)
+#
+# CPI, PPI, ставки и безработица выходят раз в месяц (World Bank – раз в год),
+# поэтому перекачивать их каждый запуск незачем. Кеш хранит последние
+# наблюдения ряда и время загрузки в JSON-файле и идёт в сеть, только когда
+# мог выйти новый релиз. Если источник недоступен – отдаём сохранённые данные.
+import os, json, threading, datetime as dt
+from custom_logger import log
+
+CACHE_PATH     = os.getenv("MACRO_CACHE_PATH", os.path.join("cache", "macro_series.json"))
+CACHE_DISABLED = os.getenv("MACRO_CACHE_DISABLE", "").lower() in ("1", "true", "yes")
+
+def _env_float(name, default):
+    try: return float(os.getenv(name, default))
+    except ValueError:
+        log(f"WARNING: Invalid {name} in .env, fallback to {default}")
+        return float(default)
+
+RECHECK_HOURS = _env_float("MACRO_CACHE_RECHECK_HOURS", 12)   # как часто проверять «просроченный» релиз
+MAX_AGE_DAYS  = _env_float("MACRO_CACHE_MAX_AGE_DAYS", 35)    # страховка от ревизий данных
+
+# Длина периода ряда по частоте (дни)
+PERIOD_DAYS = {"daily": 1, "weekly": 7, "monthly": 31, "quarterly": 92, "annual": 366}
+
+_lock = threading.Lock()
+_entries = None   # {key: {"fetched_at", "last_obs", "freq", "data"}}
+
+# ---- helpers -------------------------------------------------------------
+def _now():
+    return dt.datetime.now(dt.timezone.utc)
+
+def _load():
+    global _entries
+    if _entries is None:
+        try:
+            with open(CACHE_PATH, "r", encoding="utf-8") as f:
+                _entries = json.load(f)
+        except FileNotFoundError:
+            _entries = {}
+        except (OSError, ValueError) as e:
+            log(f"⚠️ macro_cache: не удалось прочитать {CACHE_PATH}: {e}")
+            _entries = {}
+    return _entries
+
+def _save():
+    os.makedirs(os.path.dirname(CACHE_PATH) or ".", exist_ok=True)
+    tmp = CACHE_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(_entries, f, ensure_ascii=False)
+    os.replace(tmp, CACHE_PATH)
+
+def infer_freq(dates):
+    """Частота ряда по разрыву между двумя последними датами (даты по убыванию)."""
+    if len(dates) < 2: return "annual"
+    gap = abs((dt.date.fromisoformat(dates[0]) - dt.date.fromisoformat(dates[1])).days)
+    if gap <= 3:   return "daily"
+    if gap <= 10:  return "weekly"
+    if gap <= 45:  return "monthly"
+    if gap <= 140: return "quarterly"
+    return "annual"
+
+def next_release_after(last_obs, freq):
+    """Самая ранняя дата, когда может выйти следующее наблюдение.
+
+    Наблюдение с датой начала периода публикуется не раньше конца периода,
+    значит следующее (last_obs + период) – не раньше last_obs + 2 периода.
+    """
+    return dt.date.fromisoformat(last_obs) + dt.timedelta(days=2 * PERIOD_DAYS[freq])
+
+def is_fresh(entry, now=None):
+    now = now or _now()
+    fetched = dt.datetime.fromisoformat(entry["fetched_at"])
+    age = now - fetched
+    if age > dt.timedelta(days=MAX_AGE_DAYS):
+        return False
+    if now.date() < next_release_after(entry["last_obs"], entry["freq"]):
+        return True                                    # новый релиз ещё не мог выйти
+    return age < dt.timedelta(hours=RECHECK_HOURS)     # релиз «просрочен» – проверяем не чаще RECHECK_HOURS
+
+# ---- public --------------------------------------------------------------
+def get_or_fetch(key, fetch, obs_dates):
+    """Данные ряда `key` из кеша или через `fetch()`.
+
+    obs_dates(data) -> список дат наблюдений (ISO, по убыванию) для расчёта
+    частоты и следующего релиза. При ошибке `fetch` отдаются старые данные.
+    """
+    if CACHE_DISABLED:
+        return fetch()
+    with _lock:
+        entry = _load().get(key)
+    if entry and is_fresh(entry):
+        return entry["data"]
+    try:
+        data = fetch()
+    except Exception as e:
+        if entry:
+            log(f"ℹ️ macro_cache: {key} – источник недоступен ({e}), берём кеш от {entry['fetched_at'][:10]}")
+            return entry["data"]
+        raise
+    dates = obs_dates(data)
+    if dates:
+        with _lock:
+            _load()[key] = {"fetched_at": _now().isoformat(timespec="seconds"),
+                            "last_obs": dates[0], "freq": infer_freq(dates), "data": data}
+            try: _save()
+            except OSError as e: log(f"⚠️ macro_cache: не удалось сохранить {CACHE_PATH}: {e}")
+    return data
@@ -1,17 +1,21 @@
 # macro_reader.py – 7 регионов, FRED+WorldBank, значок 🕒 для “старых” данных
-import os, requests, datetime as dt
+import os, datetime as dt
+from concurrent.futures import ThreadPoolExecutor
 from custom_logger import log
+import macro_cache
+from http_client import http_get
+from records import MacroRow, MacroSnapshot
+from renderers import render_macro
 
 FRED_KEY  = os.getenv("FRED_KEY")
 FRED_BASE = "https://api.stlouisfed.org/fred/series/observations"
 WB_BASE   = "https://api.worldbank.org/v2/country"
 
-MONTHS_RU = {1:"янв",2:"фев",3:"мар",4:"апр",5:"май",6:"июн",
-             7:"июл",8:"авг",9:"сен",10:"окт",11:"ноя",12:"дек"}
-
 MAX_AGE_DAYS      = 365      # ≤ 12 мес
 STALE_BADGE_DAYS  = 210      # > 7 мес → 🕒
 LATEST_ROWS       = 15       # глубже копаем FRED
+YOY_ROWS          = 13       # текущий месяц + 12 мес. назад
+FETCH_WORKERS     = 16       # параллельных запросов к FRED/WB
 
 SERIES = {
     "US": {"flag":"🇺🇸","iso":"usa",
@@ -56,7 +60,7 @@ SERIES = {
 def _fred_fetch(sid, rows=LATEST_ROWS):
     url=(f"{FRED_BASE}?series_id={sid}&api_key={FRED_KEY}"
          f"&file_type=json&sort_order=desc&limit={rows}")
-    data=requests.get(url,timeout=10).json()
+    data=http_get(url,timeout=10).json()
     if "observations" not in data:
         raise ValueError(data.get("error_message","no obs"))
     return data["observations"]
@@ -67,22 +71,25 @@ def _first_valid(obs):
             return float(o["value"]),o["date"]
     raise ValueError("empty")
 
-def _fred_latest(sid):
-    val,d=_first_valid(_fred_fetch(sid))
+def _fred_latest(sid,obs=None):
+    val,d=_first_valid(obs if obs is not None else _fred_fetch(sid))
     age=(dt.datetime.today()-dt.datetime.fromisoformat(d)).days
     if age>MAX_AGE_DAYS: raise ValueError("too old")
     return val,d,age
 
-def _yoy_from_index(sid):
-    obs=_fred_fetch(sid,13)
+def _yoy_from_index(sid,obs=None):
+    obs=(obs if obs is not None else _fred_fetch(sid,YOY_ROWS))[:YOY_ROWS]
     new,_=_first_valid(obs[:1])
     old,_=_first_valid(obs[-1:])
     return (new/old-1)*100,obs[0]["date"]
 
 # ---- helpers: World Bank -------------------------------------------------
-def _wb_latest(iso,ind):
+def _wb_fetch(iso,ind):
     url=f"{WB_BASE}/{iso}/indicator/{ind}?format=json&per_page=1"
-    data=requests.get(url,timeout=10).json()[1][0]
+    return http_get(url,timeout=10).json()
+
+def _wb_latest(iso,ind,raw=None):
+    data=(raw if raw is not None else _wb_fetch(iso,ind))[1][0]
     val,year=data["value"],int(data["date"])
     if val is None: raise ValueError("WB empty")
     d=f"{year}-07-01"
@@ -90,62 +97,87 @@ def _wb_latest(iso,ind):
     if age>MAX_AGE_DAYS: raise ValueError("WB too old")
     return float(val),d,age
 
-def _rus(d_iso):
-    d=dt.datetime.fromisoformat(d_iso)
-    return f"{MONTHS_RU[d.month]} {d.year}"
+# ---- batch engine: все запросы разом -------------------------------------
+FRED_FIELDS=("cpi_yoy","cpi_idx","ppi","rate","unemp")
+
+class _Batch:
+    """Результаты параллельной загрузки: sid/(iso,ind) -> данные или исключение."""
+    def __init__(self,fred,wb):
+        self._fred,self._wb=fred,wb
+    @staticmethod
+    def _take(box,key):
+        val,exc=box[key]
+        if exc is not None: raise exc
+        return val
+    def fred(self,sid): return self._take(self._fred,sid)
+    def wb(self,iso,ind): return self._take(self._wb,(iso,ind))
+
+# Через локальный кеш: в сеть идём, только если мог выйти новый релиз
+def _fred_dates(obs): return [o["date"] for o in obs]
+def _wb_dates(raw): return [f"{r['date']}-01-01" for r in (raw[1] or [])] if len(raw)>1 else []
+
+def _fred_cached(sid):
+    return macro_cache.get_or_fetch(sid,lambda: _fred_fetch(sid),_fred_dates)
+
+def _wb_cached(iso,ind):
+    return macro_cache.get_or_fetch(f"WB:{iso}:{ind}",lambda: _wb_fetch(iso,ind),_wb_dates)
+
+def _outcome(fut):
+    try: return fut.result(),None
+    except Exception as e: return None,e
+
+def _fetch_batch(series=SERIES):
+    # Каждый FRED-ряд качаем один раз (LATEST_ROWS хватает и для YoY),
+    # а World Bank – сразу, «на всякий случай», не дожидаясь ошибки FRED.
+    sids={cfg[k] for cfg in series.values() for k in FRED_FIELDS if cfg[k]}
+    wb_keys={(cfg["iso"],cfg["wb_cpi"]) for cfg in series.values() if cfg["wb_cpi"]}
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS,thread_name_prefix="macro") as ex:
+        fred={sid:ex.submit(_fred_cached,sid) for sid in sids}
+        wb={key:ex.submit(_wb_cached,*key) for key in wb_keys}
+    return _Batch({k:_outcome(f) for k,f in fred.items()},
+                  {k:_outcome(f) for k,f in wb.items()})
 
 # ---- main block ----------------------------------------------------------
-def get_macro_block():
-    lines=[]
+def fetch_macro():
+    batch=_fetch_batch()
+    rows=[]
     for cfg in SERIES.values():
         flag=cfg["flag"]
 
         # CPI
         try:
             if cfg["cpi_yoy"]:
-                cpi,d,age=_fred_latest(cfg["cpi_yoy"])
+                cpi,d,age=_fred_latest(cfg["cpi_yoy"],batch.fred(cfg["cpi_yoy"]))
             else:
-                cpi,d=_yoy_from_index(cfg["cpi_idx"]); age=(dt.datetime.today()-dt.datetime.fromisoformat(d)).days
+                cpi,d=_yoy_from_index(cfg["cpi_idx"],batch.fred(cfg["cpi_idx"])); age=(dt.datetime.today()-dt.datetime.fromisoformat(d)).days
         except Exception as e_fred:
             try:
-                cpi,d,age=_wb_latest(cfg["iso"],cfg["wb_cpi"])
+                cpi,d,age=_wb_latest(cfg["iso"],cfg["wb_cpi"],batch.wb(cfg["iso"],cfg["wb_cpi"]))
                 log(f"ℹ️ CPI {flag} via WB {cpi:.2f} ({d})")
             except Exception as e_wb:
                 log(f"❌ CPI {flag} FRED:{e_fred} WB:{e_wb}")
                 continue
 
-        stale=" 🕒" if age>STALE_BADGE_DAYS else ""
+        row=MacroRow(flag,cpi,d,stale=age>STALE_BADGE_DAYS)
 
         # PPI
-        ppi_s="PPI n/a"
         if cfg["ppi"]:
-            try:
-                ppi,_=_yoy_from_index(cfg["ppi"])
-                ppi_s=f"PPI {ppi:.1f} %"
+            try: row.ppi,_=_yoy_from_index(cfg["ppi"],batch.fred(cfg["ppi"]))
             except Exception as e: log(f"⚠️ PPI {flag} {e}")
 
         # Rate
-        rate_s="Rate n/a"
         if cfg["rate"]:
-            try:
-                rate,_,_=_fred_latest(cfg["rate"])
-                rate_s=f"Rate {rate:.2f} %"
+            try: row.rate,_,_=_fred_latest(cfg["rate"],batch.fred(cfg["rate"]))
             except Exception as e: log(f"⚠️ RATE {flag} {e}")
 
         # Unemployment
-        unemp_s=""
         if cfg["unemp"]:
-            try:
-                un,_,_=_fred_latest(cfg["unemp"])
-                unemp_s=f" | Unemp {un:.1f} %"
+            try: row.unemp,_,_=_fred_latest(cfg["unemp"],batch.fred(cfg["unemp"]))
             except Exception as e: log(f"⚠️ UNEMP {flag} {e}")
 
-        lines.append(
-            f"{flag} CPI {cpi:.1f} %{stale} | {ppi_s} | {rate_s}{unemp_s}  ({_rus(d)})"
-        )
+        rows.append(row)
 
-    if not lines: return ""
-    header=("📊 Макроэкономика\n"
-            "<b>Легенда:</b> CPI — годовая инфляция, PPI — цены производителей, "
-            "Rate — ставка ЦБ, Unemp — безработица\n\n")
-    return header+"\n".join(lines)
+    return MacroSnapshot(rows=rows,error=None if rows else "нет данных CPI ни по одному региону")
+
+def get_macro_block():
+    return render_macro(fetch_macro())
@@ -1,37 +1,44 @@
 #!/usr/bin/env python3
+# Тяжёлые пакеты (openai, yfinance/pandas/ta, textblob/nltk) импортируются там,
+# где впервые нужны; корпуса NLTK ставятся на этапе сборки (nltk_setup.py).
 import pytz
-import nltk
-# Используем quiet=True, чтобы не было лишних сообщений в логах при каждом запуске
-nltk.download('punkt', quiet=True)
-nltk.download('wordnet', quiet=True)
-nltk.download('averaged_perceptron_tagger', quiet=True)
-
 import os
 import sys
-import requests
-import openai
 from datetime import datetime, timezone, date, timedelta
-from time import sleep
 import traceback
 import re
-from influencer_quotes_reader import get_all_influencer_quotes
-from macro_reader import get_macro_block
+import uuid
+from itertools import count
+from dataclasses import replace
+from influencer_quotes_reader import collect_raw_quotes, build_quote_blocks
+from macro_reader import fetch_macro
 from halving_utils import get_btc_halving_countdown_line
 
 # Модули проекта
-from market_reader import get_market_data_text, get_crypto_data
+from market_reader import fetch_market, fetch_crypto
 # Импортируем обновленные функции и список инфлюенсеров
-from news_reader import get_news_block, get_news_pool_for_gpt_analysis, INFLUENCERS_TO_TRACK
-from analyzer import keyword_alert, store_and_compare
-from metrics_reader import get_derivatives_block
+from news_reader import get_news_block, get_news_pool_for_gpt_analysis, commit_seen_articles, INFLUENCERS_TO_TRACK
+from analyzer import keyword_alert, compare_with_previous
+import report_history
+from metrics_reader import fetch_derivatives
 from whale_alert_reader import get_whale_activity_summary
-from fng_reader import get_fear_and_greed_index_text
+from fng_reader import fetch_fear_and_greed
+from records import CryptoSnapshot, DerivativesSnapshot, FngReading, MacroSnapshot, MarketSnapshot
+from renderers import render_crypto, render_derivatives, render_fng, render_macro, render_market
 from collections import Counter
 from custom_logger import log
+from collector import BlockTask, collect_blocks
+from http_client import http_post, log_stats as log_http_stats, reset_stats as reset_http_stats
+from gpt_client import chat_completion, chat_completion_stream, log_usage as log_gpt_usage, reset_call_records as reset_gpt_usage
+from gpt_stage import run_gpt_stage, stream_in_background
+from stream_publisher import StreamPublisher, iter_paragraphs
+from tg_chunker import chunk_text
+from stage_timer import StageTimer
+from tg_outbox import deliver_pending as deliver_tg_pending, pending_count as tg_pending_count
+from fanout import Report, load_targets, publish as publish_report
 
 
 # --- Конфигурация ---
-openai.api_key = os.getenv("OPENAI_KEY")
 TG_TOKEN = os.getenv("TG_TOKEN")
 CHANNEL_ID = os.getenv("CHANNEL_ID")
 MARKETAUX_KEY = os.getenv("MARKETAUX_KEY")
@@ -40,8 +47,38 @@ COINMARKETCAP_KEY = os.getenv("COINMARKETCAP_KEY")
 MODEL = "gpt-4o-mini"
 TIMEOUT = 120 
 TG_LIMIT_BYTES = 3400
+# Чаты для рассылки (TG_CHATS, JSON); по умолчанию – один CHANNEL_ID
+TG_TARGETS = load_targets(CHANNEL_ID, TG_LIMIT_BYTES)
 GPT_TOKENS_MAIN_ANALYSIS = 1800 
 GPT_TOKENS_INFLUENCER_ANALYSIS = 800
+# Бюджеты промпта (токены): длинный вход урезается gpt_client до отправки
+GPT_PROMPT_BUDGET_MAIN = 6000
+GPT_PROMPT_BUDGET_INFLUENCER = 8000
+# Потоковый режим: блоки данных уходят сразу, основной анализ GPT – по мере генерации
+STREAM_MODE = os.getenv("STREAM_MODE", "").lower() in ("1", "true", "yes")
+# RUN_MODE=daemon (или флаг --daemon) – долгоживущий процесс с расписанием (daemon.py)
+RUN_MODE = os.getenv("RUN_MODE", "once").lower()
+
+# Дедлайны (сек.) для параллельного сбора блоков: медленный API не задерживает весь отчёт
+BLOCK_DEADLINES = {
+    "halving": 15,
+    "crypto": 60,       # CoinGecko → CMC + история BTC из yfinance
+    "fng": 15,
+    "derivatives": 25,
+    "macro": 90,        # десятки запросов к FRED/World Bank
+    "whales": 15,
+    "market": 60,
+    "quotes": 120,      # 4 источника × псевдонимы × 13 человек (без GPT)
+    "news_pool": 45,
+}
+
+# Дедлайны (сек) запросов этапа GPT – они идут параллельно, см. gpt_stage.py
+GPT_DEADLINES = {
+    "macro_gpt": 90,
+    "quotes_gpt": 120,
+    "influencers_gpt": 2 * (TIMEOUT + 30),   # gpt_client успевает повторить запрос
+    "main_gpt": 2 * TIMEOUT + 10,
+}
 
 
 # --- Промпты для GPT (основной анализ - с усиленными инструкциями) ---
@@ -104,7 +141,7 @@ GPT_INFLUENCER_ANALYSIS_PROMPT = """⚠️ ВАЖНО: Каждый раздел
 СПИСОК ВЛИЯТЕЛЬНЫХ ЛИЦ ДЛЯ ПОИСКА:
 {influencer_names_list}
 
-ОБЩИЙ БЛОК НОВОСТЕЙ ДЛЯ АНАЛИЗА (обрати внимание, это не отфильтрованные новости, тебе нужно самому найти в них упоминания указанных лиц):
+БЛОК НОВОСТЕЙ ДЛЯ АНАЛИЗА (новости уже отобраны локальным поиском: в каждой есть строка «Упомянуты:» с найденными лицами; проверь, что упоминание действительно относится к этому человеку):
 ---
 {general_news_text_pool}
 ---
@@ -133,35 +170,25 @@ GPT_MACRO_ANALYSIS_PROMPT = """⚠️ ВАЖНО: ответ должен быт
 Напиши вывод:
 """
 
-# --- Вспомогательные функции (log, safe_call - без изменений) ---
+# --- Вспомогательные функции (log - без изменений) ---
 def log(msg):
     timestamp = f"[{datetime.now(timezone.utc):%Y-%m-%d %H:%M:%S} UTC]"
     print(f"{timestamp} {msg}", flush=True)
 
-def safe_call(func, retries=3, delay=5, label="❗ Ошибка"):
-    for i in range(retries):
-        try:
-            return func()
-        except requests.exceptions.Timeout:
-            log(f"{label}: попытка {i + 1}/{retries} не удалась - Таймаут ({TIMEOUT}с)")
-        except requests.exceptions.RequestException as e:
-            log(f"{label}: попытка {i + 1}/{retries} не удалась - Ошибка сети: {e}")
-        except openai.error.OpenAIError as e: 
-            log(f"{label} OpenAI: попытка {i + 1}/{retries} не удалась - {type(e).__name__}: {e}")
-        except Exception as e:
-            log(f"{label}: попытка {i + 1}/{retries} не удалась - Общая ошибка: {type(e).__name__} - {e}")
-            # log(traceback.format_exc()) 
-        if i < retries - 1:
-            log(f"Пауза {delay} сек. перед следующей попыткой...")
-            sleep(delay)
-    log(f"{label}: все {retries} попытки провалены.")
-    return None
-
-# --- Генерация основного отчета GPT (gpt_report - без изменений) ---
-def gpt_report():
+# --- Генерация основного отчета GPT ---
+def _main_gpt_request(changes_text=""):
+    """Параметры запроса основного анализа (общие для обычного и потокового режима).
+
+    changes_text – блок «🔎 Что изменилось» от delta_engine (крупные движения уже посчитаны).
+    """
     today_date_str = date.today().strftime("%d.%m.%Y")
     news_text_for_gpt, has_actual_news = get_news_block() 
     header_for_gpt = f"📅 Анализ рыночной ситуации на {today_date_str}"
+    if changes_text:
+        header_for_gpt += (
+            f"\n\n--- КРУПНЫЕ ИЗМЕНЕНИЯ ПОКАЗАТЕЛЕЙ К ПРОШЛЫМ ОТЧЁТАМ (рассчитаны по истории) ---\n"
+            f"{changes_text}"
+        )
     current_gpt_prompt_name = ""
     
     if has_actual_news:
@@ -187,16 +214,25 @@ def gpt_report():
         )
     
     log(f"ℹ️ Данные для GPT (основной анализ, длина: {len(dynamic_data_for_gpt)}). Промпт: {current_gpt_prompt_name}. Начало: {dynamic_data_for_gpt[:200].replace(chr(10), ' ')}...")
-    response = safe_call(
-        lambda: openai.ChatCompletion.create(
-            model=MODEL,
-            messages=[{"role": "user", "content": dynamic_data_for_gpt}],
-            timeout=TIMEOUT, 
-            temperature=0.4,
-            max_tokens=GPT_TOKENS_MAIN_ANALYSIS,
-        ),
-        label="❗ Ошибка OpenAI (основной анализ)"
+    return dict(
+        model=MODEL,
+        messages=[{"role": "user", "content": dynamic_data_for_gpt}],
+        timeout=TIMEOUT, 
+        temperature=0.4,
+        max_tokens=GPT_TOKENS_MAIN_ANALYSIS,
     )
+
+def ask_gpt(error_label, **request):
+    """chat_completion (с повторами внутри gpt_client); None, если все попытки не удались."""
+    try:
+        return chat_completion(**request)
+    except Exception as e:
+        log(f"{error_label}: {type(e).__name__}: {e}")
+        return None
+
+def gpt_report(changes_text=""):
+    response = ask_gpt("❗ Ошибка OpenAI (основной анализ)",
+                       prompt_budget=GPT_PROMPT_BUDGET_MAIN, **_main_gpt_request(changes_text))
     if not response or not response.choices:
         log("❌ OpenAI не ответил на основной запрос или вернул пустой ответ.")
         return "🤖 Не удалось получить основной аналитический отчет от GPT." 
@@ -205,15 +241,20 @@ def gpt_report():
     log(f"📝 GPT сгенерировал основной аналитический текст ({len(generated_text)}).")
     return generated_text
 
-# --- ОБНОВЛЕННАЯ ФУНКЦИЯ для анализа упоминаний инфлюенсеров (с поиском в общем тексте) ---
+def gpt_report_stream(changes_text=""):
+    """Основной анализ с stream=True: фрагменты текста по мере генерации."""
+    return chat_completion_stream(prompt_budget=GPT_PROMPT_BUDGET_MAIN, **_main_gpt_request(changes_text))
+
+def is_news_pool_text(text):
+    """True, если get_news_pool_for_gpt_analysis вернул статьи, а не сообщение «🗣️ …» или пустую строку."""
+    return bool(text) and not text.lstrip().startswith("🗣️")
+
+# --- ОБНОВЛЕННАЯ ФУНКЦИЯ для анализа упоминаний инфлюенсеров (статьи отобраны локальным поиском) ---
 def analyze_influencer_mentions_with_gpt(general_news_pool_text, influencer_list):
     """
-    Ищет упоминания влиятельных лиц в общем пуле новостей и анализирует их с помощью GPT.
+    Анализирует с помощью GPT статьи, в которых news_reader уже нашёл упоминания влиятельных лиц.
     """
-    if not general_news_pool_text or \
-       "не удалось загрузить пул" in general_news_pool_text.lower() or \
-       "ключ marketaux api не настроен" in general_news_pool_text.lower() or \
-       "ошибка при загрузке пула новостей" in general_news_pool_text.lower(): # Добавлена проверка на общую ошибку
+    if not is_news_pool_text(general_news_pool_text):
         log(f"ℹ️ Нет пула новостей для анализа упоминаний инфлюенсеров или ошибка загрузки. Текст: {general_news_pool_text}")
         return general_news_pool_text 
 
@@ -228,15 +269,14 @@ def analyze_influencer_mentions_with_gpt(general_news_pool_text, influencer_list
     )
     
     log(f"ℹ️ Данные для GPT (анализ инфлюенсеров, длина промпта: {len(prompt)}). Имена для поиска: {influencer_names_str}. Начало пула новостей: {general_news_pool_text[:200].replace(chr(10), ' ')}...")
-    response = safe_call(
-        lambda: openai.ChatCompletion.create(
-            model=MODEL, 
-            messages=[{"role": "user", "content": prompt}],
-            timeout=TIMEOUT + 30, 
-            temperature=0.5, 
-            max_tokens=GPT_TOKENS_INFLUENCER_ANALYSIS 
-        ),
-        label="❗ Ошибка OpenAI (анализ инфлюенсеров)"
+    response = ask_gpt(
+        "❗ Ошибка OpenAI (анализ инфлюенсеров)",
+        model=MODEL, 
+        messages=[{"role": "user", "content": prompt}],
+        timeout=TIMEOUT + 30, 
+        temperature=0.5, 
+        max_tokens=GPT_TOKENS_INFLUENCER_ANALYSIS,
+        prompt_budget=GPT_PROMPT_BUDGET_INFLUENCER,
     )
 
     if not response or not response.choices:
@@ -248,7 +288,25 @@ def analyze_influencer_mentions_with_gpt(general_news_pool_text, influencer_list
     return analysis_text
 
 
-# --- Обработка и отправка текста в Telegram (prepare_text, force_split_long_string, smart_chunk, send - без изменений) ---
+def build_influencer_block(general_news_pool):
+    """Блок «влиятели в новостях»: анализ GPT, если в пуле есть статьи с упоминаниями, иначе сообщение пула."""
+    # Вызываем анализ GPT, только если в пуле есть статьи с упоминаниями (а не сообщение/пустота)
+    if not is_news_pool_text(general_news_pool):
+        return general_news_pool  # Отображаем сообщение от get_news_pool_for_gpt_analysis (или ничего)
+
+    log("🔄 Анализ упоминаний влиятельных лиц с помощью GPT...")
+    gpt_analysis_of_mentions = analyze_influencer_mentions_with_gpt(general_news_pool, INFLUENCERS_TO_TRACK) # INFLUENCERS_TO_TRACK импортирован из news_reader
+    if not gpt_analysis_of_mentions:
+        return ""
+    # Проверяем, не является ли результат просто сообщением об ошибке от GPT или "не найдено"
+    if "не удалось получить анализ" in gpt_analysis_of_mentions.lower() or \
+       "не найдено" in gpt_analysis_of_mentions.lower() or \
+       "не обнаружено" in gpt_analysis_of_mentions.lower(): # Добавлено "не обнаружено"
+        return f"🗣️ {gpt_analysis_of_mentions}"
+    return f"💬 Мнения лидеров и их анализ от GPT:\n{gpt_analysis_of_mentions}"
+
+
+# --- Обработка и отправка текста в Telegram (prepare_text, smart_chunk, send) ---
 def prepare_text(text_to_prepare):
     if not isinstance(text_to_prepare, str):
         log(f"⚠️ prepare_text получил не строку: {type(text_to_prepare)}. Возвращаю как есть.")
@@ -271,122 +329,153 @@ def prepare_text(text_to_prepare):
     return re.sub(r'\n{3,}', '\n\n', final_text).strip()
 
 
-def force_split_long_string(long_str, limit_b):
-    sub_chunks = []
-    if not long_str: return sub_chunks
-    encoded_str = long_str.encode('utf-8')
-    current_byte_pos = 0
-    while current_byte_pos < len(encoded_str):
-        end_byte_pos = min(current_byte_pos + limit_b, len(encoded_str))
-        byte_slice_candidate = encoded_str[current_byte_pos:end_byte_pos]
-        while True:
-            try:
-                decoded_chunk = byte_slice_candidate.decode('utf-8')
-                sub_chunks.append(decoded_chunk)
-                current_byte_pos += len(byte_slice_candidate) 
-                break 
-            except UnicodeDecodeError:
-                if len(byte_slice_candidate) > 1:
-                    byte_slice_candidate = byte_slice_candidate[:-1] 
-                else:
-                    log(f"⚠️ Пропущен не декодируемый байт при принудительной нарезке: {encoded_str[current_byte_pos:current_byte_pos+1]!r}")
-                    current_byte_pos += 1 
-                    break 
-    return sub_chunks
-
-def smart_chunk(text_to_chunk, outer_limit_bytes):
-    paragraphs = text_to_chunk.split("\n\n") 
-    final_result_chunks = []
-    current_accumulated_parts = [] 
-    current_accumulated_bytes = 0  
-    for para_idx, paragraph_str in enumerate(paragraphs):
-        if not paragraph_str.strip(): continue
-        paragraph_bytes = paragraph_str.encode('utf-8')
-        separator_bytes_len = 2 if current_accumulated_parts else 0 
-        if current_accumulated_bytes + separator_bytes_len + len(paragraph_bytes) <= outer_limit_bytes:
-            if current_accumulated_parts: 
-                current_accumulated_parts.append("\n\n")
-            current_accumulated_parts.append(paragraph_str)
-            current_accumulated_bytes += separator_bytes_len + len(paragraph_bytes)
-        else:
-            if current_accumulated_parts:
-                final_result_chunks.append("".join(current_accumulated_parts))
-            current_accumulated_parts = [] 
-            current_accumulated_bytes = 0
-            if len(paragraph_bytes) > outer_limit_bytes:
-                log(f"ℹ️ Абзац #{para_idx} '{paragraph_str[:30].replace(chr(10),' ')}...' ({len(paragraph_bytes)}Б > {outer_limit_bytes}Б) будет разрезан.")
-                split_long_paragraph_sub_chunks = force_split_long_string(paragraph_str, outer_limit_bytes)
-                if split_long_paragraph_sub_chunks:
-                    final_result_chunks.extend(split_long_paragraph_sub_chunks[:-1])
-                    current_accumulated_parts.append(split_long_paragraph_sub_chunks[-1])
-                    current_accumulated_bytes = len(split_long_paragraph_sub_chunks[-1].encode('utf-8'))
-            else: 
-                current_accumulated_parts.append(paragraph_str)
-                current_accumulated_bytes = len(paragraph_bytes)
-    if current_accumulated_parts: 
-        final_result_chunks.append("".join(current_accumulated_parts))
-    return [chunk_item for chunk_item in final_result_chunks if chunk_item.strip()] 
-
-def send(text_content, add_numeration_if_multiple_parts=False):
-    prepared_text_content = prepare_text(str(text_content)) 
-    prefix_max_allowance_bytes = 40 
-    text_chunk_limit_for_smart_chunk = TG_LIMIT_BYTES 
-    if add_numeration_if_multiple_parts:
-        text_chunk_limit_for_smart_chunk = TG_LIMIT_BYTES - prefix_max_allowance_bytes
-    parts_list = smart_chunk(prepared_text_content, text_chunk_limit_for_smart_chunk)
-    total_parts_count = len(parts_list)
-    if add_numeration_if_multiple_parts and total_parts_count == 1:
-        parts_list = smart_chunk(prepared_text_content, TG_LIMIT_BYTES) 
-        total_parts_count = len(parts_list)
-    if not parts_list:
-        log("ℹ️ Нет частей для отправки.")
-        return
-    for idx, single_part_content in enumerate(parts_list, 1):
-        final_text_for_telegram = single_part_content
-        log_part_prefix_display = "" 
-        if add_numeration_if_multiple_parts and total_parts_count > 1:
-            numeration_prefix_str = f"Часть {idx}/{total_parts_count}:\n\n"
-            final_text_for_telegram = numeration_prefix_str + single_part_content
-
-            if idx == total_parts_count:
-                donate_block = """
+def smart_chunk(text_to_chunk, outer_limit_bytes, split_reserve=0):
+    """Нарезка на сообщения ≤ outer_limit_bytes байт (см. tg_chunker: один проход, HTML-теги не рвутся)."""
+    return chunk_text(text_to_chunk, outer_limit_bytes, html=True, split_reserve=split_reserve)
+
+DONATE_BLOCK = """
         ☕ <b>Поддержать проект:</b>
         👉 <a href="https://tronscan.org/#/address/TZ6rTYbF5Go94Q4f9uZwcVZ4g3oAnzwDHN">Донат в USDT (TRC-20)</a>
         👉 <a href="https://tonviewer.com/UQB0W1KEAR7RFQ03AIA872jw-2G2ntydiXlyhfTN8rAb2KN5">Донат в TON</a>
         ✉️ <a href="https://t.me/ryanair_deals_bot">Связаться с автором</a>
         """
-                final_text_for_telegram += "\n\n" + donate_block
-            log_part_prefix_display = f"Часть {idx}/{total_parts_count} " 
-            final_text_bytes_with_prefix = len(final_text_for_telegram.encode('utf-8'))
-            if final_text_bytes_with_prefix > 4096: 
-                log(f"📛 ВНИМАНИЕ! {log_part_prefix_display}С ПРЕФИКСОМ СЛИШКОМ ДЛИННАЯ ({final_text_bytes_with_prefix}Б > 4096Б). Telegram ОБРЕЖЕТ ЭТУ ЧАСТЬ!")
-        def make_telegram_api_call():
-            return requests.post(
-                f"https://api.telegram.org/bot{TG_TOKEN}/sendMessage",
-                json={"chat_id": CHANNEL_ID, "text": final_text_for_telegram, "disable_web_page_preview": True, "parse_mode": "HTML"},
-                timeout=20 
-            )
-        response_from_tg = safe_call(make_telegram_api_call, label=f"❗ Ошибка отправки {log_part_prefix_display}в TG")
-        current_part_final_bytes = len(final_text_for_telegram.encode('utf-8'))
-        current_part_final_chars = len(final_text_for_telegram)
-        if response_from_tg and response_from_tg.status_code == 200:
-            log(f"✅ {log_part_prefix_display}успешно отправлена ({current_part_final_bytes}Б, {current_part_final_chars} симв.)")
-        elif response_from_tg:
-            error_text_preview = final_text_for_telegram[:150].replace('\n', ' ') 
-            log(f"❗ Ошибка от Telegram для {log_part_prefix_display.strip()}: {response_from_tg.status_code} - {response_from_tg.text}")
-            log(f"   Текст проблемной части (байты: {current_part_final_bytes}, симв: {current_part_final_chars}, начало): '{error_text_preview}...'")
-        else: 
-            error_text_preview = final_text_for_telegram[:150].replace('\n', ' ')
-            log(f"❗ Не удалось отправить {log_part_prefix_display.strip()} (нет ответа от сервера Telegram).")
-            log(f"   Текст проблемной части (байты: {current_part_final_bytes}, симв: {current_part_final_chars}, начало): '{error_text_preview}...'")
-        if total_parts_count > 1 and idx < total_parts_count: 
-            sleep_duration = 1.5 
-            log(f"ℹ️ Пауза {sleep_duration} сек. перед следующей частью...")
-            sleep(sleep_duration)
+
+def _unnumbered(targets):
+    return [replace(target, numbered=False) for target in targets]
+
+def send_part(text_for_telegram, report_id, log_part_prefix_display=""):
+    """Отправляет одно готовое сообщение во все чаты TG_CHATS; True, если хоть один чат его получил."""
+    deliveries = publish_report(Report(text_for_telegram), _unnumbered(TG_TARGETS), TG_TOKEN, report_id)
+    delivered = any(d.ok for d in deliveries.values())
+    if not delivered:
+        error_text_preview = text_for_telegram[:150].replace('\n', ' ')
+        log(f"❗ Не удалось отправить {log_part_prefix_display.strip() or 'сообщение'} ни в один чат. Начало: '{error_text_preview}...'")
+    return delivered
+
+def send(text_content, report_id, add_numeration_if_multiple_parts=False):
+    """Публикует отчёт во все чаты: одна нейтральная форма, рендеринг и доставка – по правилам каждого чата.
+
+    report_id – id запуска: части этого отчёта не отправятся дважды, даже если send() повторят.
+    """
+    prepared_text_content = prepare_text(str(text_content)) 
+    if not prepared_text_content.strip():
+        log("ℹ️ Нет частей для отправки.")
+        return {}
+    report = Report(prepared_text_content, footer=DONATE_BLOCK)
+    targets = TG_TARGETS if add_numeration_if_multiple_parts else _unnumbered(TG_TARGETS)
+    # Части фиксируются в tg_outbox до отправки: при падении посреди рассылки остаток досылается
+    deliveries = publish_report(report, targets, TG_TOKEN, report_id)
+    ok_chats = sum(1 for d in deliveries.values() if d.ok)
+    log(f"📨 Отчёт доставлен в {ok_chats}/{len(targets)} чатов.")
+    return deliveries
+
+def dedup_gpt_lines(text, seen_gpt_lines=None):
+    """Убирает повторы непустых строк (пустые сохраняются для абзацев).
+
+    seen_gpt_lines – общий Counter, если текст приходит частями (потоковый режим).
+    """
+    if seen_gpt_lines is None:
+        seen_gpt_lines = Counter()
+    filtered_lines_gpt = []
+    for line_gpt in text.splitlines():
+        stripped_line_content = line_gpt.strip()
+        # Добавляем строку, если она не пустая и мы ее еще не видели
+        if stripped_line_content and seen_gpt_lines[stripped_line_content] == 0:
+            filtered_lines_gpt.append(line_gpt)
+        # Или если строка пустая (сохраняем для форматирования абзацев)
+        elif not stripped_line_content:
+            filtered_lines_gpt.append(line_gpt)
+        seen_gpt_lines[stripped_line_content] += 1
+    return "\n".join(filtered_lines_gpt)
+
+def join_report_components(list_of_report_components):
+    """Чистка и склейка компонентов отчета через пустую строку (None и пустые пропускаются)."""
+    valid_components = []
+    for component in list_of_report_components:
+        if isinstance(component, str) and component.strip():
+            valid_components.append(component.strip())
+        elif component is not None:
+            log(f"⚠️ Компонент отчета не строка: {type(component)}. Преобразован.")
+            str_component = str(component).strip()
+            if str_component:
+                valid_components.append(str_component)
+    return "\n\n".join(valid_components)
+
+def publish_report_streaming(data_components, gpt_tasks, current_date_str, data_update_signature, report_id,
+                             changes_text=""):
+    """Потоковая публикация (STREAM_MODE): данные – сразу, основной анализ GPT – по абзацам.
+
+    data_components – блоки данных в порядке отчёта; gpt_tasks – короткие
+    GPT-задачи (macro_gpt, quotes_gpt, influencers_gpt), которые идут
+    параллельно с генерацией основного анализа; changes_text – блок
+    крупных изменений для запроса основного анализа; report_id – id запуска,
+    каждое сообщение потока получает свой id «report_id/номер». Возвращает
+    (доставлено ли хотя бы одно сообщение, тексты GPT-блоков для истории
+    отчётов – те же ключи, что в обычном режиме).
+    """
+    message_numbers = count(1)
+    publisher = StreamPublisher(lambda text: send_part(text, f"{report_id}/{next(message_numbers)}"),
+                                TG_LIMIT_BYTES, smart_chunk)
+    # Основной анализ начинает генерироваться сразу, пока публикуются данные и идут короткие запросы
+    main_stream = stream_in_background("main_gpt", lambda: gpt_report_stream(changes_text),
+                                       GPT_DEADLINES["main_gpt"])
+
+    # 1. Блоки данных – не дожидаясь GPT
+    publisher.add_text(prepare_text(join_report_components(data_components)))
+    publisher.flush()
+
+    # 2. Короткие GPT-блоки
+    gpt_blocks = run_gpt_stage(gpt_tasks)
+    quote_blocks = gpt_blocks["quotes_gpt"].value
+    influencer_block = gpt_blocks["influencers_gpt"].value
+    publisher.add_text(prepare_text(join_report_components([
+        quote_blocks.get('crypto'),
+        "______________________________",
+        "🧩 Макро-анализ GPT:",
+        gpt_blocks["macro_gpt"].value,
+        "______________________________",
+        influencer_block if influencer_block else None,
+        "______________________________",
+        quote_blocks.get('stock'),
+        f"🤖 Анализ и выводы от эксперта GPT на {current_date_str}:",
+    ])))
+
+    # 3. Основной анализ – абзац за абзацем, сообщение уходит, как только заполнен лимит байт
+    seen_gpt_lines = Counter()
+    analysis_paragraphs = []
+    try:
+        for paragraph in iter_paragraphs(main_stream):
+            paragraph = dedup_gpt_lines(re.sub(r"[\*_`#]", "", paragraph), seen_gpt_lines)
+            if paragraph.strip():
+                analysis_paragraphs.append(paragraph)
+                publisher.add(paragraph)
+    except Exception as e:
+        log(f"❌ Потоковый основной анализ прерван: {type(e).__name__}: {e}")
+        if not analysis_paragraphs:
+            if isinstance(e, TimeoutError):
+                fallback_text = "🤖 Не удалось получить основной аналитический отчет от GPT."
+            else:  # поток не стартовал – обычный запрос с повторами
+                fallback_text = dedup_gpt_lines(re.sub(r"[\*_`#]", "", gpt_report(changes_text)))
+            analysis_paragraphs.append(fallback_text)
+            publisher.add_text(fallback_text)
+    analysis_text = "\n\n".join(analysis_paragraphs)
+    log(f"📝 Основная аналитическая часть от GPT опубликована потоком (длина {len(analysis_text)}).")
+
+    publisher.add_text(keyword_alert(analysis_text))
+    publisher.add("______________________________")
+    publisher.add(data_update_signature)
+    publisher.flush(suffix="\n\n" + DONATE_BLOCK)
+    log(f"📨 Потоковая отправка завершена: сообщений {publisher.sent}, ошибок {publisher.failed}.")
+    gpt_sections = {
+        "macro_gpt": gpt_blocks["macro_gpt"].value,
+        "influencers_gpt": influencer_block,
+        "gpt_analysis": analysis_text,
+    }
+    return publisher.sent > 0, gpt_sections
 
 # --- Основная логика скрипта ---
-def main():
-    log("🚀 Скрипт запущен.")
+def check_required_keys():
+    """Проверяет обязательные ключи API; завершает процесс, если какого-то нет."""
     required_keys = ["OPENAI_KEY", "TG_TOKEN", "CHANNEL_ID", "MARKETAUX_KEY", "COINMARKETCAP_KEY"]
     keys_ok = True
     for key_name in required_keys:
@@ -398,189 +487,281 @@ def main():
     if not keys_ok:
         sys.exit("Ошибка: Отсутствуют необходимые ключи API.")
 
+def get_user_timezone():
+    """Часовой пояс из TZ (по умолчанию Europe/Kiev), при ошибке – UTC."""
+    tz_name_env = os.getenv("TZ", "Europe/Kiev") 
+    try:
+        return pytz.timezone(tz_name_env)
+    except pytz.exceptions.UnknownTimeZoneError:
+        log(f"⚠️ Неизвестный часовой пояс в TZ='{tz_name_env}'. Используется UTC.")
+        return timezone.utc
+
+def resume_pending_delivery():
+    """Досылка частей, оставшихся в очереди после прошлого (прерванного) запуска."""
+    leftover_parts = tg_pending_count()
+    if leftover_parts:
+        log(f"📬 В очереди Telegram {leftover_parts} неотправленных частей прошлого запуска – досылаем.")
+        resumed = deliver_tg_pending(TG_TOKEN)
+        log(f"📬 Досылка: отправлено {resumed.sent}, отклонено {resumed.failed}, осталось {resumed.pending}.")
+
+def notify_critical_error(e):
+    """Логирует критическую ошибку запуска и сообщает о ней в CHANNEL_ID."""
+    log(f"❌ КРИТИЧЕСКАЯ ОШИБКА В MAIN: {type(e).__name__} - {e}")
+    log(traceback.format_exc())
     try:
-        tz_name_env = os.getenv("TZ", "Europe/Kiev") 
-        try:
-            user_timezone = pytz.timezone(tz_name_env)
-            now_in_zone = datetime.now(user_timezone)
-        except pytz.exceptions.UnknownTimeZoneError:
-            log(f"⚠️ Неизвестный часовой пояс в TZ='{tz_name_env}'. Используется UTC.")
-            user_timezone = timezone.utc
-            now_in_zone = datetime.now(user_timezone)
-            
-        current_run_time_str = now_in_zone.strftime("%H:%M")
-        current_date_str = now_in_zone.strftime('%d.%m.%Y')
-        update_time_str = now_in_zone.strftime("%H:%M (%Z)")
-
-        run_log_msg = f"⏱ Скрипт запущен ({current_run_time_str} {now_in_zone.strftime('%Z')})"
-        report_title_msg = "⚡️ Momentum Pulse:"
-        halving_line = get_btc_halving_countdown_line()
-        
-        # 1. Сбор основных данных
-        log("🔄 Сбор данных по криптовалютам...")
-        crypto_price_block = get_crypto_data(extended=True) 
-        fear_and_greed_block = get_fear_and_greed_index_text()
-        derivatives_block = get_derivatives_block() 
-
-        log("🔄 Сбор макро-данных (CPI/Unemp)…")
-        macro_block = get_macro_block()
-        from report_utils import call_gpt   # та же функция, что для общего вывода
-        
-        macro_analytic_text = call_gpt(
+        if TG_TOKEN and CHANNEL_ID:
+            error_message_for_tg = f"📛 КРИТИЧЕСКАЯ ОШИБКА СКРИПТА MomentumPulse:\n{type(e).__name__}: {e}\n\nПроверьте логи для деталей."
+            http_post(
+                f"https://api.telegram.org/bot{TG_TOKEN}/sendMessage",
+                json={"chat_id": CHANNEL_ID, "text": error_message_for_tg[:4090]}, 
+                timeout=10
+            )
+            log("ℹ️ Уведомление о критической ошибке отправлено в Telegram.")
+        else:
+            log("⚠️ TG_TOKEN или CHANNEL_ID не установлены, не могу отправить уведомление об ошибке в Telegram.")
+    except Exception as tg_err:
+        log(f"⚠️ Не удалось отправить уведомление о критической ошибке в Telegram: {tg_err}")
+
+def run_report(stream_mode=None, timer=None):
+    """Один отчёт: сбор данных, GPT, публикация. Ошибки пробрасываются вызывающему.
+
+    stream_mode – потоковая публикация (по умолчанию STREAM_MODE);
+    timer – StageTimer для замера этапов (создаётся, если не передан). Возвращает timer.
+    """
+    stream_mode = STREAM_MODE if stream_mode is None else stream_mode
+    timer = timer or StageTimer()
+    report_id = uuid.uuid4().hex   # ключи tg_outbox защищают от дублей только внутри запуска
+    reset_http_stats()          # в режиме демона статистика считается по каждому запуску
+    reset_gpt_usage()
+    now_in_zone = datetime.now(get_user_timezone())
+
+    current_run_time_str = now_in_zone.strftime("%H:%M")
+    current_date_str = now_in_zone.strftime('%d.%m.%Y')
+    update_time_str = now_in_zone.strftime("%H:%M (%Z)")
+
+    run_log_msg = f"⏱ Скрипт запущен ({current_run_time_str} {now_in_zone.strftime('%Z')})"
+    report_title_msg = "⚡️ Momentum Pulse:"
+
+    # 1. Параллельный сбор всех независимых блоков (у каждого свой дедлайн)
+    log("🔄 Параллельный сбор данных (крипта, макро, фонда, цитаты, новости)...")
+    with timer.stage("collect") as stage:
+        blocks = collect_blocks([
+            BlockTask("halving", get_btc_halving_countdown_line, BLOCK_DEADLINES["halving"]),
+            BlockTask("crypto", lambda: fetch_crypto(extended=True), BLOCK_DEADLINES["crypto"],
+                      fallback=CryptoSnapshot(error="Данные по криптовалютам временно недоступны.")),
+            BlockTask("fng", fetch_fear_and_greed, BLOCK_DEADLINES["fng"],
+                      fallback=FngReading(error="нет ответа")),
+            BlockTask("derivatives", fetch_derivatives, BLOCK_DEADLINES["derivatives"],
+                      fallback=DerivativesSnapshot(error="нет ответа")),
+            BlockTask("macro", fetch_macro, BLOCK_DEADLINES["macro"], fallback=MacroSnapshot(error="нет ответа")),
+            BlockTask("whales", get_whale_activity_summary, BLOCK_DEADLINES["whales"]),
+            BlockTask("market", fetch_market, BLOCK_DEADLINES["market"], fallback=MarketSnapshot(error="нет ответа")),
+            BlockTask("quotes", collect_raw_quotes, BLOCK_DEADLINES["quotes"],
+                      fallback={"influencers": [], "quotes": []}),
+            BlockTask("news_pool", get_news_pool_for_gpt_analysis, BLOCK_DEADLINES["news_pool"],
+                      fallback="🗣️ Не удалось загрузить пул общих новостей (превышено время ожидания)."),
+        ])
+        stage.add_blocks(blocks)
+    # Ридеры возвращают записи (records.py); текст блоков – из рендереров, числа – из самих записей
+    reader_records = {name: blocks[name].value for name in ("crypto", "fng", "derivatives", "macro", "market")}
+    for name, record in reader_records.items():
+        if record.error:
+            log(f"⚠️ Блок '{name}' без данных: {record.error}")
+    halving_line = blocks["halving"].value
+    crypto_price_block = render_crypto(reader_records["crypto"])
+    fear_and_greed_block = render_fng(reader_records["fng"])
+    derivatives_block = render_derivatives(reader_records["derivatives"])
+    macro_block = render_macro(reader_records["macro"])
+    whale_activity_block = blocks["whales"].value
+    market_data_block = render_market(reader_records["market"])
+    raw_quotes = blocks["quotes"].value
+    general_news_pool = blocks["news_pool"].value # Пул новостей или сообщение об ошибке
+
+    # Блоки для истории отчётов (report_history): текст + числа из записей ридеров
+    report_day = now_in_zone.date().isoformat()
+    history_sections = {
+        "halving": halving_line, "crypto": crypto_price_block, "fng": fear_and_greed_block,
+        "derivatives": derivatives_block, "macro": macro_block, "whales": whale_activity_block,
+        "market": market_data_block,
+    }
+    current_metrics = {key: value for record in reader_records.values() for key, value in record.metrics().items()}
+
+    # Крупные движения к прошлым дням – в отчёт и в запрос основного анализа
+    from delta_engine import detect_changes, format_changes   # numpy – только при запуске отчёта
+    try:
+        changes = detect_changes(current_metrics, report_day)
+    except Exception as e:
+        log(f"⚠️ Не удалось рассчитать изменения показателей: {type(e).__name__}: {e}")
+        changes = []
+    changes_block = format_changes(changes)
+    changes_text_for_gpt = format_changes(changes, escape=False)
+
+    log("📊 Макро блок: " + ("Получен." if not reader_records["macro"].error else "Пусто или ошибка."))
+    log("🐋 Данные по китам: " + ("Получены." if whale_activity_block and "Ошибка" not in whale_activity_block else "Не удалось получить или ошибка."))
+
+    from report_utils import call_gpt   # та же функция, что для общего вывода
+
+    # 2. Параллельный этап GPT: макро-анализ, цитаты, упоминания влиятельных лиц и основной отчёт
+    side_gpt_tasks = [
+        BlockTask("macro_gpt", lambda: call_gpt(
             system_prompt = GPT_MACRO_ANALYSIS_PROMPT.format(macro_block=macro_block),
             user_content  = "",          # достаточно system-prompt
             max_tokens    = 220
-        )
-
-        log("📊 Макро блок: " + ("Получен." if macro_block else "Пусто или ошибка."))
-
-        
-        log("🔄 Сбор данных по китовым транзакциям...")
-        whale_activity_block = get_whale_activity_summary()
-        log("🐋 Данные по китам: " + ("Получены." if whale_activity_block and "Ошибка" not in whale_activity_block else "Не удалось получить или ошибка."))
-
-        log("🔄 Сбор данных по фондовому рынку...")
-        market_data_block = get_market_data_text()
-        log("🔄 Сбор высказываний инфлюенсеров…")
-        quote_blocks = get_all_influencer_quotes()
-
-        # 2. Получение пула новостей и анализ упоминаний влиятельных лиц
-        log("🔄 Загрузка пула новостей для поиска упоминаний влиятельных лиц...")
-        general_news_pool = get_news_pool_for_gpt_analysis() # Эта функция теперь возвращает пул новостей или сообщение об ошибке
-        
-        influencer_final_analysis_block = "" 
-        # Вызываем анализ GPT, только если general_news_pool не содержит сообщения об ошибке
-        if general_news_pool and \
-           "не удалось загрузить пул" not in general_news_pool.lower() and \
-           "ключ marketaux api не настроен" not in general_news_pool.lower() and \
-           "ошибка при загрузке пула новостей" not in general_news_pool.lower():
-            log("🔄 Анализ упоминаний влиятельных лиц с помощью GPT...")
-            gpt_analysis_of_mentions = analyze_influencer_mentions_with_gpt(general_news_pool, INFLUENCERS_TO_TRACK) # INFLUENCERS_TO_TRACK импортирован из news_reader
-            
-            if gpt_analysis_of_mentions:
-                # Проверяем, не является ли результат просто сообщением об ошибке от GPT или "не найдено"
-                if "не удалось получить анализ" in gpt_analysis_of_mentions.lower() or \
-                   "не найдено" in gpt_analysis_of_mentions.lower() or \
-                   "не обнаружено" in gpt_analysis_of_mentions.lower(): # Добавлено "не обнаружено"
-                    influencer_final_analysis_block = f"🗣️ {gpt_analysis_of_mentions}" 
-                else:
-                    influencer_final_analysis_block = f"💬 Мнения лидеров и их анализ от GPT:\n{gpt_analysis_of_mentions}"
-        else: # Если была ошибка при загрузке пула новостей
-            influencer_final_analysis_block = general_news_pool # Отображаем сообщение об ошибке/отсутствии данных от get_news_pool_for_gpt_analysis
-
-        # 3. Генерация ОСНОВНОЙ АНАЛИТИЧЕСКОЙ части от GPT
-        log("🔄 Вызов GPT для генерации основного аналитического отчета...")
-        main_analytical_text_from_gpt = gpt_report()
-        main_analytical_text_from_gpt = re.sub(r"[\*_`#]", "", main_analytical_text_from_gpt) 
-        log(f"📝 Получена основная аналитическая часть от GPT (длина {len(main_analytical_text_from_gpt)}).")
-
-        # ---> НАЧАЛО БЛОКА ДЕДУПЛИКАЦИИ (ИНТЕГРИРОВАННЫЙ БЛОК) <---
-        if main_analytical_text_from_gpt.strip(): # Проверяем, что текст не пустой
-            log("ℹ️ Выполняется дедупликация строк в аналитическом блоке GPT...")
-            lines_gpt = main_analytical_text_from_gpt.splitlines()
-            filtered_lines_gpt = []
-            seen_gpt_lines = Counter() # Используем другое имя для счетчика
-            for line_gpt in lines_gpt:
-                stripped_line_content = line_gpt.strip()
-                # Добавляем строку, если она не пустая и мы ее еще не видели
-                if stripped_line_content and seen_gpt_lines[stripped_line_content] == 0:
-                    filtered_lines_gpt.append(line_gpt)
-                # Или если строка пустая (сохраняем для форматирования абзацев)
-                elif not stripped_line_content:
-                    filtered_lines_gpt.append(line_gpt)
-                seen_gpt_lines[stripped_line_content] += 1
-            
-            original_len = len(main_analytical_text_from_gpt)
-            main_analytical_text_from_gpt = "\n".join(filtered_lines_gpt)
-            new_len = len(main_analytical_text_from_gpt)
-            if original_len != new_len:
-                log(f"ℹ️ Дедупликация завершена. Длина текста GPT изменена с {original_len} на {new_len} символов.")
-            else:
-                log(f"ℹ️ Дедупликация завершена. Повторяющихся строк в тексте GPT не найдено.")
-        else:
-            log("ℹ️ Аналитический блок GPT пуст, дедупликация не требуется.")
-        # ---> КОНЕЦ БЛОКА ДЕДУПЛИКАЦИИ <---
-
-        # 4. Сборка ВСЕХ компонентов отчета
-        list_of_report_components = [
-            run_log_msg,
-            report_title_msg,
-            halving_line,
-
-            # ── КРИПТО ─────────────────────────────────
-            crypto_price_block,
-            fear_and_greed_block,
-            derivatives_block,
-            whale_activity_block,
-            quote_blocks.get('crypto'),
-            "______________________________",
-
-            # ── МАКРО ─────────────────────────────────
-            macro_block,
-            "______________________________",
-            "🧩 Макро-анализ GPT:",        # moved ⬆︎
-            macro_analytic_text,           # moved ⬆︎
-            "______________________________",           # разделитель после анализа
-
-            # ── ВЛИЯТЕЛИ В НОВОСТЯХ (GPT) ─────────────
-            influencer_final_analysis_block if influencer_final_analysis_block else None,
-            "______________________________",
-
-            # ── ФОНДА ────────────────────────────────
-            market_data_block,
-            quote_blocks.get('stock'),
-            f"🤖 Анализ и выводы от эксперта GPT на {current_date_str}:",
-            main_analytical_text_from_gpt,
-            keyword_alert(main_analytical_text_from_gpt),
-            "______________________________",
-        ]
-
-        
-        # 5. Чистка и финальная сборка
-        valid_components = []
-        for component in list_of_report_components:
-            if isinstance(component, str) and component.strip():
-                valid_components.append(component.strip())
-            elif component is not None:
-                log(f"⚠️ Компонент отчета не строка: {type(component)}. Преобразован.")
-                str_component = str(component).strip()
-                if str_component:
-                    valid_components.append(str_component)
-
-        full_report_body_string = "\n\n".join(valid_components)
+        ), GPT_DEADLINES["macro_gpt"], fallback="⚠️ Макро-анализ GPT временно недоступен."),
+        BlockTask("quotes_gpt", lambda: build_quote_blocks(raw_quotes), GPT_DEADLINES["quotes_gpt"],
+                  fallback={"crypto": "", "stock": ""}),
+        BlockTask("influencers_gpt", lambda: build_influencer_block(general_news_pool),
+                  GPT_DEADLINES["influencers_gpt"],
+                  fallback="🗣️ Не удалось получить анализ упоминаний влиятельных лиц от GPT (превышено время ожидания)."),
+    ]
+
+    if stream_mode:
+        log("📨 Потоковый режим: блоки данных отправляются сразу, анализ GPT – по мере генерации.")
         data_update_signature = f"---\n📅 Данные на ~ {current_date_str}, обновлены около {update_time_str}."
-        final_telegram_message = f"{full_report_body_string}\n\n{data_update_signature}"
-        
-        log(f"📄 Итоговый отчет собран (длина {len(final_telegram_message)}). Начало: {final_telegram_message[:250].replace(chr(10), ' ')}...")
-
-        # 6. Отправка в Telegram
-        if final_telegram_message.strip() and final_telegram_message.strip() != report_title_msg : 
-            log(f"📨 Отправка отчета в Telegram (TG_LIMIT_BYTES={TG_LIMIT_BYTES})...")
-            send(final_telegram_message, add_numeration_if_multiple_parts=True)
+        with timer.stage("gpt_stream_publish"):
+            delivered, gpt_sections = publish_report_streaming(
+                [run_log_msg, report_title_msg, halving_line, changes_block,
+                 crypto_price_block, fear_and_greed_block, derivatives_block, whale_activity_block,
+                 "______________________________",
+                 macro_block,
+                 "______________________________",
+                 market_data_block],
+                side_gpt_tasks, current_date_str, data_update_signature, report_id, changes_text_for_gpt,
+            )
+        if delivered:
+            commit_seen_articles()  # статьи этого пула больше не попадут в анализ следующих запусков
+        # Анализ GPT сохраняется и здесь: следующий запуск сравнивает его с последним запуском любого режима
+        history_run_id = report_history.record_run({**history_sections, **gpt_sections}, day=report_day,
+                                                   mode="stream", ok=delivered, stages=timer.as_dict(),
+                                                   metrics=current_metrics)
+        log(report_history.format_comparison(history_run_id))
+        log(compare_with_previous(history_run_id))
+        log_http_stats()
+        log_gpt_usage()
+        log(f"🏁 Отчёт завершён за {timer.total:.1f}с.")
+        return timer
+
+    with timer.stage("gpt") as stage:
+        gpt_blocks = run_gpt_stage(side_gpt_tasks + [
+            BlockTask("main_gpt", lambda: gpt_report(changes_text_for_gpt), GPT_DEADLINES["main_gpt"],
+                      fallback="🤖 Не удалось получить основной аналитический отчет от GPT."),
+        ])
+        stage.add_blocks(gpt_blocks)
+    macro_analytic_text = gpt_blocks["macro_gpt"].value
+    quote_blocks = gpt_blocks["quotes_gpt"].value
+    influencer_final_analysis_block = gpt_blocks["influencers_gpt"].value
+
+    # 3. Основная аналитическая часть от GPT
+    main_analytical_text_from_gpt = gpt_blocks["main_gpt"].value
+    main_analytical_text_from_gpt = re.sub(r"[\*_`#]", "", main_analytical_text_from_gpt) 
+    log(f"📝 Получена основная аналитическая часть от GPT (длина {len(main_analytical_text_from_gpt)}).")
+
+    # ---> НАЧАЛО БЛОКА ДЕДУПЛИКАЦИИ (ИНТЕГРИРОВАННЫЙ БЛОК) <---
+    if main_analytical_text_from_gpt.strip(): # Проверяем, что текст не пустой
+        log("ℹ️ Выполняется дедупликация строк в аналитическом блоке GPT...")
+        original_len = len(main_analytical_text_from_gpt)
+        main_analytical_text_from_gpt = dedup_gpt_lines(main_analytical_text_from_gpt)
+        new_len = len(main_analytical_text_from_gpt)
+        if original_len != new_len:
+            log(f"ℹ️ Дедупликация завершена. Длина текста GPT изменена с {original_len} на {new_len} символов.")
+        else:
+            log(f"ℹ️ Дедупликация завершена. Повторяющихся строк в тексте GPT не найдено.")
+    else:
+        log("ℹ️ Аналитический блок GPT пуст, дедупликация не требуется.")
+    # ---> КОНЕЦ БЛОКА ДЕДУПЛИКАЦИИ <---
+
+    # История: запуск не затирает прошлые за тот же день, сравнение – по индексу
+    history_run_id = report_history.record_run({
+        **history_sections,
+        "macro_gpt": macro_analytic_text,
+        "influencers_gpt": influencer_final_analysis_block,
+        "gpt_analysis": main_analytical_text_from_gpt,
+    }, day=report_day, mode="report", metrics=current_metrics)
+    log(report_history.format_comparison(history_run_id))
+    log(compare_with_previous(history_run_id))
+
+    # 4. Сборка ВСЕХ компонентов отчета
+    list_of_report_components = [
+        run_log_msg,
+        report_title_msg,
+        halving_line,
+        changes_block,
+
+        # ── КРИПТО ─────────────────────────────────
+        crypto_price_block,
+        fear_and_greed_block,
+        derivatives_block,
+        whale_activity_block,
+        quote_blocks.get('crypto'),
+        "______________________________",
+
+        # ── МАКРО ─────────────────────────────────
+        macro_block,
+        "______________________________",
+        "🧩 Макро-анализ GPT:",        # moved ⬆︎
+        macro_analytic_text,           # moved ⬆︎
+        "______________________________",           # разделитель после анализа
+
+        # ── ВЛИЯТЕЛИ В НОВОСТЯХ (GPT) ─────────────
+        influencer_final_analysis_block if influencer_final_analysis_block else None,
+        "______________________________",
+
+        # ── ФОНДА ────────────────────────────────
+        market_data_block,
+        quote_blocks.get('stock'),
+        f"🤖 Анализ и выводы от эксперта GPT на {current_date_str}:",
+        main_analytical_text_from_gpt,
+        keyword_alert(main_analytical_text_from_gpt),
+        "______________________________",
+    ]
+
+    
+    # 5. Чистка и финальная сборка
+    full_report_body_string = join_report_components(list_of_report_components)
+    data_update_signature = f"---\n📅 Данные на ~ {current_date_str}, обновлены около {update_time_str}."
+    final_telegram_message = f"{full_report_body_string}\n\n{data_update_signature}"
+    
+    log(f"📄 Итоговый отчет собран (длина {len(final_telegram_message)}). Начало: {final_telegram_message[:250].replace(chr(10), ' ')}...")
+
+    # 6. Отправка в Telegram
+    delivered = False
+    if final_telegram_message.strip() and final_telegram_message.strip() != report_title_msg : 
+        log(f"📨 Отправка отчета в Telegram (TG_LIMIT_BYTES={TG_LIMIT_BYTES})...")
+        with timer.stage("publish"):
+            deliveries = send(final_telegram_message, report_id, add_numeration_if_multiple_parts=True)
+        delivered = any(d.ok for d in deliveries.values())
+        if delivered:
+            commit_seen_articles()  # статьи этого пула больше не попадут в анализ следующих запусков
             log("✅ Весь отчёт обработан и отправлен.")
         else:
-            log("ℹ️ Итоговый отчет пуст или содержит только заголовок, отправка не требуется.")
+            log("❗ Отчёт не доставлен ни в один чат – пул новостей сохранён для следующего запуска.")
+    else:
+        log("ℹ️ Итоговый отчет пуст или содержит только заголовок, отправка не требуется.")
 
-        sleep(3) 
+    report_history.finish_run(history_run_id, ok=delivered, stages=timer.as_dict())
+    log_http_stats()
+    log_gpt_usage()
+    log(f"🏁 Отчёт завершён за {timer.total:.1f}с.")
+    return timer
+
+
+def main():
+    log("🚀 Скрипт запущен.")
+    check_required_keys()
+    if "--daemon" in sys.argv[1:] or RUN_MODE == "daemon":
+        from daemon import run_daemon
+        run_daemon(run_report, tz=get_user_timezone(),
+                   before_run=resume_pending_delivery, on_error=notify_critical_error)
         log("🏁 Скрипт завершает работу.")
+        return
 
+    resume_pending_delivery()
+    try:
+        run_report()
+        log("🏁 Скрипт завершает работу.")
     except Exception as e: 
-        log(f"❌ КРИТИЧЕСКАЯ ОШИБКА В MAIN: {type(e).__name__} - {e}")
-        log(traceback.format_exc())
-        try:
-            if TG_TOKEN and CHANNEL_ID:
-                error_message_for_tg = f"📛 КРИТИЧЕСКАЯ ОШИБКА СКРИПТА MomentumPulse:\n{type(e).__name__}: {e}\n\nПроверьте логи для деталей."
-                requests.post(
-                    f"https://api.telegram.org/bot{TG_TOKEN}/sendMessage",
-                    json={"chat_id": CHANNEL_ID, "text": error_message_for_tg[:4090]}, 
-                    timeout=10
-                )
-                log("ℹ️ Уведомление о критической ошибке отправлено в Telegram.")
-            else:
-                log("⚠️ TG_TOKEN или CHANNEL_ID не установлены, не могу отправить уведомление об ошибке в Telegram.")
-        except Exception as tg_err:
-            log(f"⚠️ Не удалось отправить уведомление о критической ошибке в Telegram: {tg_err}")
+        notify_critical_error(e)
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -2,18 +2,15 @@
 import os
 import requests
 from datetime import date
-import yfinance as yf
 from custom_logger import log
-import ta
-from typing import Optional
+from http_client import http_get
+from records import STABLECOINS_TO_SKIP_ANALYSIS, CryptoSnapshot, MarketSnapshot, Quote, TaSignal
+from renderers import render_crypto, render_market
 
 ALPHA_KEY = os.getenv("ALPHA_KEY") # Для get_market_data_text()
 
-# Константы для CoinGecko
+# Константы для CoinGecko (User-Agent задаёт общая сессия http_client)
 COINGECKO_API_BASE_URL = "https://api.coingecko.com/api/v3"
-COINGECKO_HEADERS = {
-    'User-Agent': 'MomentumPulseBot/1.0 (+https://t.me/MomentumPulse)' # Обновлено
-}
 
 # Константы для CoinMarketCap
 COINMARKETCAP_API_KEY = os.getenv("COINMARKETCAP_KEY")
@@ -21,21 +18,79 @@ COINMARKETCAP_API_BASE_URL = "https://pro-api.coinmarketcap.com/v1"
 CMC_HEADERS = {
     'Accepts': 'application/json',
     'X-CMC_PRO_API_KEY': COINMARKETCAP_API_KEY,
-    'User-Agent': 'MomentumPulseBot/1.0 (+https://t.me/MomentumPulse)' # Обновлено
 }
 
-STABLECOINS_TO_SKIP_ANALYSIS = ["USDT", "USDC", "DAI", "TUSD", "BUSD", "USDP"]
+# Фондовые индексы ("чистые" значения через yfinance).
+# Список можно переопределить в .env: INDEX_TICKERS="S&P 500 Index (^GSPC)=^GSPC;DAX Index (^GDAXI)=^GDAXI"
+INDEX_TICKERS = {
+    "S&P 500 Index (^GSPC)": "^GSPC",
+    "NASDAQ Composite Index (^IXIC)": "^IXIC",
+    "DAX Index (^GDAXI)": "^GDAXI",
+    "Nikkei 225 Index (^N225)": "^N225",
+    "FTSE 100 Index (^FTSE)": "^FTSE"
+}
+
+def _index_tickers():
+    """Индексы из INDEX_TICKERS в .env (формат «Название=Тикер;…», можно просто «Тикер») или по умолчанию."""
+    raw = os.getenv("INDEX_TICKERS", "").strip()
+    if not raw:
+        return INDEX_TICKERS
+    tickers = {}
+    for item in raw.split(";"):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, symbol = item.rpartition("=")
+        symbol = symbol.strip()
+        if symbol:
+            tickers[name.strip() or symbol] = symbol
+    if not tickers:
+        log("WARNING: Invalid INDEX_TICKERS in .env, fallback to defaults")
+        return INDEX_TICKERS
+    return tickers
+
+def _ta_thresholds():
+    """Пороги техсигналов из .env (с защитой от некорректных значений)."""
+    try:
+        volume_spike_threshold = float(os.getenv("VOLUME_SPIKE_THRESHOLD", "1.7"))
+    except ValueError:
+        log("WARNING: Invalid VOLUME_SPIKE_THRESHOLD in .env, fallback to 1.7")
+        volume_spike_threshold = 1.7
+    try:
+        sma_deviation_threshold = float(os.getenv("SMA_DEVIATION_THRESHOLD", "3.0"))
+    except ValueError:
+        log("WARNING: Invalid SMA_DEVIATION_THRESHOLD in .env, fallback to 3.0")
+        sma_deviation_threshold = 3.0
+    return volume_spike_threshold, sma_deviation_threshold
+
+def _ta_signals(close, volume, labels, title):
+    """Техсигналы по уже скачанным матрицам Close/Volume – векторный расчёт."""
+    from ta_signals import compute_signals, signal_records   # pandas/numpy – при первом теханализе
+    volume_spike_threshold, sma_deviation_threshold = _ta_thresholds()
+    try:
+        signals = compute_signals(close, volume, sma_deviation_threshold, volume_spike_threshold)
+        return signal_records(signals, labels)
+    except Exception as e:
+        log(f"WARNING: Ошибка векторного теханализа ({title}): {type(e).__name__}: {e}")
+        return []
+
+def _multi_asset_signals(labels, title):
+    """Техсигналы по набору тикеров {yahoo_ticker: подпись} – один пакетный запрос, векторный расчёт."""
+    if not labels:
+        return []
+    from ta_signals import download_history   # yfinance/pandas грузятся только при первом запросе истории
+    try:
+        close, volume = download_history(list(labels))
+    except Exception as e:
+        log(f"WARNING: Ошибка загрузки истории ({title}): {type(e).__name__}: {e}")
+        return []
+    return _ta_signals(close, volume, labels, title)
 
-def format_large_number(num):
-    """Форматирует большое число с пробелами в качестве разделителей тысяч."""
-    if num is None:
-        return "N/A"
+def _to_float(value):
     try:
-        if isinstance(num, (float, int)):
-            return f"${num:,.0f}".replace(",", " ")
-        return f"${int(num):,}".replace(",", " ")
+        return float(value) if value is not None else None
     except (ValueError, TypeError):
-        return "N/A"
+        return None
 
 def _fetch_crypto_data_cmc(limit=10):
     """
@@ -52,7 +107,7 @@ def _fetch_crypto_data_cmc(limit=10):
     try:
         # 1. Глобальные метрики
         global_url = f"{COINMARKETCAP_API_BASE_URL}/global-metrics/quotes/latest"
-        r_global = requests.get(global_url, headers=CMC_HEADERS, timeout=10)
+        r_global = http_get(global_url, headers=CMC_HEADERS, timeout=10)
         r_global.raise_for_status()
         response_json_global = r_global.json()
         global_data_cmc = response_json_global.get("data", {})
@@ -88,7 +143,7 @@ def _fetch_crypto_data_cmc(limit=10):
             'convert': 'USD',
             'sort': 'market_cap'
         }
-        r_coins = requests.get(listings_url, headers=CMC_HEADERS, params=parameters, timeout=15)
+        r_coins = http_get(listings_url, headers=CMC_HEADERS, params=parameters, timeout=15)
         r_coins.raise_for_status()
         raw_coins_data = r_coins.json().get("data", []) # Ожидаем список здесь
 
@@ -143,7 +198,7 @@ def _fetch_crypto_data_coingecko(limit=10):
     try:
         # 1. Глобальные данные
         global_url = f"{COINGECKO_API_BASE_URL}/global"
-        r_global = requests.get(global_url, timeout=10, headers=COINGECKO_HEADERS)
+        r_global = http_get(global_url, timeout=10)
         r_global.raise_for_status()
         global_data_cg_raw = r_global.json().get("data", {})
         total_market_cap_cg = global_data_cg_raw.get("total_market_cap", {}).get("usd") # Может быть 0
@@ -159,7 +214,7 @@ def _fetch_crypto_data_coingecko(limit=10):
             "&sparkline=false"
             "&price_change_percentage=24h"
         )
-        r_coins = requests.get(coins_url, timeout=15, headers=COINGECKO_HEADERS)
+        r_coins = http_get(coins_url, timeout=15)
         r_coins.raise_for_status()
         coins_data_cg = r_coins.json() 
 
@@ -184,319 +239,177 @@ def _fetch_crypto_data_coingecko(limit=10):
         return None, None, None, f"Общая непредвиденная ошибка CoinGecko: {type(e).__name__}"
 
 
-def get_global_crypto_market_data_text_formatted(total_market_cap, market_cap_change_24h, source_name=""):
-    """
-    Форматирует текст об общей капитализации крипторынка.
-    """
-    if total_market_cap is None or market_cap_change_24h is None:
-        source_info_err = f" от {source_name}" if source_name else ""
-        print(f"DEBUG: get_global_crypto_market_data_text_formatted - Incomplete data: total_market_cap={total_market_cap}, market_cap_change_24h={market_cap_change_24h}, source={source_name}") # ЗАМЕНИТЬ НА log()
-        return f"🌍 Не удалось получить полные данные об общей капитализации крипторынка{source_info_err}."
-
-    total_market_cap_formatted = format_large_number(total_market_cap)
-    
-    change_emoji = ""
-    change_formatted_val = "N/A"
-    try:
-        change_val_float = float(market_cap_change_24h)
-        if change_val_float > 0: change_emoji = "🟢 "
-        elif change_val_float < 0: change_emoji = "🔴 "
-        elif change_val_float == 0: change_emoji = "⚪ "
-        change_formatted_val = f"{change_val_float:+.2f}%"
-    except (ValueError, TypeError) as e:
-        print(f"DEBUG: Error formatting market_cap_change_24h ('{market_cap_change_24h}'): {e}") # ЗАМЕНИТЬ НА log()
-            
-    source_info = f" (источник: {source_name})" if source_name else ""
-    return (f"🌍 Общая капитализация крипторынка{source_info}: {total_market_cap_formatted}\n"
-            f"   {change_emoji}Изменение за 24ч (глобально): {change_formatted_val}")
-
-def get_crypto_data(extended: bool = False):
+def _btc_technicals(volume_spike_threshold, sma_deviation_threshold):
+    """Индикаторы BTC из локального хранилища цен; None – истории меньше 200 дней."""
+    from price_store import get_history as get_price_history
+    from indicators import update_and_snapshot as update_indicators
+    btc_hist = get_price_history("BTC-USD", days=210)  # из локального хранилища + докачка
+
+    # Индикаторы считаются инкрементально по сохранённому состоянию (indicators.py)
+    btc_ta = update_indicators("BTC-USD", btc_hist) if len(btc_hist) > 200 else None
+    if btc_ta is None:
+        return None
+
+    price, sma50 = btc_ta["price"], btc_ta["sma50"]
+    diff50_pct = ((price - sma50) / sma50) * 100
+    diff_today = sma50 - btc_ta["sma200"]
+    diff_yesterday = btc_ta["sma50_prev"] - btc_ta["sma200_prev"]
+    rsi = btc_ta["rsi14"]
+    current_volume, avg_volume_30d = btc_ta["volume"], btc_ta["avg_volume_30d"]
+    volume_ratio = current_volume / avg_volume_30d if avg_volume_30d > 0 else None
+    return TaSignal(
+        label="BTC",
+        price=price,
+        sma7=btc_ta["sma7"],
+        sma50_dev_pct=diff50_pct,
+        rsi14=rsi,
+        volume_ratio=volume_ratio,
+        golden_cross=diff_yesterday < 0 and diff_today > 0,
+        death_cross=diff_yesterday > 0 and diff_today < 0,
+        sma50_signal=abs(diff50_pct) > sma_deviation_threshold,
+        rsi_signal=rsi is not None and (rsi > 70 or rsi < 30),
+        volume_signal=(current_volume > 1000 and volume_ratio is not None
+                       and volume_ratio > volume_spike_threshold),
+    )
+
+def fetch_crypto(extended: bool = False) -> CryptoSnapshot:
     """
-    Получает данные по топ-10 криптовалютам и добавляет блок технических сигналов для BTC.
-    Версия с точечными улучшениями на основе вашего кода.
+    Данные по топ-10 криптовалютам (CoinGecko, резерв – CoinMarketCap) и технические сигналы BTC.
+    При extended – ещё техсигналы по остальным монетам топ-10.
     """
     # --- Защита от некорректных значений в .env ---
-    try:
-        VOLUME_SPIKE_THRESHOLD = float(os.getenv("VOLUME_SPIKE_THRESHOLD", "1.7"))
-    except ValueError:
-        log("WARNING: Invalid VOLUME_SPIKE_THRESHOLD in .env, fallback to 1.7")
-        VOLUME_SPIKE_THRESHOLD = 1.7
-    try:
-        SMA_DEVIATION_THRESHOLD = float(os.getenv("SMA_DEVIATION_THRESHOLD", "3.0"))
-    except ValueError:
-        log("WARNING: Invalid SMA_DEVIATION_THRESHOLD in .env, fallback to 3.0")
-        SMA_DEVIATION_THRESHOLD = 3.0
+    VOLUME_SPIKE_THRESHOLD, SMA_DEVIATION_THRESHOLD = _ta_thresholds()
 
     # --- Блок получения данных от API (CoinGecko/CMC) ---
-    final_crypto_block_parts = []
-    coins_data_list = None
-    total_market_cap_val = None
-    market_cap_change_24h_val = None
-    source_name_used = ""
-
     log("INFO: Attempting to fetch crypto data from CoinGecko...")
-    cg_coins, cg_total_cap, cg_cap_change, error_cg = _fetch_crypto_data_coingecko()
+    coins_data_list, total_market_cap_val, market_cap_change_24h_val, error_cg = _fetch_crypto_data_coingecko()
+    source_name_used = "CoinGecko"
 
     if error_cg:
         log(f"WARNING: CoinGecko Error: {error_cg}")
-        if COINMARKETCAP_API_KEY:
-            log("INFO: CoinGecko failed. Attempting CoinMarketCap...")
-            cmc_coins, cmc_total_cap, cmc_cap_change, error_cmc = _fetch_crypto_data_cmc()
-            if error_cmc:
-                log(f"ERROR: CoinMarketCap Error: {error_cmc}")
-                final_crypto_block_parts.append(
-                    "❌ Не удалось получить данные по криптовалютам (оба источника недоступны)."
-                )
-            else:
-                coins_data_list = cmc_coins
-                total_market_cap_val = cmc_total_cap
-                market_cap_change_24h_val = cmc_cap_change
-                source_name_used = "CoinMarketCap"
-                log("INFO: Successfully fetched crypto data from CoinMarketCap.")
-        else:
+        if not COINMARKETCAP_API_KEY:
             log("WARNING: CoinGecko failed. CMC key not configured.")
-            final_crypto_block_parts.append("❌ Ошибка CoinGecko. Резервный источник (CoinMarketCap) не настроен.")
-    else:
-        coins_data_list = cg_coins
-        total_market_cap_val = cg_total_cap
-        market_cap_change_24h_val = cg_cap_change
-        source_name_used = "CoinGecko"
-        log("INFO: Successfully fetched crypto data from CoinGecko.")
-
-    if total_market_cap_val is not None and market_cap_change_24h_val is not None:
-        global_market_text = get_global_crypto_market_data_text_formatted(
-            total_market_cap_val, market_cap_change_24h_val, source_name_used
+            return CryptoSnapshot(error="Ошибка CoinGecko. Резервный источник (CoinMarketCap) не настроен.")
+        log("INFO: CoinGecko failed. Attempting CoinMarketCap...")
+        coins_data_list, total_market_cap_val, market_cap_change_24h_val, error_cmc = _fetch_crypto_data_cmc()
+        if error_cmc:
+            log(f"ERROR: CoinMarketCap Error: {error_cmc}")
+            return CryptoSnapshot(error="Не удалось получить данные по криптовалютам (оба источника недоступны).")
+        source_name_used = "CoinMarketCap"
+    log(f"INFO: Successfully fetched crypto data from {source_name_used}.")
+
+    record = CryptoSnapshot(
+        total_market_cap=_to_float(total_market_cap_val),
+        market_cap_change_24h=_to_float(market_cap_change_24h_val),
+        extended=extended,
+        source=source_name_used,
+    )
+    if coins_data_list is None:
+        return record
+
+    record.coins = [
+        Quote(
+            symbol=str(coin_item.get("symbol", "N/A")).upper(),
+            name=coin_item.get("name", "Unknown Coin"),
+            price=_to_float(coin_item.get("current_price")),
+            change_pct=_to_float(coin_item.get("price_change_percentage_24h")),
+            market_cap=_to_float(coin_item.get("market_cap")),
         )
-        final_crypto_block_parts.append(global_market_text)
-    elif not final_crypto_block_parts:
-        err_src_name = source_name_used or "источников"
-        final_crypto_block_parts.append(f"🌍 Данные об общей капитализации от {err_src_name} временно недоступны.")
-
-    if coins_data_list is not None:
-        today_date_str = date.today().strftime("%d.%m.%Y")
-        source_info_coins = f" (источник: {source_name_used})" if source_name_used else ""
-        top_coins_lines = [f"\n₿ Крипта на {today_date_str}{source_info_coins} (Топ-10 по капитализации)"]
-        insights_set: set[str] = set()
-
-        if not coins_data_list:
-            top_coins_lines.append(f"  ℹ️ Список топ-10 криптовалют пуст (или не получен) от {source_name_used}.")
-        else:
-            for coin_item in coins_data_list:
-                symbol = coin_item.get("symbol", "N/A").upper()
-                name = coin_item.get("name", "Unknown Coin")
-                price_val = coin_item.get("current_price")
-                change_24h_coin = coin_item.get("price_change_percentage_24h")
-                market_cap_coin = coin_item.get("market_cap")
-
-                if price_val is None or change_24h_coin is None:
-                    top_coins_lines.append(f"  {symbol}: ❌ неполные данные ({name}) от {source_name_used}")
-                    continue
-
-                price_formatted = "$0.0000"
-                try:
-                    price_f = float(price_val)
-                    price_formatted = f"${price_f:,.4f}" if price_f < 1 else f"${price_f:,.2f}"
-                except (ValueError, TypeError):
-                    pass
-
-                market_cap_formatted = (
-                    f"(кап: {format_large_number(market_cap_coin)})" if market_cap_coin is not None else ""
-                )
-
-                coin_change_emoji = ""
-                change_24h_coin_float = 0.0
-                change_24h_coin_formatted = "N/A"
-                try:
-                    change_24h_coin_float = float(change_24h_coin)
-                    if change_24h_coin_float > 0:
-                        coin_change_emoji = "🟢"
-                    elif change_24h_coin_float < 0:
-                        coin_change_emoji = "🔴"
-                    else:
-                        coin_change_emoji = "⚪"
-                    change_24h_coin_formatted = f"{change_24h_coin_float:+.2f}%"
-                except (ValueError, TypeError):
-                    pass
-
-                top_coins_lines.append(
-                    f"  {coin_change_emoji}<b>{symbol}</b>: {price_formatted} "
-                    f"({change_24h_coin_formatted}) {market_cap_formatted}"
-                )
-
-                if (
-                    extended
-                    and symbol not in STABLECOINS_TO_SKIP_ANALYSIS
-                    and abs(change_24h_coin_float) >= 1
-                ):
-                    direction = "растёт" if change_24h_coin_float > 0 else "падает"
-                    insights_set.add(f"— {symbol} ({name}) {direction} на {change_24h_coin_float:+.2f}%.")
-
-        insights = sorted(insights_set)
-
-        if extended and insights:
-            top_coins_lines.append("\n→ Краткий анализ по топ криптовалютам (исключая стейблкоины):")
-            top_coins_lines.extend(insights)
-
-        # --- БЛОК ТЕХНИЧЕСКОГО АНАЛИЗА BTC ---
-        try:
-            btc_hist = yf.Ticker("BTC-USD").history(period="210d")
-
-            if not btc_hist.empty and len(btc_hist) > 200:
-                close_prices = btc_hist["Close"]
-                current_price_btc = close_prices.iloc[-1]
-                tech_signals = []
-                sma50: Optional[float] = None
-
-                # SMA 7
-                sma7 = close_prices.iloc[-8:-1].mean()
-                btc_price_fmt = format_large_number(current_price_btc).replace("$", "")
-                sma7_fmt = format_large_number(sma7).replace("$", "")
-                btc_sma_info_line = f"\n💡 BTC ({btc_price_fmt}) "
-                if current_price_btc > sma7:
-                    btc_sma_info_line += f"выше 7-дневной средней ({sma7_fmt})."
-                else:
-                    btc_sma_info_line += f"ниже 7-дневной средней ({sma7_fmt})."
-                top_coins_lines.append(btc_sma_info_line)
-
-                # SMA 50
-                sma50 = close_prices.iloc[-50:].mean()
-                diff50_pct = ((current_price_btc - sma50) / sma50) * 100
-                if abs(diff50_pct) > SMA_DEVIATION_THRESHOLD:
-                    direction = "выше" if diff50_pct > 0 else "ниже"
-                    tech_signals.append(f"— Цена BTC {direction} 50-дневной средней на {diff50_pct:+.1f}%.")
-
-                # Golden/Death Cross
-                sma200_today = close_prices.iloc[-200:].mean()
-                sma50_yesterday = close_prices.iloc[-51:-1].mean()
-                sma200_yesterday = close_prices.iloc[-201:-1].mean()
-
-                diff_today = sma50 - sma200_today
-                diff_yesterday = sma50_yesterday - sma200_yesterday
-                
-                if diff_yesterday < 0 and diff_today > 0:
-                    tech_signals.append("— 📈 <b>Золотой крест:</b> SMA50 пересекла SMA200 снизу вверх (бычий сигнал).")
-                elif diff_yesterday > 0 and diff_today < 0:
-                    tech_signals.append("— 📉 <b>Мёртвый крест:</b> SMA50 пересекла SMA200 сверху вниз (медвежий сигнал).")
-
-                # RSI 14
-                rsi = ta.momentum.RSIIndicator(close_prices, window=14).rsi().iloc[-1]
-                if rsi > 70:
-                    tech_signals.append(f"— 🚦 RSI ({rsi:.0f}) в зоне <b>перекупленности</b> (>70).")
-                elif rsi < 30:
-                    tech_signals.append(f"— 🚦 RSI ({rsi:.0f}) в зоне <b>перепроданности</b> (<30).")
-
-                # Анализ объемов
-                current_volume = btc_hist['Volume'].iloc[-1]
-                avg_volume_30d = btc_hist['Volume'].iloc[-31:-1].mean()
-                if current_volume > 1000 and avg_volume_30d > 0 and current_volume > avg_volume_30d * VOLUME_SPIKE_THRESHOLD:
-                    tech_signals.append(f"— 📈 Объём торгов значительно <b>выше среднего</b> (x{current_volume/avg_volume_30d:.1f}).")
-
-                # Если найден хотя бы один сигнал, выводим весь блок
-                if tech_signals:
-                    top_coins_lines.append("\n→ <b>Техсигналы по BTC</b>:")
-                    top_coins_lines.extend(tech_signals)
-
-            else:
-                 top_coins_lines.append("\n💡 Недостаточно исторических данных BTC для полного теханализа.")
-        except Exception as e_sma:
-            log(f"WARNING: Ошибка при расчёте теханализа для BTC: {e_sma}")
-            top_coins_lines.append("💡 Не удалось рассчитать технические индикаторы для BTC.")
-        
-        final_crypto_block_parts.extend(top_coins_lines)
+        for coin_item in coins_data_list
+    ]
 
-    elif not final_crypto_block_parts:
-        err_src_name = source_name_used or "источников"
-        final_crypto_block_parts.append(f"ℹ️ Данные по топ-криптовалютам от {err_src_name} не получены.")
+    # --- ТЕХНИЧЕСКИЙ АНАЛИЗ BTC ---
+    try:
+        record.btc_ta = _btc_technicals(VOLUME_SPIKE_THRESHOLD, SMA_DEVIATION_THRESHOLD)
+    except Exception as e_sma:
+        log(f"WARNING: Ошибка при расчёте теханализа для BTC: {e_sma}")
+        record.btc_ta_error = f"{type(e_sma).__name__}: {e_sma}"
+
+    # --- ТЕХСИГНАЛЫ ПО ОСТАЛЬНЫМ МОНЕТАМ ТОП-10 (одним запросом, векторно) ---
+    if extended and record.coins:
+        coin_labels = {
+            f"{coin.symbol}-USD": coin.symbol
+            for coin in record.coins
+            if coin.symbol and coin.symbol != "BTC" and coin.symbol not in STABLECOINS_TO_SKIP_ANALYSIS
+        }
+        record.coin_signals = _multi_asset_signals(coin_labels, "Техсигналы по топ-10")
+    return record
 
-    if not final_crypto_block_parts:
-        final_crypto_block_parts.append("❌ Данные по криптовалютам временно недоступны (общая ошибка).")
 
-    return "\n".join(part for part in final_crypto_block_parts if part and part.strip())
+def get_crypto_data(extended: bool = False):
+    """Текст блока крипты (fetch_crypto + renderers.render_crypto)."""
+    return render_crypto(fetch_crypto(extended))
 
 
-def get_market_data_text():
+ETF_TICKERS = {
+    "S&P 500 ETF (SPY)": "SPY",
+    "NASDAQ 100 ETF (QQQ)": "QQQ",
+}
+
+def _fetch_etf_quote(name, symbol):
+    try:
+        url = f"https://www.alphavantage.co/query?function=GLOBAL_QUOTE&symbol={symbol}&apikey={ALPHA_KEY}"
+        r = http_get(url, timeout=10)
+        r.raise_for_status()
+        quote = r.json().get("Global Quote")
+        if not quote or not all(k in quote for k in ["05. price", "10. change percent"]) or not quote["05. price"]:
+            return Quote(symbol, name, error="неполные/пустые данные (AlphaVantage)")
+        return Quote(symbol, name, price=float(quote["05. price"]),
+                     change_pct=float(quote["10. change percent"].rstrip('%')))
+    except requests.exceptions.RequestException as e: # Более специфичный обработчик для сетевых ошибок
+        return Quote(symbol, name, error=f"ошибка сети ({type(e).__name__})")
+    except ValueError as e: # Ошибка конвертации float/int
+        return Quote(symbol, name, error=f"ошибка данных ({type(e).__name__})")
+    except Exception as e: # Общий обработчик
+        return Quote(symbol, name, error=f"ошибка ({type(e).__name__})")
+
+def fetch_market() -> MarketSnapshot:
     """
-    Получает данные по фондовым индексам (ETF через Alpha Vantage, "чистые" индексы через yfinance).
+    Фондовые индексы и ETF: ETF через Alpha Vantage, "чистые" индексы через yfinance.
     """
-    result_parts = ["📊 Индексы и ETF"]
-    etf_info_list = []
-
+    record = MarketSnapshot()
     if ALPHA_KEY:
-        etf_tickers = {
-            "S&P 500 ETF (SPY)": "SPY",
-            "NASDAQ 100 ETF (QQQ)": "QQQ",
-        }
-        for name, symbol in etf_tickers.items():
-            try:
-                url = f"https://www.alphavantage.co/query?function=GLOBAL_QUOTE&symbol={symbol}&apikey={ALPHA_KEY}"
-                r = requests.get(url, timeout=10)
-                r.raise_for_status()
-                data = r.json()
-                quote = data.get("Global Quote")
-                if not quote or not all(k in quote for k in ["05. price", "10. change percent"]) or not quote["05. price"]: # Добавил проверку на пустое значение цены
-                    etf_info_list.append(f"  {name}: ❌ неполные/пустые данные (AlphaVantage)")
-                    continue
-                price = float(quote["05. price"])
-                change_percent_str = quote["10. change percent"].rstrip('%')
-                change_percent = float(change_percent_str)
-                emoji = "🟢" if change_percent > 0 else "🔴" if change_percent < 0 else "⚪"
-                etf_info_list.append(f"  {emoji}{name}: ${price:,.2f} ({change_percent:+.2f}%)")
-            except requests.exceptions.RequestException as e: # Более специфичный обработчик для сетевых ошибок
-                 etf_info_list.append(f"  {name}: ❌ ошибка сети ({type(e).__name__})")
-            except ValueError as e: # Ошибка конвертации float/int
-                 etf_info_list.append(f"  {name}: ❌ ошибка данных ({type(e).__name__})")
-            except Exception as e: # Общий обработчик
-                etf_info_list.append(f"  {name}: ❌ ошибка ({type(e).__name__})")
-        
-        if etf_info_list: result_parts.extend(etf_info_list)
-        else: result_parts.append("  ⚠️ Не удалось загрузить данные по ETF (AlphaVantage). Проверьте ключ или доступность сервиса.") # Изменено сообщение
-        result_parts.append("    └─ *ETF (Exchange Traded Fund) — это фонд, акции которого торгуются на бирже...")
-    else:
-        result_parts.append("  ℹ️ Alpha Vantage API ключ не настроен, данные по ETF не загружены.")
-
-    index_tickers = {
-        "S&P 500 Index (^GSPC)": "^GSPC",
-        "NASDAQ Composite Index (^IXIC)": "^IXIC",
-        "DAX Index (^GDAXI)": "^GDAXI",
-        "Nikkei 225 Index (^N225)": "^N225",
-        "FTSE 100 Index (^FTSE)": "^FTSE"
-    }
-    index_info_list = []
+        record.etfs = [_fetch_etf_quote(name, symbol) for name, symbol in ETF_TICKERS.items()]
+
+    # Один пакетный запрос на все индексы: котировки (последние два закрытия) и история для теханализа
+    index_tickers = _index_tickers()
+    index_close, index_volume, download_error = None, None, None
+    try:
+        from ta_signals import download_history
+        index_close, index_volume = download_history(list(index_tickers.values()))
+    except Exception as e:
+        download_error = e
+        log(f"WARNING: Пакетная загрузка индексов не удалась: {type(e).__name__}: {e}")
+
     for name, symbol in index_tickers.items():
-        try:
-            ticker = yf.Ticker(symbol)
-            # Для большей надежности используем ticker.info, если доступно, или history как fallback
-            info = ticker.info
-            current_price = info.get('regularMarketPrice', info.get('currentPrice'))
-            prev_close = info.get('previousClose')
-
-            if current_price is None or prev_close is None: # Если info не дало данных, пробуем history
-                hist = ticker.history(period="5d")
-                if not hist.empty and len(hist['Close'].dropna()) >= 2:
-                    valid_closes = hist['Close'].dropna()
-                    current_price = valid_closes.iloc[-1]
-                    prev_close = valid_closes.iloc[-2]
-                else:
-                    index_info_list.append(f"  {name}: ❌ нет данных (yfinance)")
-                    continue
-            
-            if current_price is None or prev_close is None or prev_close == 0: # Доп. проверка
-                index_info_list.append(f"  {name}: ❌ некорректные данные (yfinance)")
-                continue
-
-            change = current_price - prev_close
-            change_percent = (change / prev_close) * 100
-            emoji = "🟢" if change_percent > 0 else "🔴" if change_percent < 0 else "⚪"
-            index_info_list.append(f"  {emoji}{name}: {current_price:,.2f} pts ({change_percent:+.2f}%)")
-        except Exception as e:
-            index_info_list.append(f"  {name}: ❌ ошибка ({type(e).__name__})")
-
-    if index_info_list:
-        if etf_info_list or not ALPHA_KEY: result_parts.append("")
-        result_parts.extend(index_info_list)
-        result_parts.append("    └─ *Значения индексов выражаются в пунктах и являются «чистыми» статистическими величинами...")
-    
-    if len(result_parts) == 1:
-         result_parts.append("  ⚠️ Не удалось загрузить данные по индексам и ETF.") # Изменено сообщение
-
-    return "\n".join(result_parts)
\ No newline at end of file
+        if download_error is not None:
+            record.indices.append(Quote(symbol, name, error=f"ошибка ({type(download_error).__name__})"))
+            continue
+        valid_closes = index_close[symbol].dropna() if symbol in index_close else []
+        if len(valid_closes) < 2:
+            record.indices.append(Quote(symbol, name, error="нет данных (yfinance)"))
+            continue
+        current_price = float(valid_closes.iloc[-1])
+        prev_close = float(valid_closes.iloc[-2])
+        if prev_close == 0: # Доп. проверка
+            record.indices.append(Quote(symbol, name, error="некорректные данные (yfinance)"))
+            continue
+        record.indices.append(Quote(symbol, name, price=current_price,
+                                    change_pct=(current_price - prev_close) / prev_close * 100))
+
+    failed_symbols = [quote.symbol for quote in record.indices if quote.error]
+    if failed_symbols:
+        log(f"WARNING: Нет котировок по индексам: {', '.join(failed_symbols)}")
+    if download_error is None and record.indices:
+        record.index_signals = _ta_signals(
+            index_close, index_volume, {symbol: name for name, symbol in index_tickers.items()},
+            "Техсигналы по индексам",
+        )
+    if not any(quote.ok for quote in (record.etfs or []) + record.indices):
+        record.error = "нет котировок ни по ETF, ни по индексам"
+    return record
+
+
+def get_market_data_text():
+    """Текст блока «📊 Индексы и ETF» (fetch_market + renderers.render_market)."""
+    return render_market(fetch_market())
@@ -1,21 +1,30 @@
 # metrics_reader.py
 
-import requests
+from http_client import http_get
+from records import DerivativesSnapshot, LongShortRatio
+from renderers import render_derivatives, render_long_short
 
-def get_long_short_ratio(symbol="BTCUSDT"):
+DERIVATIVES_SYMBOLS = ("BTCUSDT", "ETHUSDT")
+
+def fetch_long_short_ratio(symbol="BTCUSDT"):
     try:
         url = "https://fapi.binance.com/futures/data/globalLongShortAccountRatio"
         params = {"symbol": symbol, "period": "1h", "limit": 1}
-        r = requests.get(url, params=params, timeout=10)
+        r = http_get(url, params=params, timeout=10)
         data = r.json()[0]
-        long_pct = float(data["longAccount"]) * 100
-        short_pct = float(data["shortAccount"]) * 100
-        return f"⚖️ {symbol}: Лонги {long_pct:.1f}% / Шорты {short_pct:.1f}%"
+        return LongShortRatio(symbol, long_pct=float(data["longAccount"]) * 100,
+                              short_pct=float(data["shortAccount"]) * 100)
     except Exception as e:
-        return f"⚖️ Ошибка {symbol}: {e}"
+        return LongShortRatio(symbol, error=str(e))
+
+def fetch_derivatives():
+    ratios = [fetch_long_short_ratio(symbol) for symbol in DERIVATIVES_SYMBOLS]
+    failed = [ratio for ratio in ratios if ratio.error]
+    error = "; ".join(f"{r.symbol}: {r.error}" for r in failed) if len(failed) == len(ratios) else None
+    return DerivativesSnapshot(ratios=ratios, error=error)
+
+def get_long_short_ratio(symbol="BTCUSDT"):
+    return render_long_short(fetch_long_short_ratio(symbol))
 
 def get_derivatives_block():
-    return "\n".join([
-        get_long_short_ratio("BTCUSDT"),
-        get_long_short_ratio("ETHUSDT")
-    ])
+    return render_derivatives(fetch_derivatives())
@@ -1,65 +1,210 @@
 import os
+import re
+import json
+import time
+import threading
 import requests
+from dataclasses import dataclass, field
+from typing import Optional
+from http_client import http_get
 from datetime import datetime, timedelta
 
 # Список влиятельных лиц. Он будет использоваться в main.py для передачи в GPT.
+# aliases – варианты написания для локального поиска упоминаний (регистр важен;
+# для кириллицы допускаются падежные окончания: «Маск» найдёт «Маска», «Маском»).
 INFLUENCERS_TO_TRACK = [
-    {"id": "elon_musk", "name": "Elon Musk"},
-    {"id": "sam_altman", "name": "Sam Altman"},
-    {"id": "bill_gates", "name": "Bill Gates"},
-    {"id": "jeff_bezos", "name": "Jeff Bezos"},
-    {"id": "warren_buffett", "name": "Warren Buffett"},
-    {"id": "donald_trump", "name": "Donald Trump"},
-    {"id": "a_pompliano", "name": "Anthony Pompliano"},
-    {"id": "balaji_s", "name": "Balaji Srinivasan"},
-    {"id": "vitalik_buterin", "name": "Vitalik Buterin"},
-    {"id": "larry_fink", "name": "Larry Fink"},
-    {"id": "cz_binance", "name": "Changpeng Zhao"},
-    {"id": "brian_armstrong", "name": "Brian Armstrong"},
-    {"id": "cathie_wood", "name": "Cathie Wood"},
-    {"id": "michael_saylor", "name": "Michael Saylor"},
-    {"id": "jensen_huang", "name": "Jensen Huang"},
-    {"id": "jerome_powell", "name": "Jerome Powell"},
+    {"id": "elon_musk", "name": "Elon Musk", "aliases": ["Elon Musk", "Musk", "Илон Маск", "Маск"]},
+    {"id": "sam_altman", "name": "Sam Altman", "aliases": ["Sam Altman", "Altman", "Сэм Альтман", "Альтман"]},
+    {"id": "bill_gates", "name": "Bill Gates", "aliases": ["Bill Gates", "Билл Гейтс"]},
+    {"id": "jeff_bezos", "name": "Jeff Bezos", "aliases": ["Jeff Bezos", "Bezos", "Безос"]},
+    {"id": "warren_buffett", "name": "Warren Buffett", "aliases": ["Warren Buffett", "Buffett", "Баффет"]},
+    {"id": "donald_trump", "name": "Donald Trump", "aliases": ["Donald Trump", "Trump", "Трамп"]},
+    {"id": "a_pompliano", "name": "Anthony Pompliano", "aliases": ["Anthony Pompliano", "Pompliano", "Помплиано"]},
+    {"id": "balaji_s", "name": "Balaji Srinivasan", "aliases": ["Balaji Srinivasan", "Balaji"]},
+    {"id": "vitalik_buterin", "name": "Vitalik Buterin", "aliases": ["Vitalik Buterin", "Buterin", "Бутерин"]},
+    {"id": "larry_fink", "name": "Larry Fink", "aliases": ["Larry Fink", "Ларри Финк"]},
+    {"id": "cz_binance", "name": "Changpeng Zhao", "aliases": ["Changpeng Zhao", "CZ", "Чанпэн Чжао"]},
+    {"id": "brian_armstrong", "name": "Brian Armstrong", "aliases": ["Brian Armstrong", "Брайан Армстронг"]},
+    {"id": "cathie_wood", "name": "Cathie Wood", "aliases": ["Cathie Wood", "Кэти Вуд"]},
+    {"id": "michael_saylor", "name": "Michael Saylor", "aliases": ["Michael Saylor", "Saylor", "Сэйлор"]},
+    {"id": "jensen_huang", "name": "Jensen Huang", "aliases": ["Jensen Huang", "Дженсен Хуанг"]},
+    {"id": "jerome_powell", "name": "Jerome Powell", "aliases": ["Jerome Powell", "Powell", "Пауэлл"]},
     # Добавьте или измените по необходимости
 ]
 
-def get_market_news():
-    """
-    Получает основную порцию рыночных новостей (например, топ-5).
-    """
+# --- Единый пул новостей на запуск ---
+# Один запрос к MarketAux /v1/news/all обслуживает и блок заголовков (get_news_block),
+# и пул для поиска упоминаний влиятельных лиц. Статьи, уже обработанные в прошлых
+# запусках (по UUID/URL), в пул для анализа не попадают.
+MARKETAUX_URL = "https://api.marketaux.com/v1/news/all"
+POOL_LIMIT = 50
+POOL_DAYS = 2
+HEADLINES_COUNT = 3
+NO_MENTIONS_MESSAGE = ("В сегодняшней подборке общих новостей значимых публичных заявлений или новостей, "
+                       "связанных с отслеживаемыми влиятельными лицами и способных повлиять на рынки, не обнаружено.")
+MAX_CONTENT_LEN = 500  # Символов на новость (сниппет или описание)
+SEEN_PATH = os.getenv("NEWS_SEEN_PATH", os.path.join("cache", "news_seen.json"))
+SEEN_KEEP_DAYS = 7
+try:
+    POOL_TTL_SEC = float(os.getenv("NEWS_POOL_TTL_SEC", "600"))  # повторное использование пула в пределах запуска
+except ValueError:
+    POOL_TTL_SEC = 600.0
+
+
+@dataclass(slots=True)
+class NewsArticle:
+    uuid: str
+    url: str
+    title: str
+    source: str
+    snippet: str
+    description: str
+    published_at: str
+    entities: int = 0      # число сущностей (тикеров/компаний), найденных MarketAux
+    is_new: bool = True    # не встречалась в прошлых запусках
+
+    @property
+    def key(self) -> str:
+        return self.uuid or self.url
+
+    @classmethod
+    def from_marketaux(cls, raw: dict) -> "NewsArticle":
+        return cls(
+            uuid=raw.get("uuid") or "",
+            url=raw.get("url") or "",
+            title=(raw.get("title") or "Без заголовка").strip(),
+            source=raw.get("source") or "Неизвестный источник",
+            snippet=(raw.get("snippet") or "").strip(),
+            description=(raw.get("description") or "").strip(),
+            published_at=raw.get("published_at") or "",
+            entities=len(raw.get("entities") or []),
+        )
+
+
+@dataclass
+class NewsPool:
+    articles: list = field(default_factory=list)   # list[NewsArticle], по убыванию даты
+    error: Optional[str] = None                    # готовое сообщение для отчёта, если загрузка не удалась
+    fetched_at: float = 0.0
+
+    @property
+    def new_articles(self) -> list:
+        return [a for a in self.articles if a.is_new]
+
+
+_pool_lock = threading.Lock()
+_pool: Optional[NewsPool] = None
+
+
+def _load_seen() -> dict:
     try:
-        api_key = os.getenv("MARKETAUX_KEY")
-        if not api_key:
-            return "MarketAux API ключ не настроен для get_market_news", False
-
-        url = "https://api.marketaux.com/v1/news/all"
-        params = {
-            "api_token": api_key,
-            "language": "ru,en",
-            "countries": "us,gb,de,cn,jp,global",
-            "filter_entities": "true",
-            "limit": 5, 
-            "sort": "published_on",
-            "group_similar": "true"
-        }
-        response = requests.get(url, params=params, timeout=15)
+        with open(SEEN_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _fetch_pool(api_key: str) -> NewsPool:
+    published_after_date = (datetime.now() - timedelta(days=POOL_DAYS)).strftime('%Y-%m-%d')
+    params = {
+        "api_token": api_key,
+        "language": "ru,en",
+        "countries": "us,gb,de,cn,jp,global",
+        "limit": POOL_LIMIT,
+        "sort": "published_on",
+        "published_after": published_after_date,
+        "group_similar": "true",
+        "filter_entities": "false",  # "сырые" данные; сущности учитываем сами при выборе заголовков
+    }
+    print(f"ℹ️ [news_reader] Загрузка пула новостей (limit {POOL_LIMIT}, published_after: {published_after_date})...")
+    try:
+        response = http_get(MARKETAUX_URL, params=params, timeout=30)
         response.raise_for_status()
-        data = response.json()
-        articles = data.get("data", [])
-
-        if not articles:
-            return "Реальных рыночных новостей по заданным фильтрам не найдено.", False
-
-        result = []
-        for article in articles[:3]: 
-            title = article.get("title", "Без заголовка")
-            source = article.get("source", "Неизвестный источник")
-            result.append(f"• {title} ({source})")
-        return "\n".join(result), True
+        raw_articles = response.json().get("data", [])
     except requests.exceptions.HTTPError as http_err:
-        return f"❗ HTTP ошибка при загрузке рыночных новостей: {http_err}", False
+        error_details = ""
+        if http_err.response is not None:
+            error_details = f" - Status: {http_err.response.status_code}, Response: {http_err.response.text[:200]}"
+        print(f"❗ [news_reader] HTTP ошибка MarketAux при загрузке пула новостей: {http_err}{error_details}")
+        return NewsPool(error=f"🗣️ Ошибка при загрузке пула новостей (HTTP): {http_err.response.status_code if http_err.response is not None else 'Unknown'}")
+    except requests.exceptions.RequestException as req_err:
+        print(f"❗ [news_reader] Ошибка сети при загрузке пула новостей: {req_err}")
+        return NewsPool(error="🗣️ Ошибка сети при загрузке пула новостей.")
     except Exception as e:
-        return f"❗ Ошибка при загрузке рыночных новостей: {e}", False
+        print(f"❗ [news_reader] Непредвиденная ошибка при загрузке пула новостей: {e}")
+        return NewsPool(error="🗣️ Непредвиденная ошибка при загрузке пула новостей.")
+
+    seen = _load_seen()
+    articles, keys = [], set()
+    for raw in raw_articles:
+        article = NewsArticle.from_marketaux(raw)
+        if article.key in keys:
+            continue
+        keys.add(article.key)
+        article.is_new = article.key not in seen
+        articles.append(article)
+
+    pool = NewsPool(articles=articles)
+    print(f"ℹ️ [news_reader] Загружено {len(articles)} статей, из них новых: {len(pool.new_articles)}.")
+    return pool
+
+
+def load_news_pool(force: bool = False) -> NewsPool:
+    """Пул новостей текущего запуска: загружается один раз и переиспользуется в течение POOL_TTL_SEC."""
+    global _pool
+    with _pool_lock:
+        if not force and _pool is not None and time.monotonic() - _pool.fetched_at < POOL_TTL_SEC:
+            return _pool
+        api_key = os.getenv("MARKETAUX_KEY")
+        if not api_key:
+            print("❗ [news_reader] MARKETAUX_KEY не установлен. Невозможно получить пул новостей.")
+            pool = NewsPool(error="🗣️ Ключ MarketAux API не настроен для загрузки пула новостей.")
+        else:
+            pool = _fetch_pool(api_key)
+        pool.fetched_at = time.monotonic()
+        _pool = pool
+        return pool
+
+
+def commit_seen_articles() -> None:
+    """Помечает статьи текущего пула как обработанные (вызывать после успешной отправки отчёта)."""
+    with _pool_lock:
+        if _pool is None or not _pool.articles:
+            return
+        seen = _load_seen()
+        now = datetime.now()
+        now_iso = now.isoformat(timespec="seconds")
+        for article in _pool.articles:
+            seen.setdefault(article.key, now_iso)
+        cutoff = (now - timedelta(days=SEEN_KEEP_DAYS)).isoformat(timespec="seconds")
+        seen = {k: v for k, v in seen.items() if v >= cutoff}
+        try:
+            os.makedirs(os.path.dirname(SEEN_PATH) or ".", exist_ok=True)
+            tmp = SEEN_PATH + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(seen, f)
+            os.replace(tmp, SEEN_PATH)
+        except OSError as e:
+            print(f"❗ [news_reader] Не удалось сохранить список обработанных статей: {e}")
+
+
+def get_market_news():
+    """
+    Основная порция рыночных новостей (топ-3 заголовка) из общего пула запуска.
+    Предпочтение – новым статьям с распознанными сущностями (как раньше filter_entities=true).
+    """
+    if not os.getenv("MARKETAUX_KEY"):
+        return "MarketAux API ключ не настроен для get_market_news", False
+
+    pool = load_news_pool()
+    if pool.error:
+        return f"❗ Ошибка при загрузке рыночных новостей: {pool.error}", False
+    if not pool.articles:
+        return "Реальных рыночных новостей по заданным фильтрам не найдено.", False
+
+    ranked = sorted(pool.articles, key=lambda a: (not a.is_new, a.entities == 0))  # sort стабилен: порядок по дате сохраняется
+    result = [f"• {a.title} ({a.source})" for a in ranked[:HEADLINES_COUNT]]
+    return "\n".join(result), True
 
 def get_news_block():
     """
@@ -75,75 +220,81 @@ def get_news_block():
         return "", False
 
 
-def get_news_pool_for_gpt_analysis():
+def format_articles_for_gpt(matches) -> str:
+    """Текст пула для промпта GPT: «Новость N: заголовок / Упомянуты: … / Содержание: …».
+
+    matches – список (article, [имена]) из find_influencer_mentions().
     """
-    Загружает более широкий набор свежих общих новостей (без поиска по ключевым словам),
-    который будет использоваться GPT для поиска упоминаний влиятельных лиц.
-    Учитывает предложения по улучшению: увеличен limit, изменены countries,
-    добавлен filter_entities: false и ослаблена фильтрация по дате.
+    news_texts = []
+    for i, (article, names) in enumerate(matches):
+        content_for_gpt = article.snippet or article.description or "Содержание отсутствует."
+        # Ограничиваем длину контента для каждой новости, чтобы не перегружать GPT
+        content_for_gpt = content_for_gpt[:MAX_CONTENT_LEN] + ('...' if len(content_for_gpt) > MAX_CONTENT_LEN else '')
+        news_texts.append(f"Новость {i+1}: {article.title}\nУпомянуты: {', '.join(names)}\nСодержание: {content_for_gpt}")
+    return "\n\n---\n\n".join(news_texts)
+
+
+# --- Локальный поиск упоминаний (до GPT) ---
+def _alias_pattern(alias: str) -> str:
+    escaped = re.escape(alias)
+    # Кириллические имена склоняются – разрешаем окончание
+    return escaped + r"\w*" if re.search(r"[а-яё]$", alias, re.IGNORECASE) else escaped
+
+
+def build_mention_matcher(influencers=None):
+    """Один скомпилированный regex по всем именам и псевдонимам.
+
+    Каждый псевдоним – именованная группа, по имени группы восстанавливается человек.
+    Возвращает (pattern, {group_name: person_name}).
     """
-    api_key = os.getenv("MARKETAUX_KEY")
-    if not api_key:
-        print("❗ [news_reader] MARKETAUX_KEY не установлен. Невозможно получить пул новостей для анализа GPT.")
-        return "🗣️ Ключ MarketAux API не настроен для загрузки пула новостей."
+    influencers = INFLUENCERS_TO_TRACK if influencers is None else influencers
+    parts, owners = [], {}
+    aliases = [(alias, p["name"]) for p in influencers for alias in (p.get("aliases") or [p["name"]])]
+    # Длинные варианты первыми: «Elon Musk» раньше «Musk»
+    for i, (alias, name) in enumerate(sorted(aliases, key=lambda a: -len(a[0]))):
+        group = f"a{i}"
+        owners[group] = name
+        parts.append(f"(?P<{group}>{_alias_pattern(alias)})")
+    return re.compile(r"\b(?:" + "|".join(parts) + r")\b"), owners
 
-    print("ℹ️ [news_reader] Загрузка расширенного пула новостей для анализа упоминаний GPT (с новыми параметрами)...")
-    try:
-        url = "https://api.marketaux.com/v1/news/all"
-        # Улучшение: Фильтруем новости за последние 2 дня для большего охвата
-        published_after_date = (datetime.now() - timedelta(days=2)).strftime('%Y-%m-%d')
-        
-        params = {
-            "api_token": api_key,
-            "language": "ru,en",
-            "limit": 50,  # Увеличено до 50
-            "sort": "published_on",
-            "published_after": published_after_date, # Ослаблен фильтр по дате (2 дня)
-            "group_similar": "true", 
-            "countries": "global",  # Используем только "global" для максимального охвата
-            "filter_entities": "false", # Добавлено для получения более "сырых" данных
-        }
-        # print(f"DEBUG [news_reader] Params for news pool: {params}") # Для отладки параметров
-        response = requests.get(url, params=params, timeout=30) # Увеличен таймаут для большего запроса
-        response.raise_for_status()
-        data = response.json()
-        articles = data.get("data", [])
-
-        if not articles:
-            print(f"ℹ️ [news_reader] Не найдено статей для формирования пула новостей для GPT (за последние 2 дня, limit 50, countries: global, filter_entities: false).")
-            return "🗣️ Не удалось загрузить пул общих новостей для поиска упоминаний влиятельных лиц (возможно, нет свежих новостей по критериям)."
-
-        news_texts = []
-        for i, article in enumerate(articles):
-            title = article.get("title", "Без заголовка").strip()
-            snippet = article.get("snippet", "").strip()
-            description = article.get("description", "").strip()
-            
-            content_for_gpt = snippet
-            if not content_for_gpt and description:
-                content_for_gpt = description
-            elif not content_for_gpt:
-                content_for_gpt = "Содержание отсутствует." # Если и то, и другое пустое
-            
-            # Ограничиваем длину контента для каждой новости, чтобы не перегружать GPT
-            max_content_len = 500 # Символов на новость (сниппет + описание)
-            content_for_gpt = content_for_gpt[:max_content_len] + ('...' if len(content_for_gpt) > max_content_len else '')
-
-            article_text = f"Новость {i+1}: {title}\nСодержание: {content_for_gpt}"
-            news_texts.append(article_text)
-        
-        print(f"ℹ️ [news_reader] Загружено {len(articles)} статей в пул для GPT (параметры: limit 50, published_after: {published_after_date}, countries: global, filter_entities: false).")
-        return "\n\n---\n\n".join(news_texts)
 
-    except requests.exceptions.HTTPError as http_err:
-        error_details = ""
-        if http_err.response is not None:
-            error_details = f" - Status: {http_err.response.status_code}, Response: {http_err.response.text[:200]}"
-        print(f"❗ [news_reader] HTTP ошибка MarketAux при загрузке пула новостей: {http_err}{error_details}")
-        return f"🗣️ Ошибка при загрузке пула новостей (HTTP): {http_err.response.status_code if http_err.response is not None else 'Unknown'}"
-    except requests.exceptions.RequestException as req_err:
-        print(f"❗ [news_reader] Ошибка сети при загрузке пула новостей: {req_err}")
-        return f"🗣️ Ошибка сети при загрузке пула новостей."
-    except Exception as e:
-        print(f"❗ [news_reader] Непредвиденная ошибка при загрузке пула новостей: {e}")
-        return f"🗣️ Непредвиденная ошибка при загрузке пула новостей."
\ No newline at end of file
+_MATCHER = build_mention_matcher()
+
+
+def find_influencer_mentions(articles, matcher=None) -> list:
+    """[(article, [имена]), …] – только статьи, где найдено хотя бы одно упоминание."""
+    pattern, owners = matcher or _MATCHER
+    matches = []
+    for article in articles:
+        text = f"{article.title}\n{article.snippet}\n{article.description}"
+        names = list(dict.fromkeys(owners[m.lastgroup] for m in pattern.finditer(text)))
+        if names:
+            matches.append((article, names))
+    return matches
+
+
+def get_news_pool_for_gpt_analysis():
+    """
+    Пул свежих общих новостей (за последние 2 дня, только ещё не обработанные статьи)
+    для анализа упоминаний влиятельных лиц. В GPT уходят лишь статьи, где локальный
+    поиск нашёл кого-то из INFLUENCERS_TO_TRACK, с пометкой, кто именно упомянут.
+    Возвращает текст пула; сообщение (начинается с «🗣️») об ошибке или об отсутствии
+    упоминаний; пустую строку, если новых статей нет.
+    """
+    pool = load_news_pool()
+    if pool.error:
+        return pool.error
+    if not pool.articles:
+        print(f"ℹ️ [news_reader] Не найдено статей для формирования пула новостей для GPT (за последние {POOL_DAYS} дня).")
+        return "🗣️ Не удалось загрузить пул общих новостей для поиска упоминаний влиятельных лиц (возможно, нет свежих новостей по критериям)."
+
+    fresh = pool.new_articles
+    if not fresh:
+        print("ℹ️ [news_reader] Все статьи пула уже обработаны в прошлых запусках.")
+        return ""
+    matches = find_influencer_mentions(fresh)
+    if not matches:
+        print(f"ℹ️ [news_reader] В {len(fresh)} новых статьях упоминаний отслеживаемых лиц не найдено – GPT не нужен.")
+        return f"🗣️ {NO_MENTIONS_MESSAGE}"
+    print(f"ℹ️ [news_reader] В пул для GPT передано {len(matches)} из {len(fresh)} новых статей (есть упоминания).")
+    return format_articles_for_gpt(matches)
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""nltk_setup.py
+Установка корпусов NLTK на этапе сборки, а не при каждом запуске.
+
+Раньше `main.py` вызывал `nltk.download()` при импорте: сетевой запрос и
+проверка файлов на каждом холодном старте. Теперь корпуса ставятся один
+раз командой сборки (railway.json → buildCommand):
+
+    python nltk_setup.py            # скачать недостающие корпуса
+    python nltk_setup.py --check    # только проверить (код возврата 1, если чего-то нет)
+
+Каталог – NLTK_DATA или `nltk_data/` рядом с проектом; во время работы
+`register_data_path()` добавляет его в пути поиска NLTK без сети.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+
+NLTK_DATA_DIR: str = os.getenv("NLTK_DATA") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "nltk_data")
+
+# Ресурс → путь для nltk.data.find()
+RESOURCES = {
+    "punkt": "tokenizers/punkt",
+    "wordnet": "corpora/wordnet",
+    "averaged_perceptron_tagger": "taggers/averaged_perceptron_tagger",
+}
+
+
+def register_data_path() -> None:
+    """Добавляет NLTK_DATA_DIR в nltk.data.path (без скачивания)."""
+    import nltk
+    if NLTK_DATA_DIR not in nltk.data.path:
+        nltk.data.path.insert(0, NLTK_DATA_DIR)
+
+
+def missing_resources() -> list[str]:
+    import nltk
+    register_data_path()
+    missing = []
+    for name, path in RESOURCES.items():
+        try:
+            nltk.data.find(path)
+        except LookupError:
+            missing.append(name)
+    return missing
+
+
+def install() -> list[str]:
+    """Скачивает недостающие корпуса; возвращает те, что поставить не удалось."""
+    import nltk
+    for name in missing_resources():
+        print(f"nltk_setup: загрузка {name} → {NLTK_DATA_DIR}", flush=True)
+        nltk.download(name, download_dir=NLTK_DATA_DIR, quiet=True)
+    return missing_resources()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Установка корпусов NLTK")
+    parser.add_argument("--check", action="store_true", help="только проверить наличие")
+    args = parser.parse_args()
+    missing = missing_resources() if args.check else install()
+    if missing:
+        print(f"nltk_setup: нет корпусов: {', '.join(missing)}", file=sys.stderr)
+        return 1
+    print(f"nltk_setup: корпуса на месте ({NLTK_DATA_DIR})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""price_store.py
+Локальное хранилище дневных свечей (OHLCV) для теханализа.
+
+Вместо того чтобы каждый запуск скачивать из Yahoo 210 дней истории BTC,
+свечи хранятся в SQLite (`cache/prices.sqlite`, одна таблица, ключ
+symbol+day). При каждом вызове `get_history()` докачиваются только свечи
+начиная с последней сохранённой (она перезаписывается: текущий день ещё
+не закрыт). Если Yahoo недоступен или ограничивает запросы, теханализ
+работает по сохранённой истории.
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+from contextlib import closing
+
+import pandas as pd
+import yfinance as yf
+
+import http_replay
+from custom_logger import log
+
+DB_PATH: str = os.getenv("PRICE_STORE_PATH", os.path.join("cache", "prices.sqlite"))
+COLUMNS = ("Open", "High", "Low", "Close", "Volume")
+
+_lock = threading.Lock()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ohlcv (
+    symbol TEXT NOT NULL,
+    day    TEXT NOT NULL,          -- YYYY-MM-DD (UTC для крипты, биржевой день для акций)
+    open   REAL, high REAL, low REAL, close REAL, volume REAL,
+    PRIMARY KEY (symbol, day)
+)
+"""
+
+
+# ── ВНУТРЕННИЕ ФУНКЦИИ ─────────────────────────────────────────────────────────
+
+def _connect() -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(DB_PATH) or ".", exist_ok=True)
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    conn.execute(_SCHEMA)
+    return conn
+
+
+def _last_day(conn: sqlite3.Connection, symbol: str) -> str | None:
+    row = conn.execute("SELECT MAX(day) FROM ohlcv WHERE symbol = ?", (symbol,)).fetchone()
+    return row[0] if row else None
+
+
+def _download(symbol: str, days: int, since: str | None) -> pd.DataFrame:
+    """Скачивает свечи: полную историю за `days` дней или только начиная с `since`."""
+    ticker = yf.Ticker(symbol)
+    if since is None:
+        return http_replay.frames("yfinance", f"history:{symbol}:{days}d",
+                                  lambda: ticker.history(period=f"{days}d"))
+    # при воспроизведении since не входит в ключ: докачка отдаёт последнюю запись по символу
+    return http_replay.frames("yfinance", f"history:{symbol}:since", lambda: ticker.history(start=since))
+
+
+def _upsert(conn: sqlite3.Connection, symbol: str, frame: pd.DataFrame) -> int:
+    frame = frame.dropna(subset=["Close"])
+    rows = [
+        (symbol, idx.strftime("%Y-%m-%d"), *(float(row[c]) for c in COLUMNS))
+        for idx, row in frame[list(COLUMNS)].iterrows()
+    ]
+    conn.executemany(
+        "INSERT OR REPLACE INTO ohlcv (symbol, day, open, high, low, close, volume) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        rows,
+    )
+    conn.commit()
+    return len(rows)
+
+
+def _read(conn: sqlite3.Connection, symbol: str, days: int) -> pd.DataFrame:
+    rows = conn.execute(
+        "SELECT day, open, high, low, close, volume FROM ohlcv WHERE symbol = ? "
+        "ORDER BY day DESC LIMIT ?",
+        (symbol, days),
+    ).fetchall()
+    frame = pd.DataFrame(rows[::-1], columns=("Date", *COLUMNS))
+    frame.index = pd.DatetimeIndex(pd.to_datetime(frame.pop("Date")), name="Date")
+    return frame
+
+
+# ── ЭКСПОРТ ─────────────────────────────────────────────────────────────────────
+
+def get_history(symbol: str, days: int = 210) -> pd.DataFrame:
+    """Возвращает последние `days` дневных свечей `symbol` (колонки Open/High/Low/Close/Volume).
+
+    Из сети запрашиваются только свечи, которых нет в хранилище. Если
+    сохранённая история слишком старая (пропуск больше `days` дней),
+    она скачивается заново целиком.
+    """
+    with _lock, closing(_connect()) as conn:
+        last_day = _last_day(conn, symbol)
+        since = last_day
+        if last_day is not None and (pd.Timestamp.now(tz="UTC").tz_localize(None) - pd.Timestamp(last_day)).days >= days:
+            since = None
+        try:
+            fresh = _download(symbol, days, since)
+            added = _upsert(conn, symbol, fresh) if not fresh.empty else 0
+            log(f"ℹ️ price_store: {symbol} – получено свечей: {added} (с {since or f'{days}d'}).")
+        except Exception as e:
+            log(f"⚠️ price_store: не удалось обновить {symbol} ({type(e).__name__}: {e}), используем сохранённую историю.")
+        return _read(conn, symbol, days)
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""records.py
+Типизированные данные ридеров (до форматирования).
+
+Каждый ридер возвращает компактную запись: числа, источник, время загрузки
+и ошибку (`error` – короткое описание, None при успехе). Готовый текст
+отчёта строит `renderers.py`; числа для истории и дельт (`metrics()`) берутся
+прямо из записи, без разбора текста. Старые функции ридеров, возвращающие
+строку (`get_crypto_data()` и т.д.), – обёртки «fetch + render».
+
+Модуль не импортирует ничего тяжёлого: записи создаются и в потоках
+сбора, и в тестовых прогонах без pandas/numpy.
+"""
+
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass, field
+
+STABLECOINS_TO_SKIP_ANALYSIS = ["USDT", "USDC", "DAI", "TUSD", "BUSD", "USDP"]
+
+
+@dataclass(slots=True)
+class Quote:
+    """Котировка монеты, ETF или индекса; error – почему котировки нет."""
+    symbol: str
+    name: str
+    price: float | None = None
+    change_pct: float | None = None       # % за 24ч (крипта) или к прошлому закрытию
+    market_cap: float | None = None
+    error: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.price is not None and self.change_pct is not None
+
+
+@dataclass(slots=True)
+class TaSignal:
+    """Индикаторы одного актива (ta_signals / indicators) и сработавшие сигналы."""
+    label: str
+    price: float
+    sma50_dev_pct: float | None = None
+    rsi14: float | None = None
+    volume_ratio: float | None = None
+    sma7: float | None = None
+    golden_cross: bool = False
+    death_cross: bool = False
+    sma50_signal: bool = False
+    rsi_signal: bool = False
+    volume_signal: bool = False
+
+    @property
+    def any_signal(self) -> bool:
+        return (self.golden_cross or self.death_cross or self.sma50_signal
+                or self.rsi_signal or self.volume_signal)
+
+
+# ── ЗАПИСИ РИДЕРОВ ──────────────────────────────────────────────────────────────
+
+@dataclass(slots=True)
+class CryptoSnapshot:
+    """Топ монет, глобальная капитализация и техсигналы (market_reader.fetch_crypto)."""
+    coins: list[Quote] | None = None                 # None – список не получен
+    total_market_cap: float | None = None
+    market_cap_change_24h: float | None = None
+    btc_ta: TaSignal | None = None                   # None без btc_ta_error – мало истории
+    btc_ta_error: str | None = None
+    coin_signals: list[TaSignal] = field(default_factory=list)
+    extended: bool = False
+    source: str = ""
+    fetched_at: float = field(default_factory=time.time)
+    error: str | None = None
+
+    def metrics(self) -> dict[str, float]:
+        metrics = {}
+        for coin in self.coins or []:
+            if coin.ok:
+                metrics[f"crypto.{coin.symbol}.price"] = coin.price
+                metrics[f"crypto.{coin.symbol}.change_24h"] = round(coin.change_pct, 2)
+        if self.total_market_cap is not None and self.market_cap_change_24h is not None:
+            metrics["crypto.market_cap_change_24h"] = round(self.market_cap_change_24h, 2)
+        return metrics
+
+
+@dataclass(slots=True)
+class FngReading:
+    """Индекс страха и жадности (fng_reader.fetch_fear_and_greed)."""
+    value: int | None = None
+    label: str = ""
+    source: str = "alternative.me"
+    fetched_at: float = field(default_factory=time.time)
+    error: str | None = None
+
+    def metrics(self) -> dict[str, float]:
+        return {"fng.value": float(self.value)} if self.value is not None and self.error is None else {}
+
+
+@dataclass(slots=True)
+class LongShortRatio:
+    symbol: str
+    long_pct: float | None = None
+    short_pct: float | None = None
+    error: str | None = None
+
+
+@dataclass(slots=True)
+class DerivativesSnapshot:
+    """Соотношение лонгов/шортов по фьючерсам (metrics_reader.fetch_derivatives)."""
+    ratios: list[LongShortRatio] = field(default_factory=list)
+    source: str = "Binance Futures"
+    fetched_at: float = field(default_factory=time.time)
+    error: str | None = None
+
+    def metrics(self) -> dict[str, float]:
+        metrics = {}
+        for ratio in self.ratios:
+            if ratio.error is not None or ratio.long_pct is None or ratio.short_pct is None:
+                continue
+            long_pct, short_pct = round(ratio.long_pct, 1), round(ratio.short_pct, 1)
+            metrics[f"derivatives.{ratio.symbol}.long_pct"] = long_pct
+            metrics[f"derivatives.{ratio.symbol}.short_pct"] = short_pct
+            if short_pct > 0:
+                metrics[f"derivatives.{ratio.symbol}.ls_ratio"] = round(long_pct / short_pct, 4)
+        return metrics
+
+
+@dataclass(slots=True)
+class MacroRow:
+    """Показатели одного региона; None – ряда нет или он не загрузился."""
+    flag: str
+    cpi: float
+    cpi_date: str                      # ISO-дата наблюдения CPI
+    stale: bool = False                # данные старше macro_reader.STALE_BADGE_DAYS
+    ppi: float | None = None
+    rate: float | None = None
+    unemp: float | None = None
+
+
+@dataclass(slots=True)
+class MacroSnapshot:
+    """Макроэкономика по регионам (macro_reader.fetch_macro)."""
+    rows: list[MacroRow] = field(default_factory=list)
+    source: str = "FRED / World Bank"
+    fetched_at: float = field(default_factory=time.time)
+    error: str | None = None
+
+    def metrics(self) -> dict[str, float]:
+        metrics = {}
+        for row in self.rows:
+            for name, value in (("cpi", row.cpi), ("ppi", row.ppi), ("rate", row.rate), ("unemp", row.unemp)):
+                if value is not None:
+                    metrics[f"macro.{row.flag}.{name}"] = round(value, 2 if name == "rate" else 1)
+        return metrics
+
+
+@dataclass(slots=True)
+class MarketSnapshot:
+    """ETF (Alpha Vantage) и индексы (yfinance) (market_reader.fetch_market)."""
+    etfs: list[Quote] | None = None                  # None – ключ Alpha Vantage не настроен
+    indices: list[Quote] = field(default_factory=list)
+    index_signals: list[TaSignal] = field(default_factory=list)
+    source: str = "Alpha Vantage / yfinance"
+    fetched_at: float = field(default_factory=time.time)
+    error: str | None = None
+
+    def metrics(self) -> dict[str, float]:
+        metrics = {}
+        for quote in (self.etfs or []) + self.indices:
+            if quote.ok:
+                metrics[f"market.{quote.name}.price"] = round(quote.price, 2)
+                metrics[f"market.{quote.name}.change_pct"] = round(quote.change_pct, 2)
+        return metrics
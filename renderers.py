@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""renderers.py
+Текст блоков отчёта (Telegram-HTML) из записей ридеров (`records.py`).
+
+Рендереры – чистые функции без сети и состояния: одну и ту же запись можно
+отрендерить повторно (другой формат, сравнение, промпт GPT), не запрашивая
+API заново. Вывод совпадает с тем, что раньше собирали сами ридеры.
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+from datetime import date
+
+from custom_logger import log
+from records import (
+    STABLECOINS_TO_SKIP_ANALYSIS, CryptoSnapshot, DerivativesSnapshot, FngReading, LongShortRatio,
+    MacroSnapshot, MarketSnapshot, Quote, TaSignal,
+)
+
+MONTHS_RU = {1: "янв", 2: "фев", 3: "мар", 4: "апр", 5: "май", 6: "июн",
+             7: "июл", 8: "авг", 9: "сен", 10: "окт", 11: "ноя", 12: "дек"}
+
+FNG_EXPLANATIONS = {
+    "Extreme Fear": "инвесторы паникуют, возможны хорошие точки входа",
+    "Fear": "рынок насторожен, возможна коррекция",
+    "Neutral": "настроения сбалансированы",
+    "Greed": "инвесторы активны, но возможна перекупленность",
+    "Extreme Greed": "рынок перегрет — велика вероятность коррекции",
+}
+
+
+def _change_emoji(change: float) -> str:
+    return "🟢" if change > 0 else "🔴" if change < 0 else "⚪"
+
+
+def format_large_number(num):
+    """Форматирует большое число с пробелами в качестве разделителей тысяч."""
+    if num is None:
+        return "N/A"
+    try:
+        if isinstance(num, (float, int)):
+            return f"${num:,.0f}".replace(",", " ")
+        return f"${int(num):,}".replace(",", " ")
+    except (ValueError, TypeError):
+        return "N/A"
+
+
+# ── ТЕХСИГНАЛЫ ──────────────────────────────────────────────────────────────────
+
+def render_signal_lines(signals: list[TaSignal]) -> list[str]:
+    """Строки вида «— ETH: RSI 74 (перекупленность); +5.1% к SMA50» для активов с сигналами."""
+    lines = []
+    for signal in signals:
+        parts = []
+        if signal.golden_cross:
+            parts.append("📈 золотой крест SMA50/SMA200")
+        if signal.death_cross:
+            parts.append("📉 мёртвый крест SMA50/SMA200")
+        if signal.sma50_signal:
+            parts.append(f"{signal.sma50_dev_pct:+.1f}% к SMA50")
+        if signal.rsi_signal:
+            zone = "перекупленность" if signal.rsi14 > 70 else "перепроданность"
+            parts.append(f"RSI {signal.rsi14:.0f} ({zone})")
+        if signal.volume_signal:
+            parts.append(f"объём x{signal.volume_ratio:.1f}")
+        if parts:
+            lines.append(f"— <b>{signal.label}</b>: " + "; ".join(parts))
+    return lines
+
+
+def _signal_block(signals: list[TaSignal], title: str) -> list[str]:
+    lines = render_signal_lines(signals)
+    return [f"\n→ <b>{title}</b>:"] + lines if lines else []
+
+
+def _btc_ta_lines(ta: TaSignal) -> list[str]:
+    btc_price_fmt = format_large_number(ta.price).replace("$", "")
+    sma7_fmt = format_large_number(ta.sma7).replace("$", "")
+    position = "выше" if ta.price > ta.sma7 else "ниже"
+    lines = [f"\n💡 BTC ({btc_price_fmt}) {position} 7-дневной средней ({sma7_fmt})."]
+
+    tech_signals = []
+    if ta.sma50_signal:
+        direction = "выше" if ta.sma50_dev_pct > 0 else "ниже"
+        tech_signals.append(f"— Цена BTC {direction} 50-дневной средней на {ta.sma50_dev_pct:+.1f}%.")
+    if ta.golden_cross:
+        tech_signals.append("— 📈 <b>Золотой крест:</b> SMA50 пересекла SMA200 снизу вверх (бычий сигнал).")
+    elif ta.death_cross:
+        tech_signals.append("— 📉 <b>Мёртвый крест:</b> SMA50 пересекла SMA200 сверху вниз (медвежий сигнал).")
+    if ta.rsi_signal and ta.rsi14 > 70:
+        tech_signals.append(f"— 🚦 RSI ({ta.rsi14:.0f}) в зоне <b>перекупленности</b> (>70).")
+    elif ta.rsi_signal:
+        tech_signals.append(f"— 🚦 RSI ({ta.rsi14:.0f}) в зоне <b>перепроданности</b> (<30).")
+    if ta.volume_signal:
+        tech_signals.append(f"— 📈 Объём торгов значительно <b>выше среднего</b> (x{ta.volume_ratio:.1f}).")
+
+    # Если найден хотя бы один сигнал, выводим весь блок
+    if tech_signals:
+        lines.append("\n→ <b>Техсигналы по BTC</b>:")
+        lines.extend(tech_signals)
+    return lines
+
+
+# ── КРИПТА ──────────────────────────────────────────────────────────────────────
+
+def render_global_market(total_market_cap, market_cap_change_24h, source_name=""):
+    """Текст об общей капитализации крипторынка."""
+    if total_market_cap is None or market_cap_change_24h is None:
+        source_info_err = f" от {source_name}" if source_name else ""
+        log(f"DEBUG: render_global_market - Incomplete data: total_market_cap={total_market_cap}, "
+            f"market_cap_change_24h={market_cap_change_24h}, source={source_name}")
+        return f"🌍 Не удалось получить полные данные об общей капитализации крипторынка{source_info_err}."
+
+    change = float(market_cap_change_24h)
+    source_info = f" (источник: {source_name})" if source_name else ""
+    return (f"🌍 Общая капитализация крипторынка{source_info}: {format_large_number(total_market_cap)}\n"
+            f"   {_change_emoji(change)} Изменение за 24ч (глобально): {change:+.2f}%")
+
+
+def _coin_line(coin: Quote, source: str) -> str:
+    if not coin.ok:
+        return f"  {coin.symbol}: ❌ неполные данные ({coin.name}) от {source}"
+    price_formatted = f"${coin.price:,.4f}" if coin.price < 1 else f"${coin.price:,.2f}"
+    market_cap_formatted = f"(кап: {format_large_number(coin.market_cap)})" if coin.market_cap is not None else ""
+    return (f"  {_change_emoji(coin.change_pct)}<b>{coin.symbol}</b>: {price_formatted} "
+            f"({coin.change_pct:+.2f}%) {market_cap_formatted}")
+
+
+def render_crypto(record: CryptoSnapshot) -> str:
+    """Блок крипты: капитализация, топ-10, краткий анализ движений и техсигналы."""
+    if record.error:
+        return f"❌ {record.error}"
+    parts = []
+    if record.total_market_cap is not None and record.market_cap_change_24h is not None:
+        parts.append(render_global_market(record.total_market_cap, record.market_cap_change_24h, record.source))
+    else:
+        parts.append(f"🌍 Данные об общей капитализации от {record.source or 'источников'} временно недоступны.")
+
+    if record.coins is None:
+        return "\n".join(parts)
+
+    today_date_str = date.today().strftime("%d.%m.%Y")
+    source_info_coins = f" (источник: {record.source})" if record.source else ""
+    parts.append(f"\n₿ Крипта на {today_date_str}{source_info_coins} (Топ-10 по капитализации)")
+    if not record.coins:
+        parts.append(f"  ℹ️ Список топ-10 криптовалют пуст (или не получен) от {record.source}.")
+    parts.extend(_coin_line(coin, record.source) for coin in record.coins)
+
+    if record.extended:
+        insights = sorted({
+            f"— {coin.symbol} ({coin.name}) {'растёт' if coin.change_pct > 0 else 'падает'} на {coin.change_pct:+.2f}%."
+            for coin in record.coins
+            if coin.ok and coin.symbol not in STABLECOINS_TO_SKIP_ANALYSIS and abs(coin.change_pct) >= 1
+        })
+        if insights:
+            parts.append("\n→ Краткий анализ по топ криптовалютам (исключая стейблкоины):")
+            parts.extend(insights)
+
+    if record.btc_ta is not None:
+        parts.extend(_btc_ta_lines(record.btc_ta))
+    elif record.btc_ta_error:
+        parts.append("💡 Не удалось рассчитать технические индикаторы для BTC.")
+    else:
+        parts.append("\n💡 Недостаточно исторических данных BTC для полного теханализа.")
+
+    if record.extended:
+        parts.extend(_signal_block(record.coin_signals, "Техсигналы по топ-10"))
+    return "\n".join(part for part in parts if part and part.strip())
+
+
+# ── ИНДЕКС СТРАХА И ЖАДНОСТИ, ДЕРИВАТИВЫ ───────────────────────────────────────
+
+def render_fng(record: FngReading) -> str:
+    """Строка индекса с пояснением; пустая строка, если данных нет."""
+    if record.error or record.value is None:
+        return ""  # ничего не выводим при отсутствии данных
+    explanation = FNG_EXPLANATIONS.get(record.label, "настроения неопределённые")
+    emoji = "🔴" if record.value <= 25 else "🟡" if record.value <= 50 else "🟢"
+    # \n в конце – дополнительный отступ при сборке
+    return f"{emoji} Индекс страха и жадности: {record.value} ({record.label}) — {explanation}.\n"
+
+
+def render_long_short(ratio: LongShortRatio) -> str:
+    if ratio.error:
+        return f"⚖️ Ошибка {ratio.symbol}: {ratio.error}"
+    return f"⚖️ {ratio.symbol}: Лонги {ratio.long_pct:.1f}% / Шорты {ratio.short_pct:.1f}%"
+
+
+def render_derivatives(record: DerivativesSnapshot) -> str:
+    return "\n".join(render_long_short(ratio) for ratio in record.ratios)
+
+
+# ── МАКРО ───────────────────────────────────────────────────────────────────────
+
+def _rus(d_iso: str) -> str:
+    d = dt.datetime.fromisoformat(d_iso)
+    return f"{MONTHS_RU[d.month]} {d.year}"
+
+
+def render_macro(record: MacroSnapshot) -> str:
+    """Строки «🇺🇸 CPI 2.9 % | PPI … | Rate … | Unemp …» с легендой; пусто без данных."""
+    if not record.rows:
+        return ""
+    lines = []
+    for row in record.rows:
+        stale = " 🕒" if row.stale else ""
+        ppi_s = f"PPI {row.ppi:.1f} %" if row.ppi is not None else "PPI n/a"
+        rate_s = f"Rate {row.rate:.2f} %" if row.rate is not None else "Rate n/a"
+        unemp_s = f" | Unemp {row.unemp:.1f} %" if row.unemp is not None else ""
+        lines.append(f"{row.flag} CPI {row.cpi:.1f} %{stale} | {ppi_s} | {rate_s}{unemp_s}  ({_rus(row.cpi_date)})")
+    header = ("📊 Макроэкономика\n"
+              "<b>Легенда:</b> CPI — годовая инфляция, PPI — цены производителей, "
+              "Rate — ставка ЦБ, Unemp — безработица\n\n")
+    return header + "\n".join(lines)
+
+
+# ── ИНДЕКСЫ И ETF ───────────────────────────────────────────────────────────────
+
+def render_market(record: MarketSnapshot) -> str:
+    """Блок «📊 Индексы и ETF»: котировки ETF, индексы в пунктах и техсигналы по индексам."""
+    result_parts = ["📊 Индексы и ETF"]
+    if record.error and not record.etfs and not record.indices:
+        result_parts.append("  ⚠️ Не удалось загрузить данные по индексам и ETF.")
+        return "\n".join(result_parts)
+
+    if record.etfs is not None:
+        for quote in record.etfs:
+            if quote.ok:
+                result_parts.append(f"  {_change_emoji(quote.change_pct)}{quote.name}: ${quote.price:,.2f} "
+                                    f"({quote.change_pct:+.2f}%)")
+            else:
+                result_parts.append(f"  {quote.name}: ❌ {quote.error}")
+        if not record.etfs:
+            result_parts.append("  ⚠️ Не удалось загрузить данные по ETF (AlphaVantage). "
+                                "Проверьте ключ или доступность сервиса.")
+        result_parts.append("    └─ *ETF (Exchange Traded Fund) — это фонд, акции которого торгуются на бирже...")
+    else:
+        result_parts.append("  ℹ️ Alpha Vantage API ключ не настроен, данные по ETF не загружены.")
+
+    if record.indices:
+        if record.etfs or record.etfs is None:
+            result_parts.append("")
+        for quote in record.indices:
+            if quote.ok:
+                result_parts.append(f"  {_change_emoji(quote.change_pct)}{quote.name}: {quote.price:,.2f} pts "
+                                    f"({quote.change_pct:+.2f}%)")
+            else:
+                result_parts.append(f"  {quote.name}: ❌ {quote.error}")
+        result_parts.append("    └─ *Значения индексов выражаются в пунктах и являются «чистыми» статистическими величинами...")
+        result_parts.extend(_signal_block(record.index_signals, "Техсигналы по индексам"))
+    return "\n".join(result_parts)
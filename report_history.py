@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""report_history.py
+История отчётов в SQLite (`cache/report_history.sqlite`).
+
+Каждый запуск – строка в `runs` (день по TZ, режим, успех, длительности
+этапов), каждый блок отчёта – строка в `sections` (текст) и числа за ним в
+`metrics` (цены, % изменения, F&G, лонги/шорты, CPI…). Несколько запусков
+за день не перезаписывают друг друга. Сравнение «к вчера» / «к неделе
+назад» – выборка последнего запуска на нужный день по индексу и его
+метрик, без перечитывания файлов.
+
+Числа передаёт вызывающий (main – из записей ридеров, `records.py`
+`metrics()`), поэтому ключи метрик определены в одном месте; из текста
+блоков ничего не разбирается.
+
+Настройки: REPORT_HISTORY_PATH, REPORT_HISTORY_KEEP_DAYS (400).
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from datetime import date, timedelta
+
+from custom_logger import log
+
+DB_PATH: str = os.getenv("REPORT_HISTORY_PATH", os.path.join("cache", "report_history.sqlite"))
+
+try:
+    KEEP_DAYS: int = int(os.getenv("REPORT_HISTORY_KEEP_DAYS", "400"))
+except ValueError:
+    log("WARNING: Invalid REPORT_HISTORY_KEEP_DAYS in .env, fallback to 400")
+    KEEP_DAYS = 400
+
+# Метрики для краткой сводки изменений (если есть в обоих запусках)
+HEADLINE_METRICS = {
+    "crypto.BTC.price": "BTC",
+    "crypto.ETH.price": "ETH",
+    "crypto.market_cap_change_24h": "Капитализация крипторынка, % за 24ч",
+    "fng.value": "Индекс страха и жадности",
+    "derivatives.BTCUSDT.long_pct": "Лонги BTC, %",
+}
+
+_lock = threading.Lock()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at  REAL NOT NULL,
+    day         TEXT NOT NULL,            -- YYYY-MM-DD в часовом поясе отчёта
+    mode        TEXT NOT NULL,
+    ok          INTEGER NOT NULL DEFAULT 1,
+    stages      TEXT                      -- JSON StageTimer.as_dict()
+);
+CREATE INDEX IF NOT EXISTS runs_day ON runs (day, started_at);
+CREATE TABLE IF NOT EXISTS sections (
+    run_id  INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    name    TEXT NOT NULL,
+    text    TEXT NOT NULL,
+    PRIMARY KEY (run_id, name)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS metrics (
+    run_id  INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    key     TEXT NOT NULL,                -- «блок.объект.поле», например crypto.BTC.price
+    value   REAL NOT NULL,
+    PRIMARY KEY (run_id, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS metrics_key ON metrics (key, run_id);
+"""
+
+
+# ── ХРАНИЛИЩЕ ───────────────────────────────────────────────────────────────────
+
+def _connect() -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(DB_PATH) or ".", exist_ok=True)
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def record_run(sections: dict[str, str], *, metrics: dict[str, float], day: str | None = None,
+               mode: str = "report", ok: bool = True, stages: dict | None = None) -> int:
+    """Записывает запуск: тексты блоков и их метрики. Возвращает id запуска."""
+    day = day or date.today().isoformat()
+    with _lock, closing(_connect()) as conn:
+        cur = conn.execute(
+            "INSERT INTO runs (started_at, day, mode, ok, stages) VALUES (?, ?, ?, ?, ?)",
+            (time.time(), day, mode, int(ok), json.dumps(stages) if stages else None),
+        )
+        run_id = cur.lastrowid
+        conn.executemany(
+            "INSERT INTO sections (run_id, name, text) VALUES (?, ?, ?)",
+            [(run_id, name, text) for name, text in sections.items() if isinstance(text, str) and text],
+        )
+        conn.executemany(
+            "INSERT INTO metrics (run_id, key, value) VALUES (?, ?, ?)",
+            [(run_id, key, float(value)) for key, value in metrics.items()],
+        )
+        cutoff = (date.fromisoformat(day) - timedelta(days=KEEP_DAYS)).isoformat()
+        conn.execute("DELETE FROM runs WHERE day < ?", (cutoff,))
+        conn.commit()
+    log(f"🗄 report_history: запуск #{run_id} ({day}) – блоков {len(sections)}, метрик {len(metrics)}.")
+    return run_id
+
+
+def finish_run(run_id: int, *, ok: bool = True, stages: dict | None = None) -> None:
+    """Дописывает итог запуска (успех и длительности этапов) после публикации."""
+    with _lock, closing(_connect()) as conn:
+        conn.execute("UPDATE runs SET ok = ?, stages = ? WHERE id = ?",
+                     (int(ok), json.dumps(stages) if stages else None, run_id))
+        conn.commit()
+
+
+def run_day(run_id: int) -> str | None:
+    with _lock, closing(_connect()) as conn:
+        row = conn.execute("SELECT day FROM runs WHERE id = ?", (run_id,)).fetchone()
+    return row[0] if row else None
+
+
+def latest_run(on_or_before: str, exclude: int | None = None) -> int | None:
+    """Последний запуск на день on_or_before или раньше (индекс runs_day)."""
+    with _lock, closing(_connect()) as conn:
+        row = conn.execute(
+            "SELECT id FROM runs WHERE day <= ? AND id != ? ORDER BY day DESC, started_at DESC LIMIT 1",
+            (on_or_before, exclude or -1),
+        ).fetchone()
+    return row[0] if row else None
+
+
+def baseline_run(run_id: int, days_back: int) -> int | None:
+    """Запуск для сравнения: последний на день (день run_id − days_back) или раньше."""
+    day = run_day(run_id)
+    if day is None:
+        return None
+    target = (date.fromisoformat(day) - timedelta(days=days_back)).isoformat()
+    return latest_run(target, exclude=run_id)
+
+
+def get_metrics(run_id: int) -> dict[str, float]:
+    with _lock, closing(_connect()) as conn:
+        return dict(conn.execute("SELECT key, value FROM metrics WHERE run_id = ?", (run_id,)).fetchall())
+
+
+def get_section(run_id: int, name: str) -> str | None:
+    with _lock, closing(_connect()) as conn:
+        row = conn.execute("SELECT text FROM sections WHERE run_id = ? AND name = ?", (run_id, name)).fetchone()
+    return row[0] if row else None
+
+
+def metric_window(keys: list[str], days: int = 30, before_day: str | None = None) -> tuple[list[str], dict[str, dict[str, float]]]:
+    """Метрики keys за последние days дней до before_day (не включая) одним запросом.
+
+    На каждый день – последний запуск. Возвращает (дни от старых к новым,
+    {день: {метрика: значение}}); пропуски метрик в днях не заполняются.
+    """
+    if not keys:
+        return [], {}
+    with _lock, closing(_connect()) as conn:
+        rows = conn.execute(
+            f"""
+            WITH last_runs AS (
+                SELECT id, day FROM (
+                    SELECT id, day, ROW_NUMBER() OVER (PARTITION BY day ORDER BY started_at DESC) AS rn
+                    FROM runs WHERE day < ?
+                ) WHERE rn = 1 ORDER BY day DESC LIMIT ?
+            )
+            SELECT lr.day, m.key, m.value FROM last_runs lr JOIN metrics m ON m.run_id = lr.id
+            WHERE m.key IN ({','.join('?' * len(keys))})
+            """,
+            (before_day or "9999-12-31", days, *keys),
+        ).fetchall()
+    by_day: dict[str, dict[str, float]] = {}
+    for day, key, value in rows:
+        by_day.setdefault(day, {})[key] = value
+    return sorted(by_day), by_day
+
+
+# ── СРАВНЕНИЕ ───────────────────────────────────────────────────────────────────
+
+def compare_runs(run_id: int, base_id: int) -> dict[str, tuple[float, float, float, float | None]]:
+    """{метрика: (новое, старое, разница, разница в %)} по общим метрикам двух запусков."""
+    new, old = get_metrics(run_id), get_metrics(base_id)
+    result = {}
+    for key in new.keys() & old.keys():
+        delta = new[key] - old[key]
+        pct = delta / abs(old[key]) * 100 if old[key] else None
+        result[key] = (new[key], old[key], delta, pct)
+    return result
+
+
+def _fmt(value: float) -> str:
+    return f"{value:,.2f}".replace(",", " ") if abs(value) >= 100 else f"{value:.2f}"
+
+
+def format_comparison(run_id: int) -> str:
+    """Краткая сводка «к вчера / к неделе назад» по HEADLINE_METRICS."""
+    periods = [("к вчера", baseline_run(run_id, 1)), ("к неделе назад", baseline_run(run_id, 7))]
+    periods = [(label, base) for label, base in periods if base is not None]
+    if not periods:
+        return "📊 Данных прошлых дней нет для сравнения."
+    diffs = [(label, compare_runs(run_id, base)) for label, base in periods]
+    lines = []
+    for key, title in HEADLINE_METRICS.items():
+        parts = []
+        for label, diff in diffs:
+            if key not in diff:
+                continue
+            new, old, delta, pct = diff[key]
+            change = f"{pct:+.1f}%" if pct is not None and key.endswith(".price") else f"{delta:+.2f}"
+            parts.append(f"{change} {label}")
+        if parts:
+            current = next(diff[key][0] for _, diff in diffs if key in diff)
+            lines.append(f"— {title}: {_fmt(current)} ({', '.join(parts)})")
+    if not lines:
+        return "📊 Общих показателей с прошлыми отчётами нет."
+    return "📊 Изменения показателей:\n" + "\n".join(lines)
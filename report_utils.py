@@ -1,25 +1,24 @@
 """Utility helpers for GPT-based operations and sentiment analysis.
 
 This module provides:
-    * call_gpt – safe wrapper around ``openai.ChatCompletion.create`` with simple retry logic.
+    * call_gpt – safe wrapper around :func:`gpt_client.chat_completion` (retries,
+      token budget and response cache live there).
     * get_sentiment_description_for_report – helper that converts numeric TextBlob sentiment
       scores into Russian text suitable for Telegram reports.
     * analyze_sentiment – user‑friendly wrapper that returns a formatted sentiment summary.
 
 The sentiment‑related functions are left exactly as before, while the GPT helper has been
-re‑added to keep backward compatibility with ``main.py``.
+re‑added to keep backward compatibility with ``main.py``. TextBlob (and NLTK behind it) is
+imported on the first sentiment call only; corpora are installed at build time by ``nltk_setup.py``.
 """
 
 from __future__ import annotations
 
 import os
-import time
 from datetime import datetime
 
-import openai
-from textblob import TextBlob
-
 from custom_logger import log
+from gpt_client import chat_completion
 
 # ---------------------------------------------------------------------------
 # 💬 GPT helper
@@ -37,6 +36,7 @@ def call_gpt(
     max_tokens: int = 400,
     temperature: float = 0.4,
     retries: int = 3,
+    prompt_budget: int | None = None,
 ) -> str:
     """Call OpenAI GPT model with automatic retries.
 
@@ -46,7 +46,9 @@ def call_gpt(
         model: OpenAI model name (default ``gpt-4o-mini``).
         max_tokens: Max tokens to generate.
         temperature: Sampling temperature.
-        retries: How many times to retry on transient API errors.
+        retries: How many times to retry on transient API errors (rate limits
+            and ``Retry-After`` are handled by :mod:`gpt_client`).
+        prompt_budget: Prompt token budget; longer input is trimmed.
 
     Returns:
         Assistant's reply on success, or a stub string if all attempts fail.
@@ -57,22 +59,21 @@ def call_gpt(
     if user_content:
         messages.append({"role": "user", "content": user_content})
 
-    for attempt in range(retries):
-        try:
-            resp = openai.ChatCompletion.create(
-                model=model,
-                messages=messages,
-                max_tokens=max_tokens,
-                temperature=temperature,
-                timeout=TIMEOUT,
-            )
-            return resp.choices[0].message.content.strip()
-        except openai.error.OpenAIError as exc:
-            log(
-                f"[call_gpt] attempt {attempt + 1}/{retries} failed: {type(exc).__name__}: {exc}"
-            )
-            # Exponential backoff: 1s, 2s, 4s, ...
-            time.sleep(2 ** attempt)
+    import openai  # нужен только тип ошибки; сам запрос всё равно загружает openai
+
+    try:
+        resp = chat_completion(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            timeout=TIMEOUT,
+            retries=retries,
+            prompt_budget=prompt_budget,
+        )
+        return resp.choices[0].message.content.strip()
+    except openai.error.OpenAIError as exc:
+        log(f"[call_gpt] all {retries} attempts failed: {type(exc).__name__}: {exc}")
 
     return "⚠️ call_gpt: No response from OpenAI after several attempts."
 
@@ -118,6 +119,9 @@ def analyze_sentiment(text_to_analyze: str) -> str:
         )
 
     try:
+        from textblob import TextBlob
+        import nltk_setup
+        nltk_setup.register_data_path()
         blob = TextBlob(text_to_analyze)
         polarity = blob.sentiment.polarity
         subjectivity = blob.sentiment.subjectivity
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""stage_timer.py
+Замер длительности этапов одного запуска отчёта.
+
+`run_report()` оборачивает каждый этап (сбор данных, GPT, публикация) в
+`timer.stage(name)`; итог – стенное и процессорное время по этапам плюс
+время отдельных блоков этапа. Данные последнего запуска показывает
+health-эндпоинт демона (`daemon.py`).
+"""
+
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Iterator
+
+from custom_logger import log
+
+
+@dataclass
+class StageStat:
+    """Один этап: стенное время, CPU процесса и время блоков внутри этапа."""
+    name: str
+    wall: float = 0.0
+    cpu: float = 0.0
+    blocks: dict[str, float] = field(default_factory=dict)
+
+    def add_blocks(self, results: dict) -> None:
+        """Время блоков из `collect_blocks()` / `run_gpt_stage()` (name → BlockResult)."""
+        self.blocks.update({name: round(result.elapsed, 3) for name, result in results.items()})
+
+
+class StageTimer:
+    """Накопитель этапов одного запуска."""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.stages: list[StageStat] = []
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[StageStat]:
+        stat = StageStat(name)
+        wall_started, cpu_started = time.perf_counter(), time.process_time()
+        try:
+            yield stat
+        finally:
+            stat.wall = time.perf_counter() - wall_started
+            stat.cpu = time.process_time() - cpu_started
+            self.stages.append(stat)
+            log(f"⏱ Этап '{name}': {stat.wall:.1f}с (CPU {stat.cpu:.1f}с).")
+
+    @property
+    def total(self) -> float:
+        return sum(stat.wall for stat in self.stages)
+
+    def as_dict(self) -> dict:
+        return {
+            stat.name: {"wall": round(stat.wall, 3), "cpu": round(stat.cpu, 3), "blocks": stat.blocks}
+            for stat in self.stages
+        }
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""stream_publisher.py
+Публикация отчёта в Telegram по мере готовности (режим STREAM_MODE).
+
+`iter_paragraphs()` собирает поток фрагментов GPT в законченные абзацы
+(граница – пустая строка). `StreamPublisher` складывает абзацы в текущее
+сообщение и отправляет его, как только следующий абзац уже не помещается
+в лимит байт, – подписчики видят первые части отчёта через секунды, а не
+после окончания самого медленного запроса.
+"""
+
+from __future__ import annotations
+
+from typing import Callable, Iterable, Iterator
+
+from custom_logger import log
+
+PARAGRAPH_SEP = "\n\n"
+
+
+def iter_paragraphs(pieces: Iterable[str]) -> Iterator[str]:
+    """Склеивает фрагменты потока и отдаёт абзацы, как только абзац закончен."""
+    buffer = ""
+    for piece in pieces:
+        buffer += piece
+        while PARAGRAPH_SEP in buffer:
+            paragraph, buffer = buffer.split(PARAGRAPH_SEP, 1)
+            if paragraph.strip():
+                yield paragraph.strip("\n")
+    if buffer.strip():
+        yield buffer.strip("\n")
+
+
+class StreamPublisher:
+    """Накопитель сообщений: абзацы → сообщения не длиннее `limit_bytes`.
+
+    send_part(text) – отправка одного сообщения, возвращает True при успехе;
+    chunker(text, limit) – нарезка абзаца, который сам длиннее лимита
+    (в main – `smart_chunk`).
+    """
+
+    def __init__(self, send_part: Callable[[str], bool], limit_bytes: int,
+                 chunker: Callable[[str, int], list[str]]):
+        self.send_part = send_part
+        self.limit_bytes = limit_bytes
+        self.chunker = chunker
+        self._parts: list[str] = []
+        self._bytes = 0
+        self.sent = 0
+        self.failed = 0
+
+    def _emit(self, text: str) -> None:
+        if self.send_part(text):
+            self.sent += 1
+        else:
+            self.failed += 1
+
+    def add(self, paragraph: str) -> None:
+        """Добавляет абзац; отправляет накопленное, если абзац не помещается."""
+        if not paragraph or not paragraph.strip():
+            return
+        size = len(paragraph.encode("utf-8"))
+        sep = len(PARAGRAPH_SEP) if self._parts else 0
+        if self._bytes + sep + size <= self.limit_bytes:
+            self._parts.append(paragraph)
+            self._bytes += sep + size
+            return
+        self.flush()
+        if size <= self.limit_bytes:
+            self._parts, self._bytes = [paragraph], size
+            return
+        pieces = self.chunker(paragraph, self.limit_bytes)
+        for piece in pieces[:-1]:
+            self._emit(piece)
+        if pieces:
+            self._parts, self._bytes = [pieces[-1]], len(pieces[-1].encode("utf-8"))
+
+    def add_text(self, text: str) -> None:
+        """Добавляет готовый текст (несколько абзацев)."""
+        for paragraph in (text or "").split(PARAGRAPH_SEP):
+            self.add(paragraph.strip("\n"))
+
+    def flush(self, suffix: str = "") -> None:
+        """Отправляет накопленное сообщение (с `suffix` в конце), если оно не пустое."""
+        if not self._parts:
+            return
+        text = PARAGRAPH_SEP.join(self._parts) + suffix
+        self._parts, self._bytes = [], 0
+        log(f"📤 Потоковая отправка: сообщение #{self.sent + self.failed + 1} ({len(text.encode('utf-8'))}Б).")
+        self._emit(text)
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""ta_signals.py
+Векторный теханализ сразу по нескольким активам.
+
+Цены всех тикеров скачиваются одним пакетным `yf.download`, после чего
+SMA50-отклонение, золотой/мёртвый крест, RSI14 и всплеск объёма считаются
+операциями над матрицей (даты × символы) – без цикла по тикерам.
+
+У активов разные календари (крипта торгуется каждый день, биржи – нет),
+поэтому перед расчётом каждая колонка «прижимается» к низу матрицы: её
+валидные значения идут подряд, а пропуски уходят наверх. Окна `[-50:]`,
+`[-201:-1]` и т.д. тогда означают то же, что и для одиночного ряда. Если
+валидных строк меньше окна (у индексов за 210 календарных дней их ~145),
+значение окна – NaN, а не среднее по тому, что есть.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+import http_replay
+from custom_logger import log
+from records import TaSignal
+
+RSI_WINDOW: int = 14
+# Крипта торгуется каждый день – 210 дней дают 210 свечей; биржевым тикерам
+# (индексы, ETF: ~250 торговых дней в году) для SMA200 и крестов нужен год
+CRYPTO_PERIOD = "210d"
+EXCHANGE_PERIOD = "1y"
+
+
+# ── ЗАГРУЗКА ────────────────────────────────────────────────────────────────────
+
+def download_history(tickers: list[str], period: str | None = None) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Один пакетный запрос к Yahoo. Возвращает матрицы Close и Volume (даты × тикеры).
+
+    period по умолчанию – CRYPTO_PERIOD для одних криптопар (…-USD) и
+    EXCHANGE_PERIOD, если среди тикеров есть биржевые.
+    """
+    if not tickers:
+        return pd.DataFrame(), pd.DataFrame()
+    if period is None:
+        period = CRYPTO_PERIOD if all(t.endswith("-USD") for t in tickers) else EXCHANGE_PERIOD
+    data = http_replay.frames("yfinance", f"download:{','.join(tickers)}:{period}", lambda: yf.download(
+        tickers, period=period, interval="1d", group_by="column",
+        auto_adjust=True, progress=False, threads=True, multi_level_index=True,
+    ))
+    if data is None or data.empty:
+        log(f"⚠️ ta_signals: Yahoo вернул пустые данные для {len(tickers)} тикеров.")
+        return pd.DataFrame(), pd.DataFrame()
+    close = data["Close"].reindex(columns=tickers)
+    volume = data["Volume"].reindex(columns=tickers)
+    missing = [t for t in tickers if close[t].dropna().empty]
+    if missing:
+        log(f"ℹ️ ta_signals: нет истории для {', '.join(missing)}")
+    return close, volume
+
+
+# ── РАСЧЁТ ──────────────────────────────────────────────────────────────────────
+
+def _bottom_align(close: pd.DataFrame, *others: pd.DataFrame) -> list[np.ndarray]:
+    """Сдвигает валидные значения каждой колонки вниз (стабильная сортировка по маске)."""
+    values = close.to_numpy(dtype=float)
+    order = np.argsort(~np.isnan(values), axis=0, kind="stable")
+    aligned = [np.take_along_axis(values, order, axis=0)]
+    for frame in others:
+        aligned.append(np.take_along_axis(frame.to_numpy(dtype=float), order, axis=0))
+    return aligned
+
+
+def _wilder_rsi(close: np.ndarray) -> np.ndarray:
+    """RSI Уайлдера по всем колонкам сразу (та же формула, что в библиотеке `ta`).
+
+    Как и `ta`, первое изменение ряда считается нулевым (а не NaN).
+    """
+    frame = pd.DataFrame(close)
+    diff = frame.diff().mask(frame.notna() & frame.shift().isna(), 0.0)
+    up, dn = diff.clip(lower=0), (-diff).clip(lower=0)
+    ema_up = up.ewm(alpha=1 / RSI_WINDOW, min_periods=RSI_WINDOW, adjust=False).mean().iloc[-1]
+    ema_dn = dn.ewm(alpha=1 / RSI_WINDOW, min_periods=RSI_WINDOW, adjust=False).mean().iloc[-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = np.where(ema_dn == 0, 100.0, 100.0 - 100.0 / (1.0 + ema_up / ema_dn))
+    return np.where(ema_up.isna() | ema_dn.isna(), np.nan, rsi)
+
+
+def _window_mean(values: np.ndarray, valid: np.ndarray, window: int, skip_last: int = 0) -> np.ndarray:
+    """Среднее последних window строк (без skip_last последних); NaN, где валидных строк меньше."""
+    end = len(values) - skip_last
+    mean = values[max(end - window, 0):end].mean(axis=0)
+    return np.where(valid >= window + skip_last, mean, np.nan)
+
+
+def compute_signals(
+    close: pd.DataFrame,
+    volume: pd.DataFrame,
+    sma_deviation_threshold: float = 3.0,
+    volume_spike_threshold: float = 1.7,
+) -> pd.DataFrame:
+    """Индикаторы и сигналы для всех колонок `close` одной векторной операцией.
+
+    Возвращает таблицу (символы × поля): price, sma50_dev_pct, rsi14,
+    volume_ratio, golden_cross, death_cross, sma50_signal, rsi_signal,
+    volume_signal. Где истории не хватает (для SMA200 и крестов – 201
+    свеча) – NaN и сигнал False.
+    """
+    if close.empty:
+        return pd.DataFrame()
+    c, v = _bottom_align(close, volume.reindex_like(close))
+    valid = np.count_nonzero(~np.isnan(c), axis=0)
+
+    price = c[-1]
+    sma50 = _window_mean(c, valid, 50)
+    sma200 = _window_mean(c, valid, 200)
+    sma50_prev = _window_mean(c, valid, 50, skip_last=1)
+    sma200_prev = _window_mean(c, valid, 200, skip_last=1)
+    rsi = _wilder_rsi(c)
+    avg_vol = _window_mean(v, valid, 30, skip_last=1)
+    cur_vol = v[-1]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dev_pct = (price - sma50) / sma50 * 100
+        vol_ratio = np.where(avg_vol > 0, cur_vol / avg_vol, np.nan)
+    diff_today, diff_prev = sma50 - sma200, sma50_prev - sma200_prev
+
+    out = pd.DataFrame({
+        "price": price,
+        "sma50_dev_pct": dev_pct,
+        "rsi14": rsi,
+        "volume_ratio": vol_ratio,
+        "golden_cross": (diff_prev < 0) & (diff_today > 0),
+        "death_cross": (diff_prev > 0) & (diff_today < 0),
+        "sma50_signal": np.abs(dev_pct) > sma_deviation_threshold,
+        "rsi_signal": (rsi > 70) | (rsi < 30),
+        "volume_signal": (cur_vol > 1000) & (vol_ratio > volume_spike_threshold),
+    }, index=close.columns)
+    return out
+
+
+# ── ЗАПИСИ ─────────────────────────────────────────────────────────────────────
+
+def signal_records(signals: pd.DataFrame, labels: dict[str, str]) -> list[TaSignal]:
+    """Строки таблицы `compute_signals()` → записи TaSignal (в порядке labels, без отсутствующих)."""
+    records = []
+    for ticker, label in labels.items():
+        if ticker not in signals.index:
+            continue
+        row = signals.loc[ticker]
+        records.append(TaSignal(
+            label=label,
+            price=float(row["price"]),
+            sma50_dev_pct=None if np.isnan(row["sma50_dev_pct"]) else float(row["sma50_dev_pct"]),
+            rsi14=None if np.isnan(row["rsi14"]) else float(row["rsi14"]),
+            volume_ratio=None if np.isnan(row["volume_ratio"]) else float(row["volume_ratio"]),
+            golden_cross=bool(row["golden_cross"]),
+            death_cross=bool(row["death_cross"]),
+            sma50_signal=bool(row["sma50_signal"]),
+            rsi_signal=bool(row["rsi_signal"]),
+            volume_signal=bool(row["volume_signal"]),
+        ))
+    return records
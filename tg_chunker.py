@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""tg_chunker.py
+Нарезка отчёта на сообщения Telegram за один проход по UTF-8.
+
+Текст кодируется один раз; границы символов ищутся по байтам
+продолжения (10xxxxxx), а не подбором `decode()`. Каждая часть – самый
+длинный префикс остатка, который влезает в лимит, с отступом к лучшей
+границе: абзац (пустая строка) → строка → конец предложения → пробел →
+граница символа. Строка/предложение/пробел берутся, только если часть
+получается не короче половины лимита, иначе – просто граница символа.
+
+HTML-режим (parse_mode=HTML): разрез не попадает внутрь тега или
+сущности (`&amp;`), а незакрытые `<b>`, `<a href=…>` и т.п. закрываются в
+конце части и открываются заново в начале следующей.
+"""
+
+from __future__ import annotations
+
+import re
+
+PARAGRAPH = b"\n\n"
+SENTENCE_ENDS = (b". ", b"! ", b"? ", b".\n", b"!\n", b"?\n")
+
+# Теги Telegram, которые требуют пары
+PAIRED_TAGS = {
+    b"b", b"strong", b"i", b"em", b"u", b"ins", b"s", b"strike", b"del",
+    b"a", b"code", b"pre", b"tg-spoiler", b"span", b"blockquote",
+}
+_TAG_RE = re.compile(rb"(<(/?)([a-zA-Z][a-zA-Z0-9-]*)[^<>]*>)")
+_MAX_ENTITY = 10   # длиннее &...; в отчётах не бывает
+_ENTITY_HEAD_RE = re.compile(rb"&[#a-zA-Z0-9]{1,8}")   # начало сущности без «;» (голый «&» из «S&P» – не она)
+
+
+# ── ГРАНИЦЫ ─────────────────────────────────────────────────────────────────────
+
+def codepoint_boundary(data: bytes, pos: int) -> int:
+    """Ближайшая граница символа не правее pos (пропуск байтов 10xxxxxx)."""
+    while 0 < pos < len(data) and (data[pos] & 0xC0) == 0x80:
+        pos -= 1
+    return pos
+
+
+def _best_cut(data: bytes, start: int, end: int) -> int:
+    """Лучшая точка разреза в data[start:end] (end – жёсткий предел)."""
+    if end >= len(data):
+        return len(data)
+    cut = data.rfind(PARAGRAPH, start + 1, end)
+    if cut > start:
+        return cut
+    half = start + (end - start) // 2
+    cut = data.rfind(b"\n", half, end)
+    if cut > start:
+        return cut
+    cut = max(data.rfind(sep, half, end - 1) for sep in SENTENCE_ENDS)
+    if cut > start:
+        return cut + 1          # точка остаётся в этой части
+    cut = data.rfind(b" ", half, end)
+    if cut > start:
+        return cut
+    return codepoint_boundary(data, end)
+
+
+def _html_safe_cut(data: bytes, start: int, cut: int) -> int:
+    """Сдвигает разрез левее, если он внутри сущности `&…;` или тега `<…>`.
+
+    Тег проверяется после сдвига по сущности (сущность бывает внутри href).
+    Результат может совпасть со start – тогда безопасного разреза нет.
+    """
+    amp = data.rfind(b"&", max(start, cut - _MAX_ENTITY), cut)
+    if amp != -1 and _ENTITY_HEAD_RE.fullmatch(data, amp, cut):
+        cut = amp
+    lt = data.rfind(b"<", start, cut)
+    if lt > data.rfind(b">", start, cut):
+        cut = lt
+    return cut
+
+
+def _update_stack(stack: list[tuple[bytes, bytes]], data: bytes, start: int, end: int) -> None:
+    """Учитывает открывающие/закрывающие теги в data[start:end]."""
+    opening_marks = data.count(b"<", start, end)
+    if opening_marks == 0:
+        return
+    # Быстрый путь: нет унаследованных тегов и все теги куска парные (число «<» = 2 × число «</»)
+    if not stack and opening_marks == 2 * data.count(b"</", start, end):
+        return
+    for tag, closing, name in _TAG_RE.findall(data, start, end):
+        if name not in PAIRED_TAGS:
+            name = name.lower()
+            if name not in PAIRED_TAGS:
+                continue
+        if not closing:
+            stack.append((name, tag))
+        elif stack and stack[-1][0] == name:
+            stack.pop()
+        else:
+            for i in range(len(stack) - 1, -1, -1):
+                if stack[i][0] == name:
+                    del stack[i:]
+                    break
+
+
+def _closing(stack: list[tuple[bytes, bytes]]) -> bytes:
+    return b"".join(b"</" + name + b">" for name, _ in reversed(stack))
+
+
+# ── ЭКСПОРТ ─────────────────────────────────────────────────────────────────────
+
+def chunk_text(text: str, limit_bytes: int, html: bool = True, split_reserve: int = 0) -> list[str]:
+    """Режет text на части не длиннее limit_bytes байт UTF-8.
+
+    split_reserve – сколько байт оставить свободными в каждой части, если
+    текст не помещается в одно сообщение (под префикс «Часть i/N»).
+    """
+    data = text.encode("utf-8")
+    if len(data) <= limit_bytes:
+        return [text] if text.strip() else []
+    limit = limit_bytes - split_reserve
+
+    chunks: list[str] = []
+    stack: list[tuple[bytes, bytes]] = []   # открытые теги на позиции pos
+    pos, n = 0, len(data)
+    while pos < n:
+        while pos < n and data[pos] in b"\n ":
+            pos += 1
+        if pos >= n:
+            break
+        prefix = b"".join(tag for _, tag in stack) if html else b""
+        budget = limit - len(prefix)
+        for _ in range(8):
+            hard_end = codepoint_boundary(data, min(pos + max(budget, 1), n)) if pos + budget < n else n
+            cut = _best_cut(data, pos, hard_end)
+            if html:
+                if cut < n:
+                    cut = _html_safe_cut(data, pos, cut)
+                    if cut <= pos:   # до лучшей границы безопасного места нет – пробуем жёсткий предел
+                        cut = _html_safe_cut(data, pos, hard_end)
+                    if cut <= pos:   # тег/сущность длиннее бюджета – режем по символу
+                        cut = hard_end
+                tail_stack = list(stack)
+                _update_stack(tail_stack, data, pos, cut)
+                suffix = _closing(tail_stack) if cut < n else b""
+                overflow = len(prefix) + (cut - pos) + len(suffix) - limit
+                if overflow > 0 and budget > 1:
+                    budget -= overflow
+                    continue
+                stack = tail_stack
+            else:
+                suffix = b""
+            break
+        else:
+            stack = tail_stack
+        if cut <= pos:   # лимит меньше одного символа – берём символ целиком
+            cut = pos + 1
+            while cut < n and (data[cut] & 0xC0) == 0x80:
+                cut += 1
+        body = data[pos:cut].rstrip(b"\n ")
+        if body:
+            chunks.append((prefix + body + suffix).decode("utf-8"))
+        pos = cut
+    return chunks
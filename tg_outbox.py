@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""tg_outbox.py
+Постоянная очередь исходящих сообщений Telegram.
+
+Каждая часть отчёта сначала записывается в SQLite (`cache/tg_outbox.sqlite`)
+с ключом идемпотентности (хеш id отчёта, чата и номера части), а уже потом
+отправляется. Поэтому:
+    * если процесс упал на середине отчёта, при следующем запуске
+      `deliver_pending()` досылает части, начиная с первой неотправленной;
+    * повторная постановка той же части того же отчёта не приводит к дублю
+      в канале, а совпадение текста с прошлым отчётом (ответ GPT из кеша,
+      неизменные макроданные) часть не глушит;
+    * части уходят подряд без фиксированных пауз, а при 429 очередь ждёт
+      ровно `retry_after` из ответа Telegram.
+
+Настройки через переменные окружения:
+    TG_OUTBOX_PATH          – путь к файлу базы;
+    TG_OUTBOX_MAX_AGE_HOURS – неотправленные части старше не досылаются,
+                              старые записи удаляются (6 ч);
+    TG_SEND_ATTEMPTS        – попыток на часть при сетевых ошибках/5xx (3).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from dataclasses import dataclass
+
+import requests
+
+from custom_logger import log
+from http_client import http_post
+
+OUTBOX_PATH: str = os.getenv("TG_OUTBOX_PATH", os.path.join("cache", "tg_outbox.sqlite"))
+
+try:
+    MAX_AGE_HOURS: float = float(os.getenv("TG_OUTBOX_MAX_AGE_HOURS", "6"))
+    SEND_ATTEMPTS: int = int(os.getenv("TG_SEND_ATTEMPTS", "3"))
+except ValueError:
+    log("WARNING: Invalid TG_OUTBOX_MAX_AGE_HOURS/TG_SEND_ATTEMPTS in .env, fallback to defaults")
+    MAX_AGE_HOURS, SEND_ATTEMPTS = 6.0, 3
+
+MAX_RETRY_AFTER = 120          # дольше ждать Telegram не имеет смысла – часть останется в очереди
+API_URL = "https://api.telegram.org/bot{token}/sendMessage"
+
+_lock = threading.Lock()                       # доступ к базе
+_chat_locks: dict[str, threading.Lock] = {}     # порядок частей внутри одного чата
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    idem_key    TEXT NOT NULL UNIQUE,
+    chat_id     TEXT NOT NULL,
+    payload     TEXT NOT NULL,              -- JSON для sendMessage без chat_id
+    status      TEXT NOT NULL DEFAULT 'pending',   -- pending | sent | failed | expired
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    created_at  REAL NOT NULL,
+    sent_at     REAL,
+    message_id  INTEGER,
+    last_error  TEXT
+)
+"""
+
+
+@dataclass
+class DeliveryResult:
+    """Итог досылки: сколько частей отправлено, отклонено и осталось в очереди."""
+    sent: int = 0
+    failed: int = 0
+    pending: int = 0
+
+    @property
+    def ok(self) -> bool:
+        return self.failed == 0 and self.pending == 0
+
+
+# ── ВНУТРЕННИЕ ФУНКЦИИ ─────────────────────────────────────────────────────────
+
+def _connect() -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(OUTBOX_PATH) or ".", exist_ok=True)
+    conn = sqlite3.connect(OUTBOX_PATH, timeout=30)
+    conn.execute(_SCHEMA)
+    return conn
+
+
+def idempotency_key(report_id: str, chat_id, index: int) -> str:
+    return hashlib.sha256(f"{report_id}\n{chat_id}\n{index}".encode("utf-8")).hexdigest()
+
+
+def _prune(conn: sqlite3.Connection) -> tuple[int, int]:
+    """Срок TG_OUTBOX_MAX_AGE_HOURS: старые pending → expired, старые завершённые записи удаляются.
+
+    Возвращает (сколько частей истекло, сколько записей удалено).
+    """
+    cutoff = time.time() - MAX_AGE_HOURS * 3600
+    expired = conn.execute(
+        "UPDATE outbox SET status = 'expired' WHERE status = 'pending' AND created_at < ?", (cutoff,)
+    ).rowcount
+    deleted = conn.execute("DELETE FROM outbox WHERE status != 'pending' AND created_at < ?", (cutoff,)).rowcount
+    conn.commit()
+    return expired, deleted
+
+
+def _log_pruned(expired: int, deleted: int) -> None:
+    if expired:
+        log(f"ℹ️ tg_outbox: {expired} устаревших неотправленных частей не будут досланы.")
+    if deleted:
+        log(f"🧹 tg_outbox: удалено {deleted} записей старше {MAX_AGE_HOURS:g} ч.")
+
+
+def _retry_after(resp: requests.Response) -> float | None:
+    try:
+        params = resp.json().get("parameters") or {}
+        if "retry_after" in params:
+            return float(params["retry_after"])
+    except ValueError:
+        pass
+    header = resp.headers.get("Retry-After")
+    try:
+        return float(header) if header else None
+    except ValueError:
+        return None
+
+
+def _describe(resp: requests.Response) -> str:
+    try:
+        return f"{resp.status_code} {resp.json().get('description', '')}".strip()
+    except ValueError:
+        return f"{resp.status_code} {resp.text[:200]}"
+
+
+def _send_one(token: str, chat_id: str, payload: dict) -> tuple[str, int | None, str]:
+    """Отправляет одну часть с учётом 429. Возвращает (status, message_id, ошибка)."""
+    body = {"chat_id": chat_id, **payload}
+    attempt = 0
+    error = ""
+    while attempt < SEND_ATTEMPTS:
+        try:
+            resp = http_post(API_URL.format(token=token), json=body, timeout=20)
+        except requests.exceptions.RequestException as e:
+            attempt += 1
+            error = f"{type(e).__name__}: {e}"
+            log(f"❗ Telegram: попытка {attempt}/{SEND_ATTEMPTS} – ошибка сети: {error}")
+            if attempt < SEND_ATTEMPTS:
+                time.sleep(2 ** attempt)
+            continue
+        if resp.status_code == 200:
+            try:
+                message_id = (resp.json().get("result") or {}).get("message_id")
+            except ValueError:
+                message_id = None
+            return "sent", message_id, ""
+        error = _describe(resp)
+        if resp.status_code == 429:
+            wait = _retry_after(resp) or 1.0
+            if wait > MAX_RETRY_AFTER:
+                return "pending", None, error
+            log(f"⏳ Telegram просит подождать {wait:g}с (429).")
+            time.sleep(wait)
+            continue                        # 429 – не ошибка части, попытка не тратится
+        if resp.status_code >= 500:
+            attempt += 1
+            log(f"❗ Telegram: попытка {attempt}/{SEND_ATTEMPTS} – {error}")
+            if attempt < SEND_ATTEMPTS:
+                time.sleep(2 ** attempt)
+            continue
+        return "failed", None, error        # 400/403 и т.п. – повтор не поможет
+    return "pending", None, error
+
+
+# ── ЭКСПОРТ ─────────────────────────────────────────────────────────────────────
+
+def enqueue(report_id: str, chat_id, texts: list[str], parse_mode: str | None = "HTML") -> list[str]:
+    """Ставит части отчёта report_id в очередь (в порядке списка).
+
+    Ключ части – (report_id, чат, номер части): повторная постановка того же
+    отчёта не дублируется. Возвращает ключи идемпотентности частей.
+    """
+    keys, duplicates, now = [], 0, time.time()
+    with _lock, closing(_connect()) as conn:
+        pruned = _prune(conn)
+        for index, text in enumerate(texts):
+            key = idempotency_key(report_id, chat_id, index)
+            payload = {"text": text, "disable_web_page_preview": True}
+            if parse_mode:
+                payload["parse_mode"] = parse_mode
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO outbox (idem_key, chat_id, payload, created_at) VALUES (?, ?, ?, ?)",
+                (key, str(chat_id), json.dumps(payload, ensure_ascii=False), now),
+            )
+            duplicates += cur.rowcount == 0
+            keys.append(key)
+        conn.commit()
+    _log_pruned(*pruned)
+    if duplicates:
+        log(f"ℹ️ tg_outbox: {duplicates} из {len(texts)} частей этого отчёта уже в очереди или отправлены – дубли пропущены.")
+    return keys
+
+
+def _chat_lock(chat_id: str) -> threading.Lock:
+    with _lock:
+        return _chat_locks.setdefault(chat_id, threading.Lock())
+
+
+def _deliver_chat(token: str, chat: str, rows: list[tuple], result: DeliveryResult) -> None:
+    """Отправляет части одного чата по порядку; после сбоя остаток чата ждёт следующего запуска."""
+    with _chat_lock(chat):
+        for i, (row_id, key, payload) in enumerate(rows):
+            status, message_id, error = _send_one(token, chat, json.loads(payload))
+            with _lock, closing(_connect()) as conn:
+                conn.execute(
+                    "UPDATE outbox SET status = ?, attempts = attempts + 1, sent_at = ?, message_id = ?, "
+                    "last_error = ? WHERE id = ?",
+                    (status, time.time() if status == "sent" else None, message_id, error or None, row_id),
+                )
+                conn.commit()
+            if status == "sent":
+                result.sent += 1
+            elif status == "failed":
+                result.failed += 1
+                log(f"❗ tg_outbox: Telegram отклонил часть {key[:10]} для {chat}: {error}")
+            else:
+                result.pending += len(rows) - i
+                log(f"⚠️ tg_outbox: часть {key[:10]} для {chat} не отправлена ({error}), остаток – в следующий запуск.")
+                return
+
+
+def deliver_pending(token: str, chat_id=None, keys: list[str] | None = None) -> DeliveryResult:
+    """Отправляет ожидающие части по порядку постановки.
+
+    chat_id / keys ограничивают выборку (по умолчанию – вся очередь).
+    Части старше TG_OUTBOX_MAX_AGE_HOURS помечаются expired, а завершённые
+    записи старше этого срока удаляются. Если часть не
+    удалось отправить из-за сети/5xx/долгого 429, досылка этого чата
+    останавливается, чтобы не нарушить порядок: продолжит следующий запуск.
+    Разные чаты можно досылать из разных потоков одновременно: общая
+    блокировка держится только на время запросов к базе.
+    """
+    result = DeliveryResult()
+    with _lock, closing(_connect()) as conn:
+        pruned = _prune(conn)
+        query = "SELECT id, idem_key, chat_id, payload FROM outbox WHERE status = 'pending'"
+        args: list = []
+        if chat_id is not None:
+            query += " AND chat_id = ?"
+            args.append(str(chat_id))
+        if keys:
+            query += f" AND idem_key IN ({','.join('?' * len(keys))})"
+            args.extend(keys)
+        rows = conn.execute(query + " ORDER BY id", args).fetchall()
+    _log_pruned(*pruned)
+
+    by_chat: dict[str, list[tuple]] = {}
+    for row_id, key, row_chat, payload in rows:
+        by_chat.setdefault(row_chat, []).append((row_id, key, payload))
+    for chat, chat_rows in by_chat.items():
+        _deliver_chat(token, chat, chat_rows, result)
+    return result
+
+
+def pending_count() -> int:
+    with _lock, closing(_connect()) as conn:
+        return conn.execute("SELECT COUNT(*) FROM outbox WHERE status = 'pending'").fetchone()[0]
+
+
+def statuses(keys: list[str]) -> dict[str, str]:
+    """Текущий статус частей по ключам идемпотентности."""
+    if not keys:
+        return {}
+    with _lock, closing(_connect()) as conn:
+        rows = conn.execute(
+            f"SELECT idem_key, status FROM outbox WHERE idem_key IN ({','.join('?' * len(keys))})", keys
+        ).fetchall()
+    return dict(rows)